@@ -0,0 +1,147 @@
+# active_alarms.py
+"""
+Conjunto en memoria de alarmas activas (consola de operación)
+Se construye desde las filas is_active=True (índice parcial alarm_active_idx)
+la primera vez que se consulta y después lo mantiene el motor de alarmas con
+sus activaciones y aclarados. Los cambios hechos fuera del motor (admin,
+reevaluación en bloque, edición directa) lo marcan para reconstruirse en la
+siguiente consulta. Como el hub en vivo, es por proceso.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from .models import Alarm
+
+# Orden de la consola: primero las más severas
+SEVERITY_ORDER = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITY_ORDER)}
+
+
+def alarm_entry(alarm: Alarm, variable_name: Optional[str], server_id: Optional[int],
+                server_name: Optional[str]) -> Dict:
+    """Representación de una alarma activa en la consola"""
+    return {
+        'id': alarm.id,
+        'alarm_type': alarm.alarm_type,
+        'severity': alarm.severity,
+        'message': alarm.message,
+        'value': alarm.value,
+        'timestamp': alarm.timestamp,
+        'data_variable': alarm.data_variable_id,
+        'variable_name': variable_name,
+        'server': server_id,
+        'server_name': server_name,
+        'acknowledged': alarm.acknowledged,
+        'acknowledged_by_name': None,
+        'acknowledged_at': alarm.acknowledged_at,
+        'occurrence_count': alarm.occurrence_count,
+        'last_occurrence': alarm.last_occurrence,
+    }
+
+
+class ActiveAlarmSet:
+    """Alarmas activas por id con filtros por severidad y servidor"""
+
+    def __init__(self):
+        self._entries: Optional[Dict[int, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        alarms = Alarm.objects.filter(is_active=True).select_related(
+            'data_variable__server', 'data_server', 'variable__server', 'acknowledged_by'
+        ).order_by()
+        entries = {}
+        for alarm in alarms:
+            source = alarm.source_variable
+            if alarm.data_server_id is not None:
+                server_id, server_name = alarm.data_server_id, alarm.data_server.name
+            elif alarm.data_variable_id is not None:
+                server_id, server_name = alarm.data_variable.server_id, alarm.data_variable.server.name
+            else:
+                server_id, server_name = None, source.server.name if source else None
+            entry = alarm_entry(alarm, source.name if source else None, server_id, server_name)
+            if alarm.acknowledged_by_id:
+                entry['acknowledged_by_name'] = alarm.acknowledged_by.username
+            entries[alarm.id] = entry
+        self._entries = entries
+
+    def invalidate(self):
+        """Reconstruir desde la base de datos en la próxima consulta"""
+        with self._lock:
+            self._entries = None
+
+    # === MANTENIMIENTO DESDE EL MOTOR ===
+
+    def add(self, entries: Iterable[Dict]):
+        with self._lock:
+            if self._entries is None:
+                return
+            for entry in entries:
+                self._entries[entry['id']] = entry
+
+    def remove(self, alarm_ids: Iterable[int]):
+        with self._lock:
+            if self._entries is None:
+                return
+            for alarm_id in alarm_ids:
+                self._entries.pop(alarm_id, None)
+
+    def increment(self, alarm_id: int, count: int, last_occurrence: datetime):
+        """Sumar ocurrencias a una alarma activa (avalancha)"""
+        with self._lock:
+            entry = self._entries.get(alarm_id) if self._entries is not None else None
+            if entry is not None:
+                entry['occurrence_count'] += count
+                entry['last_occurrence'] = last_occurrence
+
+    def acknowledge(self, alarm_ids: Iterable[int], username: str, acknowledged_at: datetime):
+        with self._lock:
+            if self._entries is None:
+                return
+            for alarm_id in alarm_ids:
+                entry = self._entries.get(alarm_id)
+                if entry is not None:
+                    entry.update(acknowledged=True, acknowledged_by_name=username,
+                                 acknowledged_at=acknowledged_at)
+
+    # === CONSULTA ===
+
+    def query(self, severities: Optional[Iterable[str]] = None, server_id: Optional[int] = None,
+              acknowledged: Optional[bool] = None) -> Dict:
+        """
+        Alarmas activas filtradas (más severas y recientes primero) y conteos
+        por severidad (con los filtros de servidor y reconocimiento)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            entries = [
+                entry for entry in self._entries.values()
+                if (server_id is None or entry['server'] == server_id)
+                and (acknowledged is None or entry['acknowledged'] == acknowledged)
+            ]
+
+        counts = Counter(entry['severity'] for entry in entries)
+        if severities is not None:
+            severities = set(severities)
+            entries = [entry for entry in entries if entry['severity'] in severities]
+        entries.sort(key=lambda entry: entry['timestamp'], reverse=True)
+        entries.sort(key=lambda entry: SEVERITY_RANK.get(entry['severity'], len(SEVERITY_ORDER)))
+        return {
+            'count': len(entries),
+            'counts_by_severity': {severity: counts.get(severity, 0) for severity in SEVERITY_ORDER},
+            'unacknowledged': sum(1 for entry in entries if not entry['acknowledged']),
+            'alarms': [dict(entry) for entry in entries],
+        }
+
+    def ids(self, severities: Optional[Iterable[str]] = None, server_id: Optional[int] = None) -> List[int]:
+        """Ids de las alarmas activas sin reconocer que cumplen los filtros"""
+        return [entry['id'] for entry in self.query(severities, server_id, acknowledged=False)['alarms']]
+
+
+# Instancia global del conjunto de alarmas activas
+active_alarms = ActiveAlarmSet()
@@ -7,6 +7,8 @@ from .models import (
     ConnectionLog, Alarm, UserProfile, SystemConfiguration, AuditLog,
     DataServer, DataVariable, DataReading
 )
+from .active_alarms import active_alarms
+from .alarms import alarm_engine
 
 # Inline para UserProfile
 class UserProfileInline(admin.StackedInline):
@@ -99,10 +101,10 @@ class VariableReadingAdmin(admin.ModelAdmin):
 # Admin para ConnectionLog
 @admin.register(ConnectionLog)
 class ConnectionLogAdmin(admin.ModelAdmin):
-    list_display = ['server', 'event_type', 'timestamp', 'response_time', 'user']
-    list_filter = ['server', 'event_type', 'timestamp']
-    search_fields = ['server__name', 'message']
-    readonly_fields = ['timestamp']
+    list_display = ['server', 'data_server', 'event_type', 'timestamp', 'response_time', 'user']
+    list_filter = ['server', 'data_server', 'event_type', 'timestamp']
+    search_fields = ['server__name', 'data_server__name', 'message']
+    readonly_fields = ['timestamp', 'metrics']
     date_hierarchy = 'timestamp'
     
     def has_add_permission(self, request):
@@ -112,15 +114,15 @@ class ConnectionLogAdmin(admin.ModelAdmin):
 @admin.register(Alarm)
 class AlarmAdmin(admin.ModelAdmin):
     list_display = [
-        'variable', 'alarm_type', 'severity', 'is_active', 
-        'acknowledged', 'timestamp'
+        'variable', 'data_variable', 'alarm_type', 'severity', 'is_active', 
+        'acknowledged', 'occurrence_count', 'timestamp'
     ]
     list_filter = [
-        'variable__server', 'alarm_type', 'severity', 
+        'variable__server', 'data_server', 'alarm_type', 'severity', 
         'is_active', 'acknowledged', 'timestamp'
     ]
-    search_fields = ['variable__name', 'message']
-    readonly_fields = ['timestamp', 'acknowledged_at', 'cleared_at']
+    search_fields = ['variable__name', 'data_variable__name', 'message']
+    readonly_fields = ['timestamp', 'acknowledged_at', 'cleared_at', 'occurrence_count', 'last_occurrence']
     date_hierarchy = 'timestamp'
     actions = ['acknowledge_alarms', 'clear_alarms']
     
@@ -130,6 +132,7 @@ class AlarmAdmin(admin.ModelAdmin):
             acknowledged_by=request.user,
             acknowledged_at=timezone.now()
         )
+        active_alarms.invalidate()
     acknowledge_alarms.short_description = "Reconocer alarmas seleccionadas"
     
     def clear_alarms(self, request, queryset):
@@ -137,6 +140,8 @@ class AlarmAdmin(admin.ModelAdmin):
             is_active=False,
             cleared_at=timezone.now()
         )
+        active_alarms.invalidate()
+        alarm_engine.reset()
     clear_alarms.short_description = "Aclarar alarmas seleccionadas"
 
 # Admin para UserProfile
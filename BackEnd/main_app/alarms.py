@@ -0,0 +1,714 @@
+# alarms.py
+"""
+Motor de alarmas por límites de DataVariable
+Evalúa cada lectura ingresada contra los límites alto/bajo de su variable
+con histéresis y retardos de activación/desactivación, y además (si están
+configuradas) la tasa de cambio sobre una ventana deslizante en memoria y
+la desviación respecto a la consigna. Cada canal (límites, tasa, desviación)
+tiene su estado en memoria; solo las transiciones (activación o aclarado) se
+escriben en la base de datos como filas de Alarm.
+
+Antes de escribir, el motor contiene las tormentas de alarmas en memoria:
+- Avalancha: si un servidor supera ALARM_FLOOD_THRESHOLD activaciones en
+  ALARM_FLOOD_WINDOW segundos, las activaciones siguientes se suprimen y se
+  cuentan en una única alarma FLOOD del servidor hasta que la tasa baja.
+- Intermitencia: una variable que se reactiva con la misma condición dentro
+  de ALARM_CHATTER_WINDOW segundos reutiliza su fila e incrementa
+  occurrence_count en lugar de crear otra (y no cuenta para la avalancha).
+- Archivado: las variables archivadas por un operador (alarm_shelved_until)
+  no escriben activaciones hasta que vence el archivado.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .active_alarms import active_alarms, alarm_entry
+from .caching import get_config_version
+from .metrics import alarm_process_seconds, alarm_readings, alarms_raised
+from .models import Alarm, DataReading, DataVariable
+
+logger = logging.getLogger(__name__)
+
+# Tipos de dato con límites numéricos
+NUMERIC_DATA_TYPES = ('FLOAT', 'INTEGER')
+
+# Canal de evaluación de cada tipo de alarma
+CHANNELS = {'HIGH': 'LIMIT', 'LOW': 'LIMIT', 'RATE': 'RATE', 'DEVIATION': 'DEVIATION'}
+
+# Campos de DataVariable que cambian el resultado de reevaluate_alarms
+REEVALUATION_FIELDS = ('alarm_enabled', 'data_type', 'alarm_high_limit', 'alarm_low_limit', 'alarm_deadband')
+
+# Muestras máximas por ventana de tasa de cambio
+RATE_WINDOW_MAX_SAMPLES = 256
+
+
+class AlarmLimits:
+    """Configuración de alarma de una variable"""
+    __slots__ = ('name', 'high', 'low', 'deadband', 'on_delay', 'off_delay',
+                 'server_id', 'server_name', 'shelved_until',
+                 'rate_limit', 'rate_window', 'setpoint', 'deviation_limit')
+
+    def __init__(self, name, high, low, deadband=0.0, on_delay=0.0, off_delay=0.0,
+                 server_id=None, server_name='', shelved_until=None,
+                 rate_limit=None, rate_window=10.0, setpoint=None, deviation_limit=None):
+        self.name = name
+        self.high = high
+        self.low = low
+        self.deadband = deadband or 0.0
+        self.on_delay = on_delay or 0.0
+        self.off_delay = off_delay or 0.0
+        self.server_id = server_id
+        self.server_name = server_name
+        self.shelved_until = shelved_until
+        # Tasa de cambio máxima en unidades por segundo
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window or 10.0
+        self.setpoint = setpoint
+        self.deviation_limit = deviation_limit
+
+    @classmethod
+    def from_variable(cls, variable):
+        rate_limit = variable.alarm_rate_limit
+        if rate_limit is not None and variable.alarm_rate_unit == 'min':
+            rate_limit = rate_limit / 60.0
+        return cls(
+            variable.name, variable.alarm_high_limit, variable.alarm_low_limit,
+            variable.alarm_deadband, variable.alarm_on_delay, variable.alarm_off_delay,
+            variable.server_id, variable.server.name, variable.alarm_shelved_until,
+            rate_limit, variable.alarm_rate_window, variable.alarm_setpoint,
+            variable.alarm_deviation_limit
+        )
+
+    def is_shelved(self, timestamp: datetime) -> bool:
+        return self.shelved_until is not None and timestamp < self.shelved_until
+
+
+class AlarmState:
+    """
+    Estado en memoria de un canal de una variable: alarma activa, transición
+    pendiente, última fila aclarada (intermitencia) y activación suprimida
+    sin fila
+    """
+    __slots__ = ('active', 'alarm_id', 'pending', 'pending_since',
+                 'last_alarm_id', 'last_type', 'last_cleared', 'suppressed')
+
+    def __init__(self, active=None, alarm_id=None):
+        self.active = active
+        self.alarm_id = alarm_id
+        self.pending = None
+        self.pending_since = None
+        self.last_alarm_id = None
+        self.last_type = None
+        self.last_cleared = None
+        self.suppressed = False
+
+
+class FloodState:
+    """Activaciones recientes de un servidor y avalancha en curso"""
+    __slots__ = ('raises', 'active', 'alarm_id')
+
+    def __init__(self, active=False, alarm_id=None):
+        self.raises = deque()
+        self.active = active
+        self.alarm_id = alarm_id
+
+    def prune(self, now: datetime, window: float):
+        while self.raises and (now - self.raises[0]).total_seconds() > window:
+            self.raises.popleft()
+
+
+def evaluate_condition(limits: AlarmLimits, value: float, active: Optional[str]) -> Optional[str]:
+    """
+    Condición de alarma ('HIGH', 'LOW' o None) para un valor; una alarma
+    activa se mantiene hasta salir de la banda de histéresis
+    """
+    high, low, deadband = limits.high, limits.low, limits.deadband
+    if high is not None:
+        if value > high or (active == 'HIGH' and value > high - deadband):
+            return 'HIGH'
+    if low is not None:
+        if value < low or (active == 'LOW' and value < low + deadband):
+            return 'LOW'
+    return None
+
+
+def evaluate_deviation(limits: AlarmLimits, value: float, active: Optional[str]) -> Optional[str]:
+    """Condición DEVIATION si el valor se aleja de la consigna más de lo permitido (con histéresis)"""
+    deviation = abs(value - limits.setpoint)
+    if deviation > limits.deviation_limit or \
+            (active == 'DEVIATION' and deviation > limits.deviation_limit - limits.deadband):
+        return 'DEVIATION'
+    return None
+
+
+class RateWindow:
+    """Muestras recientes (timestamp, valor) de una variable para su tasa de cambio"""
+    __slots__ = ('samples',)
+
+    def __init__(self):
+        self.samples = deque(maxlen=RATE_WINDOW_MAX_SAMPLES)
+
+    def update(self, timestamp: datetime, value: float, window: float) -> Optional[float]:
+        """Añadir una muestra y devolver la tasa (unidades/s) sobre la ventana, o None"""
+        samples = self.samples
+        if samples and timestamp <= samples[-1][0]:
+            return None
+        samples.append((timestamp, value))
+        while len(samples) > 1 and (timestamp - samples[0][0]).total_seconds() > window:
+            samples.popleft()
+        if len(samples) < 2:
+            return None
+        oldest_timestamp, oldest_value = samples[0]
+        return (value - oldest_value) / (timestamp - oldest_timestamp).total_seconds()
+
+
+class AlarmEngine:
+    """Evaluación de alarmas en la ruta de ingesta"""
+
+    def __init__(self):
+        self._limits: Optional[Dict[int, AlarmLimits]] = None
+        # Estado por (variable_id, canal)
+        self._states: Dict[Tuple[int, str], AlarmState] = {}
+        self._windows: Dict[int, RateWindow] = {}
+        self._floods: Dict[int, FloodState] = {}
+        self._version = None
+        self._lock = threading.RLock()
+
+    # === CONFIGURACIÓN ===
+
+    def _ensure_loaded(self):
+        """Cargar límites (y estado activo la primera vez) si cambió la configuración"""
+        version = get_config_version()
+        if self._limits is not None and version == self._version:
+            return
+
+        variables = DataVariable.objects.filter(
+            alarm_enabled=True, data_type__in=NUMERIC_DATA_TYPES
+        ).select_related('server').only(
+            'id', 'name', 'alarm_high_limit', 'alarm_low_limit', 'alarm_deadband',
+            'alarm_on_delay', 'alarm_off_delay', 'alarm_shelved_until', 'alarm_rate_limit',
+            'alarm_rate_unit', 'alarm_rate_window', 'alarm_setpoint', 'alarm_deviation_limit',
+            'server__name'
+        )
+        self._limits = {variable.id: AlarmLimits.from_variable(variable) for variable in variables}
+
+        if self._version is None:
+            for alarm_id, variable_id, alarm_type in Alarm.objects.filter(
+                is_active=True, data_variable__isnull=False, alarm_type__in=tuple(CHANNELS)
+            ).values_list('id', 'data_variable_id', 'alarm_type'):
+                self._states[(variable_id, CHANNELS[alarm_type])] = AlarmState(alarm_type, alarm_id)
+            # Avalanchas abiertas por un proceso anterior: se cierran cuando baja la tasa
+            for alarm_id, server_id in Alarm.objects.filter(
+                is_active=True, alarm_type='FLOOD', data_server__isnull=False
+            ).values_list('id', 'data_server_id'):
+                self._floods[server_id] = FloodState(True, alarm_id)
+        self._version = version
+
+    def reset(self):
+        """Olvidar límites y estado (se recargan desde la base de datos)"""
+        with self._lock:
+            self._limits = None
+            self._states = {}
+            self._windows = {}
+            self._floods = {}
+            self._version = None
+
+    def sync_limit_states(self, conditions: Dict[int, Tuple[Optional[str], Optional[int]]],
+                          cleared_ids: Iterable[int], now: datetime):
+        """
+        Alinear el canal de límites de las variables reevaluadas con sus filas
+        de Alarm ({variable_id: (condición, alarm_id)}); el resto de variables
+        y canales conserva su estado en memoria
+        """
+        with self._lock:
+            if self._version is None:
+                # Aún sin cargar: el estado activo se leerá de la base de datos
+                return
+            cleared_ids = set(cleared_ids)
+            for key in [key for key, state in self._states.items()
+                        if key[1] == 'LIMIT' and key[0] not in conditions and state.alarm_id in cleared_ids]:
+                del self._states[key]
+            for variable_id, (condition, alarm_id) in conditions.items():
+                state = self._states.get((variable_id, 'LIMIT'))
+                if state is None:
+                    if condition is None:
+                        continue
+                    state = self._states[(variable_id, 'LIMIT')] = AlarmState()
+                elif state.active == condition and state.alarm_id == alarm_id:
+                    continue
+                if state.alarm_id is not None and state.alarm_id != alarm_id:
+                    state.last_alarm_id, state.last_type, state.last_cleared = state.alarm_id, state.active, now
+                state.active, state.alarm_id = condition, alarm_id
+                state.pending, state.pending_since = None, None
+                state.suppressed = False
+
+    # === EVALUACIÓN ===
+
+    def evaluate(self, variable_id: int, value: float, timestamp: datetime) -> List[Tuple]:
+        """
+        Evaluar una actualización en cada canal configurado; devuelve las
+        transiciones (variable_id, condición anterior, nueva condición,
+        valor, timestamp). En el canal de tasa el valor es la tasa (unidades/s).
+        """
+        limits = self._limits.get(variable_id)
+        if limits is None:
+            return []
+
+        # Un canal sin configuración pero con estado previo se evalúa para aclararlo
+        transitions = []
+        states = self._states
+        if limits.high is not None or limits.low is not None or (variable_id, 'LIMIT') in states:
+            state = self._state(variable_id, 'LIMIT')
+            condition = evaluate_condition(limits, value, state.active)
+            transitions.append(self._step(state, limits, variable_id, condition, value, timestamp))
+
+        if limits.rate_limit is not None:
+            window = self._windows.get(variable_id)
+            if window is None:
+                window = self._windows[variable_id] = RateWindow()
+            rate = window.update(timestamp, value, limits.rate_window)
+            if rate is not None:
+                condition = 'RATE' if abs(rate) > limits.rate_limit else None
+                transitions.append(self._step(self._state(variable_id, 'RATE'), limits, variable_id,
+                                              condition, rate, timestamp))
+        elif (variable_id, 'RATE') in states:
+            transitions.append(self._step(states[(variable_id, 'RATE')], limits, variable_id, None, value, timestamp))
+
+        if limits.setpoint is not None and limits.deviation_limit is not None:
+            state = self._state(variable_id, 'DEVIATION')
+            condition = evaluate_deviation(limits, value, state.active)
+            transitions.append(self._step(state, limits, variable_id, condition, value, timestamp))
+        elif (variable_id, 'DEVIATION') in states:
+            transitions.append(self._step(states[(variable_id, 'DEVIATION')], limits, variable_id, None, value, timestamp))
+
+        return [transition for transition in transitions if transition]
+
+    def _state(self, variable_id: int, channel: str) -> AlarmState:
+        state = self._states.get((variable_id, channel))
+        if state is None:
+            state = self._states[(variable_id, channel)] = AlarmState()
+        return state
+
+    def _step(self, state: AlarmState, limits: AlarmLimits, variable_id, condition, value, timestamp) -> Optional[Tuple]:
+        """Aplicar retardos a la condición de un canal; devuelve la transición o None"""
+        if condition == state.active:
+            state.pending_since = None
+            return None
+
+        # pending_since None: no hay transición pendiente
+        if state.pending_since is None or state.pending != condition:
+            state.pending = condition
+            state.pending_since = timestamp
+
+        delay = limits.on_delay if condition is not None else limits.off_delay
+        if delay and (timestamp - state.pending_since).total_seconds() < delay:
+            return None
+
+        previous = state.active
+        state.active = condition
+        state.pending_since = None
+        return (variable_id, previous, condition, value, timestamp)
+
+    def process(self, readings: Iterable) -> List[Alarm]:
+        """Evaluar un lote de lecturas y aplicar las transiciones; devuelve las alarmas creadas"""
+        start = time.perf_counter()
+        with self._lock:
+            self._ensure_loaded()
+            if not self._limits:
+                return []
+
+            transitions = []
+            latest = None
+            evaluated = 0
+            for reading in readings:
+                if reading.quality != 'GOOD' or reading.variable_id not in self._limits:
+                    continue
+                value = reading.value_float if reading.value_float is not None else reading.value_integer
+                if value is None:
+                    continue
+                evaluated += 1
+                transitions.extend(
+                    self.evaluate(reading.variable_id, value, reading.timestamp) or
+                    self._resurface(reading.variable_id, value, reading.timestamp)
+                )
+                if latest is None or reading.timestamp > latest:
+                    latest = reading.timestamp
+
+            raised = self._apply(transitions) if transitions else []
+            if latest is not None and any(flood.active for flood in self._floods.values()):
+                raised += self._end_floods(latest)
+
+        alarm_readings.inc(evaluated)
+        for alarm in raised:
+            alarms_raised.labels(alarm.alarm_type, alarm.severity).inc()
+        alarm_process_seconds.observe(time.perf_counter() - start)
+        return raised
+
+    def _resurface(self, variable_id, value, timestamp) -> List[Tuple]:
+        """Activaciones suprimidas que siguen activas al vencer el archivado: escribirlas ahora"""
+        limits = self._limits[variable_id]
+        flood = self._floods.get(limits.server_id)
+        if limits.is_shelved(timestamp) or (flood is not None and flood.active):
+            return []
+        transitions = []
+        for channel in ('LIMIT', 'RATE', 'DEVIATION'):
+            state = self._states.get((variable_id, channel))
+            if state is not None and state.suppressed and state.active is not None:
+                transitions.append((variable_id, None, state.active, value, timestamp))
+        return transitions
+
+    def _register_raise(self, server_id, timestamp) -> bool:
+        """Contar una activación del servidor; True si está en avalancha"""
+        flood = self._floods.get(server_id)
+        if flood is None:
+            flood = self._floods[server_id] = FloodState()
+        flood.raises.append(timestamp)
+        flood.prune(timestamp, settings.ALARM_FLOOD_WINDOW)
+        if not flood.active and len(flood.raises) > settings.ALARM_FLOOD_THRESHOLD:
+            flood.active = True
+            logger.warning(f"Avalancha de alarmas en el servidor {server_id}")
+        return flood.active
+
+    def _apply(self, transitions) -> List[Alarm]:
+        """
+        Escribir transiciones: aclarar alarmas activas, reactivar filas
+        intermitentes, acumular las suprimidas por avalancha y crear las
+        nuevas en bloque
+        """
+        cleared = defaultdict(list)
+        reactivated = Counter()
+        # Última reactivación de cada fila (cada alarma con su propio timestamp)
+        reactivated_at = {}
+        flooded = Counter()
+        raised = []
+        created = {}
+        chatter_window = settings.ALARM_CHATTER_WINDOW
+
+        for variable_id, previous, condition, value, timestamp in transitions:
+            key = (variable_id, CHANNELS[condition or previous])
+            state = self._states[key]
+            limits = self._limits[variable_id]
+            if previous is not None:
+                alarm = created.get(key)
+                if alarm is not None and alarm.is_active:
+                    # Activada y aclarada en el mismo lote: se inserta ya aclarada
+                    alarm.is_active, alarm.cleared_at = False, timestamp
+                    state.last_type, state.last_cleared = previous, timestamp
+                elif state.alarm_id is not None:
+                    cleared[timestamp].append(state.alarm_id)
+                    state.last_alarm_id, state.last_type, state.last_cleared = state.alarm_id, previous, timestamp
+                    state.alarm_id = None
+                state.suppressed = False
+            if condition is None:
+                continue
+
+            if limits.is_shelved(timestamp):
+                state.suppressed = True
+                continue
+            if state.last_type == condition and state.last_cleared is not None and \
+                    (timestamp - state.last_cleared).total_seconds() <= chatter_window:
+                # Intermitencia: la misma fila vuelve a estar activa (no cuenta para avalancha)
+                alarm = created.get(key)
+                if alarm is not None and not alarm.is_active:
+                    alarm.is_active, alarm.cleared_at = True, None
+                    alarm.occurrence_count += 1
+                    alarm.last_occurrence = timestamp
+                    state.suppressed = False
+                    continue
+                if state.last_alarm_id is not None:
+                    if state.last_alarm_id in cleared.get(state.last_cleared, ()):
+                        cleared[state.last_cleared].remove(state.last_alarm_id)
+                    reactivated[state.last_alarm_id] += 1
+                    state.alarm_id = state.last_alarm_id
+                    state.suppressed = False
+                    alarm_id = state.last_alarm_id
+                    reactivated_at[alarm_id] = max(reactivated_at.get(alarm_id, timestamp), timestamp)
+                    continue
+            if self._register_raise(limits.server_id, timestamp):
+                state.suppressed = True
+                flooded[limits.server_id] += 1
+                continue
+
+            state.suppressed = False
+            created[key] = self._build_alarm(variable_id, condition, value, timestamp)
+            raised.append(created[key])
+
+        floods = []
+        open_floods = []
+        for server_id, count in flooded.items():
+            flood = self._floods[server_id]
+            if flood.alarm_id is None:
+                floods.append(self._build_flood_alarm(server_id, count, flood.raises[-1]))
+            else:
+                open_floods.append((flood.alarm_id, count, flood.raises[-1]))
+
+        with transaction.atomic():
+            # Reactivaciones antes que aclarados: una fila puede reactivarse y aclararse en el lote
+            for (count, last_occurrence), alarm_ids in _group_by_count(reactivated, reactivated_at).items():
+                Alarm.objects.filter(id__in=alarm_ids).update(
+                    is_active=True, cleared_at=None, last_occurrence=last_occurrence,
+                    occurrence_count=F('occurrence_count') + count
+                )
+            for timestamp, alarm_ids in cleared.items():
+                if alarm_ids:
+                    Alarm.objects.filter(id__in=alarm_ids).update(is_active=False, cleared_at=timestamp)
+            for alarm_id, count, last_occurrence in open_floods:
+                Alarm.objects.filter(id=alarm_id).update(
+                    occurrence_count=F('occurrence_count') + count, last_occurrence=last_occurrence
+                )
+            Alarm.objects.bulk_create(raised + floods)
+
+        for alarm in raised:
+            state = self._states[(alarm.data_variable_id, CHANNELS[alarm.alarm_type])]
+            if alarm.is_active:
+                state.alarm_id = alarm.id
+            else:
+                state.last_alarm_id = alarm.id
+        for alarm in floods:
+            self._floods[alarm.data_server_id].alarm_id = alarm.id
+
+        # Consola de alarmas activas
+        active_alarms.remove(alarm_id for alarm_ids in cleared.values() for alarm_id in alarm_ids)
+        active_alarms.add(self._entry(alarm) for alarm in raised + floods if alarm.is_active)
+        for alarm_id, count, last_occurrence in open_floods:
+            active_alarms.increment(alarm_id, count, last_occurrence)
+        if reactivated:
+            active_alarms.invalidate()
+        return raised + floods
+
+    def _end_floods(self, now: datetime) -> List[Alarm]:
+        """
+        Cerrar las avalanchas cuya tasa bajó a la mitad del umbral y escribir
+        las alarmas suprimidas que siguen activas
+        """
+        ended = []
+        for server_id, flood in self._floods.items():
+            if not flood.active:
+                continue
+            flood.prune(now, settings.ALARM_FLOOD_WINDOW)
+            if len(flood.raises) <= settings.ALARM_FLOOD_THRESHOLD // 2:
+                ended.append(server_id)
+        if not ended:
+            return []
+
+        raised = []
+        for (variable_id, _), state in self._states.items():
+            limits = self._limits.get(variable_id)
+            if state.suppressed and state.active is not None and limits is not None and \
+                    limits.server_id in ended and not limits.is_shelved(now):
+                raised.append(self._build_alarm(variable_id, state.active, None, now))
+
+        with transaction.atomic():
+            Alarm.objects.filter(
+                id__in=[self._floods[server_id].alarm_id for server_id in ended]
+            ).update(is_active=False, cleared_at=now)
+            Alarm.objects.bulk_create(raised)
+
+        active_alarms.remove(self._floods[server_id].alarm_id for server_id in ended)
+        active_alarms.add(self._entry(alarm) for alarm in raised)
+        for server_id in ended:
+            self._floods[server_id] = FloodState()
+        for alarm in raised:
+            state = self._states[(alarm.data_variable_id, CHANNELS[alarm.alarm_type])]
+            state.alarm_id = alarm.id
+            state.suppressed = False
+        return raised
+
+    def _build_alarm(self, variable_id, condition, value, timestamp) -> Alarm:
+        limits = self._limits[variable_id]
+        if value is None:
+            message = f'{limits.name}: condición {condition} activa'
+        elif condition == 'RATE':
+            message = f'{limits.name}: tasa de cambio {value:.4g}/s supera {limits.rate_limit:.4g}/s'
+        elif condition == 'DEVIATION':
+            message = f'{limits.name}: valor {value} se desvía más de {limits.deviation_limit} de la consigna {limits.setpoint}'
+        elif condition == 'HIGH':
+            message = f'{limits.name}: valor {value} por encima del límite alto {limits.high}'
+        else:
+            message = f'{limits.name}: valor {value} por debajo del límite bajo {limits.low}'
+        return Alarm(
+            data_variable_id=variable_id, data_server_id=limits.server_id, alarm_type=condition,
+            message=message, value=value, timestamp=timestamp
+        )
+
+    def _server_name(self, server_id):
+        return next(
+            (limits.server_name for limits in self._limits.values() if limits.server_id == server_id), server_id
+        )
+
+    def _entry(self, alarm: Alarm) -> Dict:
+        """Entrada de la consola con los nombres ya conocidos por el motor"""
+        if alarm.data_variable_id is None:
+            return alarm_entry(alarm, None, alarm.data_server_id, self._server_name(alarm.data_server_id))
+        limits = self._limits[alarm.data_variable_id]
+        return alarm_entry(alarm, limits.name, limits.server_id, limits.server_name)
+
+    def _build_flood_alarm(self, server_id, count, timestamp) -> Alarm:
+        server_name = self._server_name(server_id)
+        return Alarm(
+            data_server_id=server_id, alarm_type='FLOOD', severity='HIGH', timestamp=timestamp,
+            message=f'Avalancha de alarmas en {server_name}: activaciones individuales suprimidas',
+            occurrence_count=count, last_occurrence=timestamp
+        )
+
+    def active_state(self, variable_id: int, channel: str = 'LIMIT') -> Optional[str]:
+        state = self._states.get((variable_id, channel))
+        return state.active if state else None
+
+    def active_count(self) -> int:
+        """Condiciones activas (todas las variables y canales)"""
+        with self._lock:
+            return sum(1 for state in self._states.values() if state.active is not None)
+
+    def flooded_servers(self) -> List[int]:
+        with self._lock:
+            return sorted(server_id for server_id, flood in self._floods.items() if flood.active)
+
+
+def _group_by_count(counter: Counter, timestamps: Dict) -> Dict[Tuple, List[int]]:
+    """Ids agrupados por (incremento, última ocurrencia), para un UPDATE por grupo"""
+    groups = defaultdict(list)
+    for key, count in counter.items():
+        groups[(count, timestamps[key])].append(key)
+    return groups
+
+
+# Instancia global del motor de alarmas
+alarm_engine = AlarmEngine()
+
+
+# === REEVALUACIÓN EN BLOQUE ===
+
+# Códigos de condición en los arrays
+CONDITION_CODES = {None: 0, 'HIGH': 1, 'LOW': 2}
+CONDITION_NAMES = {code: name for name, code in CONDITION_CODES.items()}
+
+
+def compute_conditions(values, high, low, deadband, active):
+    """
+    Condición de alarma de todas las variables en una pasada vectorizada
+    (0 normal, 1 HIGH, 2 LOW). Límites ausentes y valores desconocidos se
+    representan con NaN; sin valor se conserva la condición activa.
+    """
+    high_cond = (values > high) | ((active == 1) & (values > high - deadband))
+    low_cond = (values < low) | ((active == 2) & (values < low + deadband))
+    conditions = np.where(high_cond, 1, np.where(low_cond, 2, 0))
+    return np.where(np.isnan(values), active, conditions)
+
+
+def _float_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def reevaluate_alarms(variable_ids: Optional[Iterable[int]] = None) -> Dict:
+    """
+    Reevaluar las alarmas de todas las variables (o de variable_ids) contra
+    su último valor: límites y valores se cargan en arrays NumPy, se calcula
+    la condición de todas a la vez y se aplican las diferencias con las filas
+    de Alarm activas mediante escrituras en bloque. Los retardos no se
+    aplican: el resultado es el estado que corresponde al último valor. Las
+    variables archivadas conservan sus alarmas tal como están.
+    """
+    started = time.perf_counter()
+    variables = DataVariable.objects.filter(alarm_enabled=True, data_type__in=NUMERIC_DATA_TYPES)
+    active_rows = Alarm.objects.filter(
+        is_active=True, data_variable__isnull=False, alarm_type__in=('HIGH', 'LOW')
+    )
+    if variable_ids is not None:
+        variable_ids = list(variable_ids)
+        variables = variables.filter(id__in=variable_ids)
+        active_rows = active_rows.filter(data_variable_id__in=variable_ids)
+
+    now = timezone.now()
+    rows = list(variables.order_by('id').values_list(
+        'id', 'name', 'alarm_high_limit', 'alarm_low_limit', 'alarm_deadband',
+        'server_id', 'alarm_shelved_until'
+    ))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    names = {row[0]: row[1] for row in rows}
+    servers = {row[0]: row[5] for row in rows}
+    high = _float_array(row[2] for row in rows)
+    low = _float_array(row[3] for row in rows)
+    deadband = _float_array(row[4] or 0.0 for row in rows)
+    shelved = np.array([row[6] is not None and now < row[6] for row in rows], dtype=bool)
+
+    # Último valor de cada variable (solo lecturas de calidad buena)
+    values = np.full(len(ids), np.nan)
+    latest = DataReading.objects.latest_per_variable(variables).order_by().values_list(
+        'variable_id', 'value_float', 'value_integer', 'quality'
+    )
+    index = {variable_id: position for position, variable_id in enumerate(ids.tolist())}
+    for variable_id, value_float, value_integer, quality in latest:
+        value = value_float if value_float is not None else value_integer
+        if quality == 'GOOD' and value is not None:
+            values[index[variable_id]] = value
+
+    # Alarmas activas alineadas con las variables
+    active = np.zeros(len(ids), dtype=np.int64)
+    active_ids = {}
+    stale = []
+    for alarm_id, variable_id, alarm_type in active_rows.order_by().values_list('id', 'data_variable_id', 'alarm_type'):
+        position = index.get(variable_id)
+        if position is None or active[position]:
+            # Variable sin alarmas habilitadas o alarma duplicada
+            stale.append(alarm_id)
+        else:
+            active[position] = CONDITION_CODES[alarm_type]
+            active_ids[position] = alarm_id
+
+    conditions = compute_conditions(values, high, low, deadband, active)
+    conditions = np.where(shelved, active, conditions)
+    changed = np.flatnonzero(conditions != active)
+
+    cleared = stale + [active_ids[position] for position in changed.tolist() if active[position]]
+    raised = []
+    for position in changed.tolist():
+        code = int(conditions[position])
+        if not code:
+            continue
+        variable_id = int(ids[position])
+        value = float(values[position])
+        if code == 1:
+            message = f'{names[variable_id]}: valor {value} por encima del límite alto {high[position]}'
+        else:
+            message = f'{names[variable_id]}: valor {value} por debajo del límite bajo {low[position]}'
+        raised.append(Alarm(
+            data_variable_id=variable_id, data_server_id=servers[variable_id],
+            alarm_type=CONDITION_NAMES[code], message=message, value=value, timestamp=now
+        ))
+
+    with transaction.atomic():
+        if cleared:
+            Alarm.objects.filter(id__in=cleared).update(is_active=False, cleared_at=now)
+        Alarm.objects.bulk_create(raised, batch_size=1000)
+
+    # Consultas y escrituras sin el bloqueo del motor (no detienen la ingesta);
+    # bajo el bloqueo solo se actualiza el estado en memoria de las variables
+    # reevaluadas (las archivadas no cambian). Los límites se recargan por la
+    # versión de configuración
+    synced = {
+        int(ids[position]): (CONDITION_NAMES[int(conditions[position])],
+                             active_ids.get(position) if conditions[position] == active[position] else None)
+        for position in np.flatnonzero(~shelved).tolist()
+    }
+    for alarm in raised:
+        synced[alarm.data_variable_id] = (alarm.alarm_type, alarm.id)
+    alarm_engine.sync_limit_states(synced, cleared, now)
+    active_alarms.invalidate()
+
+    return {
+        'evaluated': len(ids),
+        'raised': len(raised),
+        'cleared': len(cleared),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,621 @@
+# async_views.py
+"""
+Vistas asíncronas (ASGI) para operaciones con dispositivos del sistema
+multi-protocolo: lectura, escritura, conexión y prueba de conexión, y el
+flujo de valores en vivo (SSE).
+Esperan directamente al bucle de adquisición compartido (data_manager), de
+modo que un worker atiende muchas operaciones concurrentes sin un hilo por
+petición.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .caching import configuration_changed
+from .changes import change_feed, snapshot
+from .data_clients import DataClientFactory, data_manager
+from .ingest import reading_ingestor
+from .live import LiveUpdate, live_hub
+from .models import DataReading, DataServer, DataVariable
+
+logger = logging.getLogger(__name__)
+
+
+def api_response(data, status_code=status.HTTP_200_OK):
+    """Respuesta JSON con el mismo formato que las vistas DRF"""
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def error_response(message, status_code):
+    return api_response({'status': 'error', 'message': message}, status_code)
+
+
+def _authenticate(request, require_auth):
+    """Autenticar con las clases de DRF configuradas y parsear el cuerpo"""
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = drf_request.user
+        drf_request.data
+    except exceptions.APIException as e:
+        return None, api_response({'detail': str(e.detail)}, e.status_code)
+
+    if require_auth and not (user and user.is_authenticated):
+        # Mismo criterio que DRF: 401 con WWW-Authenticate si el autenticador lo define
+        exc = exceptions.NotAuthenticated()
+        auth_header = None
+        if drf_request.authenticators:
+            auth_header = drf_request.authenticators[0].authenticate_header(drf_request)
+        response = api_response(
+            {'detail': str(exc.detail)},
+            status.HTTP_401_UNAUTHORIZED if auth_header else status.HTTP_403_FORBIDDEN
+        )
+        if auth_header:
+            response['WWW-Authenticate'] = auth_header
+        return None, response
+    return drf_request, None
+
+
+async def authenticate(request, require_auth=True):
+    """Versión asíncrona de _authenticate (la autenticación puede consultar la BD)"""
+    return await sync_to_async(_authenticate)(request, require_auth)
+
+
+def _not_found():
+    return api_response({'detail': 'No encontrado.'}, status.HTTP_404_NOT_FOUND)
+
+
+async def _persist_reading(variable, value):
+    """Guardar una lectura a través de la ruta de ingesta"""
+    reading = DataReading(variable=variable, timestamp=timezone.now(), quality='GOOD')
+    reading.set_value(value)
+    await sync_to_async(reading_ingestor.ingest)([reading])
+    return reading
+
+
+# === VARIABLES DE DATOS ===
+
+@csrf_exempt
+@require_POST
+async def read_value(request, pk):
+    """Leer el valor actual de una variable"""
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        variable = await DataVariable.objects.select_related('server').aget(pk=pk)
+    except DataVariable.DoesNotExist:
+        return _not_found()
+
+    try:
+        value = await data_manager.submit(
+            data_manager.read_variable(
+                str(variable.server.id),
+                variable.address,
+                variable.get_protocol_config()
+            )
+        )
+
+        if value is not None:
+            # Crear lectura en la base de datos
+            reading = await _persist_reading(variable, value)
+
+            return api_response({
+                'variable': variable.name,
+                'value': value,
+                'timestamp': reading.timestamp,
+                'quality': reading.quality
+            })
+        else:
+            return error_response('No se pudo leer la variable', status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Error leyendo variable {pk}: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def write_value(request, pk):
+    """Escribir un valor a una variable"""
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        variable = await DataVariable.objects.select_related('server').aget(pk=pk)
+    except DataVariable.DoesNotExist:
+        return _not_found()
+
+    try:
+        value = drf_request.data.get('value')
+
+        if value is None:
+            return error_response('Valor requerido', status.HTTP_400_BAD_REQUEST)
+
+        if not variable.is_writable:
+            return error_response('Variable no es escribible', status.HTTP_400_BAD_REQUEST)
+
+        success = await data_manager.submit(
+            data_manager.write_variable(
+                str(variable.server.id),
+                variable.address,
+                value,
+                variable.get_protocol_config()
+            )
+        )
+
+        if success:
+            # Crear lectura de confirmación
+            reading = await _persist_reading(variable, value)
+
+            return api_response({
+                'variable': variable.name,
+                'value': value,
+                'timestamp': reading.timestamp,
+                'status': 'written'
+            })
+        else:
+            return error_response('No se pudo escribir la variable', status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Error escribiendo variable {pk}: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def parse_variable_ids(data, key='variable_ids'):
+    """Validar una lista de ids de variables; devuelve (ids, mensaje de error)"""
+    ids = data.get(key) if hasattr(data, 'get') else None
+    if not isinstance(ids, list) or not ids:
+        return None, f'{key} debe ser una lista no vacía'
+    try:
+        return list(dict.fromkeys(int(pk) for pk in ids)), None
+    except (TypeError, ValueError):
+        return None, f'{key} debe contener ids enteros'
+
+
+@csrf_exempt
+@require_POST
+async def read_many(request):
+    """
+    Leer varias variables en una sola petición: se agrupan por servidor, se
+    lanza una lectura en bloque por servidor en paralelo y las lecturas se
+    guardan con un único INSERT
+    """
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    ids, message = parse_variable_ids(drf_request.data)
+    if message:
+        return error_response(message, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        variables = {
+            variable.id: variable
+            async for variable in DataVariable.objects.select_related('server').filter(id__in=ids).order_by()
+        }
+
+        # Agrupar por servidor conservando el orden de la petición
+        groups = defaultdict(list)
+        for pk in ids:
+            if pk in variables:
+                groups[str(variables[pk].server_id)].append(variables[pk])
+
+        values = await data_manager.submit(data_manager.read_many({
+            server_id: [(variable.address, variable.get_protocol_config()) for variable in group]
+            for server_id, group in groups.items()
+        }))
+
+        timestamp = timezone.now()
+        readings = []
+        results = {}
+        for server_id, group in groups.items():
+            for variable, (value, quality) in zip(group, values[server_id]):
+                if value is not None:
+                    reading = DataReading(variable=variable, timestamp=timestamp, quality=quality)
+                    reading.set_value(value)
+                    readings.append(reading)
+                    quality = reading.quality
+                results[variable.id] = {
+                    'id': variable.id,
+                    'variable': variable.name,
+                    'value': value,
+                    'quality': quality,
+                    'timestamp': timestamp
+                }
+
+        # Un único INSERT para todas las lecturas obtenidas
+        await sync_to_async(reading_ingestor.ingest)(readings)
+
+        return api_response({
+            'count': len(results),
+            'results': [results[pk] for pk in ids if pk in results],
+            'not_found': [pk for pk in ids if pk not in variables]
+        })
+
+    except Exception as e:
+        logger.error(f"Error leyendo variables en bloque: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def write_many(request):
+    """
+    Escribir varias variables en una sola petición (descarga de recetas).
+    Se valida todo antes de escribir (existencia, is_writable y tipo); si algo
+    falla no se escribe nada. Las escrituras se agrupan por servidor en una
+    escritura en bloque por servidor y las lecturas de confirmación se guardan
+    con un único INSERT
+    """
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    writes = drf_request.data.get('writes') if hasattr(drf_request.data, 'get') else None
+    if not isinstance(writes, list) or not writes:
+        return error_response('writes debe ser una lista no vacía', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        ids = [int(item['variable_id']) for item in writes]
+    except (TypeError, ValueError, KeyError):
+        return error_response(
+            'Cada escritura requiere variable_id entero y value', status.HTTP_400_BAD_REQUEST
+        )
+    if len(set(ids)) != len(ids):
+        return error_response('Variables repetidas en writes', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        variables = {
+            variable.id: variable
+            async for variable in DataVariable.objects.select_related('server').filter(id__in=ids).order_by()
+        }
+
+        # Validación previa de todas las escrituras
+        errors = []
+        values = {}
+        for pk, item in zip(ids, writes):
+            variable = variables.get(pk)
+            if variable is None:
+                errors.append({'id': pk, 'message': 'Variable no encontrada'})
+            elif not variable.is_writable:
+                errors.append({'id': pk, 'message': 'Variable no es escribible'})
+            else:
+                try:
+                    values[pk] = variable.coerce_value(item.get('value'))
+                except ValueError as e:
+                    errors.append({'id': pk, 'message': str(e)})
+
+        if errors:
+            return api_response({
+                'status': 'error',
+                'message': 'Validación fallida; no se escribió ninguna variable',
+                'errors': errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        groups = defaultdict(list)
+        for pk in ids:
+            groups[str(variables[pk].server_id)].append(variables[pk])
+
+        outcomes = await data_manager.submit(data_manager.write_many({
+            server_id: [
+                (variable.address, values[variable.id], variable.get_protocol_config())
+                for variable in group
+            ]
+            for server_id, group in groups.items()
+        }))
+
+        timestamp = timezone.now()
+        readings = []
+        results = {}
+        for server_id, group in groups.items():
+            for variable, (success, status_code) in zip(group, outcomes[server_id]):
+                if success:
+                    # Lectura de confirmación
+                    reading = DataReading(
+                        variable=variable, timestamp=timestamp, quality='GOOD', status_code=status_code
+                    )
+                    reading.set_value(values[variable.id])
+                    readings.append(reading)
+                results[variable.id] = {
+                    'id': variable.id,
+                    'variable': variable.name,
+                    'value': values[variable.id],
+                    'status': 'written' if success else 'failed',
+                    'status_code': status_code
+                }
+
+        await sync_to_async(reading_ingestor.ingest)(readings)
+
+        return api_response({
+            'count': len(results),
+            'written': len(readings),
+            'failed': len(results) - len(readings),
+            'timestamp': timestamp,
+            'results': [results[pk] for pk in ids]
+        })
+
+    except Exception as e:
+        logger.error(f"Error escribiendo variables en bloque: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# === SERVIDORES DE DATOS ===
+
+@csrf_exempt
+@require_POST
+async def connect(request, pk):
+    """Conectar a un servidor específico"""
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        server = await DataServer.objects.aget(pk=pk)
+    except DataServer.DoesNotExist:
+        return _not_found()
+
+    try:
+        # Preparar configuración del servidor
+        server_config = {
+            'endpoint_url': server.endpoint_url,
+            'username': server.username,
+            'password': server.password,
+            'connection_config': server.get_connection_config()
+        }
+
+        success = await data_manager.submit(
+            data_manager.add_server(str(server.id), server.server_type, server_config)
+        )
+        await sync_to_async(configuration_changed)()
+
+        if success:
+            return api_response({
+                'status': 'connected',
+                'message': f'Conectado exitosamente a {server.name}'
+            })
+        else:
+            return error_response(f'Error conectando a {server.name}', status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Error conectando servidor {pk}: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def disconnect(request, pk):
+    """Desconectar de un servidor específico"""
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        server = await DataServer.objects.aget(pk=pk)
+    except DataServer.DoesNotExist:
+        return _not_found()
+
+    try:
+        await data_manager.submit(data_manager.remove_server(str(server.id)))
+        await sync_to_async(configuration_changed)()
+
+        return api_response({
+            'status': 'disconnected',
+            'message': f'Desconectado de {server.name}'
+        })
+
+    except Exception as e:
+        logger.error(f"Error desconectando servidor {pk}: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def _probe_connection(client):
+    """Conectar y desconectar un cliente temporal"""
+    success = await client.connect()
+    if success:
+        await client.disconnect()
+    return success
+
+
+@csrf_exempt
+@require_POST
+async def test_connection(request):
+    """Probar conexión a un servidor sin guardarlo"""
+    drf_request, error = await authenticate(request, require_auth=False)
+    if error:
+        return error
+
+    try:
+        data = drf_request.data
+
+        server_config = {
+            'endpoint_url': data.get('endpoint_url'),
+            'username': data.get('username'),
+            'password': data.get('password'),
+            'connection_config': data.get('connection_config', {})
+        }
+
+        client = DataClientFactory.create_client(data.get('server_type'), server_config)
+        if not client:
+            return error_response('Tipo de servidor no soportado', status.HTTP_400_BAD_REQUEST)
+
+        if await data_manager.submit(_probe_connection(client)):
+            return api_response({
+                'status': 'success',
+                'message': 'Conexión exitosa'
+            })
+        return error_response('No se pudo conectar al servidor', status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Error probando conexión: {e}")
+        return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# === TIEMPO REAL ===
+
+def sse_event(data, event_id=None, event='update'):
+    """Codificar un evento Server-Sent Events"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, cls=JSONEncoder, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def parse_id_param(value):
+    """Lista de ids separados por comas ('1,2,3')"""
+    return list(dict.fromkeys(int(pk) for pk in value.split(',') if pk.strip()))
+
+
+def _latest_updates(variable_ids, last_event_id):
+    """Última lectura de cada variable (solo las posteriores a last_event_id)"""
+    readings = DataReading.objects.latest_per_variable(
+        DataVariable.objects.filter(id__in=variable_ids)
+    ).select_related('variable')
+    if last_event_id is not None:
+        readings = readings.filter(id__gt=last_event_id)
+    return sorted((LiveUpdate(reading) for reading in readings), key=lambda update: update.id)
+
+
+async def live_events(variable_ids, last_event_id=None, interval=0.25, heartbeat=15):
+    """
+    Generador SSE: instantánea inicial (o lo ocurrido desde last_event_id) y
+    después los cambios, como mucho un evento por intervalo; dentro del
+    intervalo se envía solo el último valor de cada variable
+    """
+    subscription = live_hub.subscribe(variable_ids)
+    try:
+        yield f'retry: {settings.LIVE_STREAM_RETRY_MS}\n\n'.encode('utf-8')
+
+        sent = {}
+        updates = await sync_to_async(_latest_updates)(variable_ids, last_event_id)
+        last_flush = 0.0
+        while True:
+            updates = [u for u in updates if u.id > sent.get(u.variable_id, 0)]
+            if updates:
+                for update in updates:
+                    sent[update.variable_id] = update.id
+                last_flush = time.monotonic()
+                yield sse_event([update.data for update in updates], event_id=updates[-1].id)
+
+            if not await subscription.wait(heartbeat):
+                yield b': keepalive\n\n'
+                updates = []
+                continue
+
+            # Coalescencia: no enviar más de un evento por intervalo
+            delay = last_flush + interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            updates = subscription.drain()
+    finally:
+        live_hub.unsubscribe(subscription)
+
+
+@require_GET
+async def live_stream(request):
+    """
+    Flujo SSE de valores en vivo: ?variables=1,2,3 o ?server=<id>,
+    ?interval=<ms> de coalescencia y reanudación con Last-Event-ID
+    """
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        variables = DataVariable.objects.all()
+        if request.GET.get('variables'):
+            variables = variables.filter(id__in=parse_id_param(request.GET['variables']))
+        elif request.GET.get('server'):
+            variables = variables.filter(server_id=int(request.GET['server']))
+        else:
+            return error_response('Parámetro variables o server requerido', status.HTTP_400_BAD_REQUEST)
+
+        interval = int(request.GET.get('interval', settings.LIVE_STREAM_COALESCE_MS))
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return error_response('Parámetros inválidos', status.HTTP_400_BAD_REQUEST)
+
+    variable_ids = [pk async for pk in variables.order_by().values_list('id', flat=True)]
+    if not variable_ids:
+        return _not_found()
+
+    interval = min(max(interval, 50), 10000) / 1000
+    response = StreamingHttpResponse(
+        live_events(
+            variable_ids, last_event_id, interval, settings.LIVE_STREAM_HEARTBEAT_SECONDS
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+async def changes(request):
+    """
+    Variables que cambiaron después de ?since=<seq> (id de lectura). Sin
+    since devuelve el valor actual de todas. ?wait=<s> mantiene la petición
+    abierta hasta que haya cambios (long-poll). Filtros: variables, server
+    """
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    try:
+        since = request.GET.get('since')
+        since = int(since) if since not in (None, '') else None
+        wait = min(max(float(request.GET.get('wait', 0)), 0), settings.CHANGE_FEED_MAX_WAIT)
+        variable_ids = parse_id_param(request.GET['variables']) if request.GET.get('variables') else None
+        server_id = int(request.GET['server']) if request.GET.get('server') else None
+    except ValueError:
+        return error_response('Parámetros inválidos', status.HTTP_400_BAD_REQUEST)
+
+    if since is None:
+        updates, seq = await sync_to_async(snapshot)(variable_ids, server_id)
+        source = 'database'
+    else:
+        # Registrar la espera antes de consultar para no perder cambios
+        waiter = change_feed.waiter() if wait else None
+        updates, seq, source = await sync_to_async(change_feed.changes_since)(since, variable_ids, server_id)
+        if waiter:
+            # Lotes que no pasan los filtros no cortan la espera: se vuelve a esperar el tiempo restante
+            deadline = time.monotonic() + wait
+            while not updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await change_feed.wait(waiter, remaining):
+                    break
+                waiter = change_feed.waiter()
+                updates, seq, source = await sync_to_async(change_feed.changes_since)(
+                    since, variable_ids, server_id
+                )
+            change_feed.discard(waiter)
+
+    return api_response({
+        'seq': seq,
+        'source': source,
+        'count': len(updates),
+        'changes': [update.data for update in updates]
+    })
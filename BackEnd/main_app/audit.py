@@ -0,0 +1,244 @@
+# audit.py
+"""
+Auditoría con escritura diferida
+El middleware y audit_event() solo construyen el AuditLog y lo dejan en un
+búfer acotado en memoria; un hilo en segundo plano los inserta en bloque
+(bulk_create) cada AUDIT_LOG_FLUSH_INTERVAL segundos o al llegar a
+AUDIT_LOG_BATCH_SIZE eventos. Si el búfer se llena se descartan los eventos
+más antiguos; al terminar el proceso se escribe lo pendiente. El hilo lo
+arrancan los puntos de entrada del servidor (asgi.py / wsgi.py); sin él
+(pruebas, comandos) los eventos quedan en el búfer hasta flush().
+"""
+
+import atexit
+import ipaddress
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.functional import SimpleLazyObject, empty
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# Métodos que modifican estado (los únicos auditados por el middleware)
+AUDITED_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Acción según el método en rutas de lista/detalle del router
+METHOD_ACTIONS = {'POST': 'create', 'PUT': 'update', 'PATCH': 'update', 'DELETE': 'delete'}
+
+# Claves del cuerpo que nunca se guardan
+REDACTED_KEYS = ('password', 'token', 'secret')
+
+
+class AuditWriter:
+    """Búfer acotado de AuditLog con inserción en bloque desde un hilo propio"""
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 200, interval: float = 2.0):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def record(self, entry: AuditLog):
+        """Encolar un evento (sin acceso a la base de datos)"""
+        with self._condition:
+            if len(self._buffer) >= self.max_size:
+                self._buffer.popleft()
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"Búfer de auditoría lleno: {self.dropped} eventos descartados")
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def start(self):
+        """Arrancar el hilo escritor (una vez por proceso) y escribir lo pendiente al salir"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._buffer) >= self.batch_size, self.interval)
+            close_old_connections()
+            self.flush()
+
+    def flush(self) -> int:
+        """Insertar lo pendiente; devuelve los eventos escritos"""
+        with self._condition:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        if not batch:
+            return 0
+        try:
+            AuditLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception as e:
+            logger.error(f"Error escribiendo {len(batch)} eventos de auditoría, se reintentan uno a uno: {e}")
+            return self._save_each(batch)
+        return len(batch)
+
+    @staticmethod
+    def _save_each(batch) -> int:
+        """Guardar los eventos por separado: solo se pierden los que fallan"""
+        written = 0
+        for entry in batch:
+            try:
+                entry.save(force_insert=True)
+                written += 1
+            except Exception as e:
+                logger.error(f"Evento de auditoría descartado ({entry.action}): {e}")
+        return written
+
+    def __len__(self):
+        return len(self._buffer)
+
+
+# Instancia global del escritor de auditoría
+audit_writer = AuditWriter(
+    settings.AUDIT_LOG_QUEUE_SIZE, settings.AUDIT_LOG_BATCH_SIZE, settings.AUDIT_LOG_FLUSH_INTERVAL
+)
+
+
+def valid_ip(value) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except ValueError:
+        return None
+
+
+def client_ip(request) -> Optional[str]:
+    """
+    IP del cliente: REMOTE_ADDR, o X-Forwarded-For solo si la petición llega
+    de un proxy de AUDIT_TRUSTED_PROXIES (primera dirección por la derecha
+    que no es un proxy de confianza). None si no es una IP válida.
+    """
+    remote = valid_ip(request.META.get('REMOTE_ADDR', ''))
+    trusted = set(settings.AUDIT_TRUSTED_PROXIES)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not forwarded or remote not in trusted:
+        return remote
+    for address in reversed(forwarded.split(',')):
+        address = valid_ip(address)
+        if address is None:
+            return None
+        if address not in trusted:
+            return address
+    return remote
+
+
+def redact(data: Any) -> Any:
+    """Quitar contraseñas y tokens de un cuerpo JSON"""
+    if isinstance(data, dict):
+        return {
+            key: '***' if any(word in str(key).lower() for word in REDACTED_KEYS) else redact(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [redact(item) for item in data]
+    return data
+
+
+def resolved_user(request):
+    """Usuario ya autenticado de la petición, sin forzar la carga perezosa (no consulta la BD)"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    return user if user is not None and user.is_authenticated else None
+
+
+def audit_event(request, action: str, model: str = '', object_id=None, object_repr: Optional[str] = None,
+                changes: Optional[Dict] = None, user=None):
+    """Registrar un evento de auditoría explícito (login, logout...) sin bloquear"""
+    http_request = getattr(request, '_request', request)
+    http_request._audit_recorded = True
+    audit_writer.record(AuditLog(
+        user=user if user is not None else resolved_user(http_request),
+        action=action[:100], model=model[:100],
+        object_id=str(object_id) if object_id is not None else None,
+        object_repr=object_repr[:200] if object_repr else None,
+        changes=redact(changes) if changes is not None else None,
+        ip_address=client_ip(http_request),
+        user_agent=http_request.META.get('HTTP_USER_AGENT'),
+    ))
+
+
+class AuditMiddleware:
+    """
+    Auditar las peticiones de escritura exitosas a la API (tags, configuración,
+    alarmas...). La vista y el modelo salen del nombre de la URL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        body = self._capture(request)
+        response = self.get_response(request)
+        self._record(request, response, body)
+        return response
+
+    async def __acall__(self, request):
+        body = self._capture(request)
+        response = await self.get_response(request)
+        self._record(request, response, body)
+        return response
+
+    @staticmethod
+    def _audited(request) -> bool:
+        return request.method in AUDITED_METHODS and request.path.startswith('/api/')
+
+    def _capture(self, request):
+        """Cuerpo JSON de la petición (se lee antes que la vista; queda en caché)"""
+        if not self._audited(request) or request.content_type != 'application/json':
+            return None
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if length > settings.AUDIT_LOG_MAX_BODY:
+            return {'truncated': True, 'size': length}
+        try:
+            return redact(json.loads(request.body or b'null'))
+        except ValueError:
+            return None
+
+    def _record(self, request, response, body):
+        if not self._audited(request) or response.status_code >= 400:
+            return
+        if getattr(request, '_audit_recorded', False):
+            return
+        match = request.resolver_match
+        if match is None:
+            return
+
+        name = match.url_name or ''
+        model, _, action = name.partition('-') if '-' in name else ('', '', name)
+        if action in ('list', 'detail'):
+            action = METHOD_ACTIONS[request.method]
+        audit_writer.record(AuditLog(
+            user=resolved_user(request),
+            action=action[:100], model=model[:100],
+            object_id=str(match.kwargs['pk']) if 'pk' in match.kwargs else None,
+            changes=body,
+            ip_address=client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT'),
+        ))
@@ -0,0 +1,77 @@
+# authentication.py
+"""
+Autenticación por token con caché en memoria
+Evita la consulta authtoken_token + auth_user en cada petición. La caché es
+por proceso (LRU acotada con TTL); se invalida al borrar el token (logout)
+y al modificar o desactivar el usuario (ver signals.py). En otros procesos
+la entrada caduca como mucho tras AUTH_TOKEN_CACHE_TTL segundos.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Caché LRU con TTL de token -> (usuario, token)"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, credentials = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return credentials
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, (user, token))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, (user, _)) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instancia global de la caché de tokens
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication de DRF con caché de credenciales"""
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is not None:
+            return credentials
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
@@ -0,0 +1,127 @@
+# caching.py
+"""
+Caché de respuestas agregadas y validación condicional (ETag) del sistema
+multi-protocolo
+"""
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+DASHBOARD_SUMMARY_CACHE_KEY = 'main_app:dashboard_summary'
+CONFIG_VERSION_CACHE_KEY = 'main_app:config_version'
+
+
+def get_dashboard_summary(build_summary, state=None):
+    """
+    Obtener (resumen, ETag) del dashboard desde caché o construirlo con
+    build_summary(). Se reconstruye al vencer el TTL o si cambió state
+    (secuencia de cambios y conexiones); el ETag es el hash del resumen
+    guardado, así siempre corresponde al cuerpo servido.
+    """
+    cached = cache.get(DASHBOARD_SUMMARY_CACHE_KEY)
+    if cached is None or cached['state'] != state:
+        summary = build_summary()
+        cached = {'state': state, 'summary': summary, 'etag': payload_etag(summary)}
+        cache.set(DASHBOARD_SUMMARY_CACHE_KEY, cached, settings.DASHBOARD_SUMMARY_CACHE_TTL)
+    return cached['summary'], cached['etag']
+
+
+def payload_etag(data):
+    """ETag débil calculado a partir del contenido de la respuesta"""
+    content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return 'W/"%s"' % hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def invalidate_dashboard_summary():
+    """Invalidar el resumen del dashboard"""
+    cache.delete(DASHBOARD_SUMMARY_CACHE_KEY)
+
+
+def get_config_version():
+    """Versión de configuración actual (cambia con servidores, variables y conexiones)"""
+    version = cache.get(CONFIG_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(CONFIG_VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(CONFIG_VERSION_CACHE_KEY)
+    return version
+
+
+def configuration_changed():
+    """Registrar un cambio de configuración o de conexiones"""
+    try:
+        cache.incr(CONFIG_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(CONFIG_VERSION_CACHE_KEY, time.time_ns(), None)
+    invalidate_dashboard_summary()
+
+
+def get_last_reading_id():
+    """Id de la última lectura ingresada (búsqueda por clave primaria)"""
+    from .models import DataReading
+    return DataReading.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _etag_matches(etag, if_none_match):
+    """Comparación débil de ETags según RFC 9110"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    if '*' in candidates:
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.removeprefix('W/') == opaque for tag in candidates)
+
+
+def conditional_response(request, data, etag):
+    """Respuesta 200 con data, o 304 si el cliente ya tiene ese ETag"""
+    if _etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    return response
+
+
+def conditional_on_changes(scope, extra=None):
+    """
+    Decorador de vistas GET: calcula un ETag a partir de la secuencia de
+    cambios (última lectura ingresada + versión de configuración) y responde
+    304 antes de ejecutar la vista si el cliente ya tiene esa versión.
+    Sirve para funciones de vista y para acciones de ViewSet.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = args[0] if isinstance(args[0], (HttpRequest, Request)) else args[1]
+            
+            parts = [
+                scope,
+                request.get_full_path(),
+                str(get_config_version()),
+                str(get_last_reading_id()),
+            ]
+            if extra is not None:
+                parts.append(str(extra()))
+            etag = 'W/"%s"' % hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+            
+            if _etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view_func(*args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+# changes.py
+"""
+Feed de cambios por número de secuencia
+La secuencia de cada lectura es su id (autoincremental). Un anillo en
+memoria guarda los cambios recientes ingresados en este proceso; si no
+cubre todo lo ocurrido desde la secuencia pedida (otro proceso, lecturas
+purgadas del anillo) se responde desde la base de datos.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .live import LiveUpdate
+from .models import DataReading, DataVariable
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """Anillo de cambios recientes con espera (long-poll) de nuevos cambios"""
+
+    def __init__(self, size: int = 10000):
+        self._ring = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def publish(self, readings: Iterable):
+        """Añadir un lote ingresado y despertar a los clientes en espera"""
+        updates = [LiveUpdate(reading) for reading in readings if reading.id is not None]
+        with self._lock:
+            self._ring.extend(updates)
+            waiters, self._waiters = self._waiters, set()
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass
+
+    def waiter(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Future]:
+        """Registrar una espera antes de consultar (no se pierde ningún cambio)"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    async def wait(self, waiter, timeout: float) -> bool:
+        """Esperar al siguiente lote; False si vence el tiempo"""
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.discard(waiter)
+
+    def discard(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def _from_ring(self, since: int) -> Tuple[Dict[int, LiveUpdate], int, int]:
+        """Último cambio por variable posterior a since, cambios vistos y secuencia máxima"""
+        latest = {}
+        seen = 0
+        last = since
+        with self._lock:
+            for update in reversed(self._ring):
+                if update.id <= since:
+                    break
+                seen += 1
+                last = max(last, update.id)
+                latest.setdefault(update.variable_id, update)
+        return latest, seen, last
+
+    def changes_since(self, since: int, variable_ids: Optional[Iterable[int]] = None,
+                      server_id: Optional[int] = None) -> Tuple[List[LiveUpdate], int, str]:
+        """
+        Cambios posteriores a since como (actualizaciones, secuencia, origen).
+        El anillo solo se usa si contiene exactamente las lecturas que la base
+        de datos tiene después de since (una consulta COUNT sobre la clave).
+        """
+        totals = DataReading.objects.filter(id__gt=since).aggregate(count=Count('id'), last=Max('id'))
+        if not totals['count']:
+            return [], since, 'memory'
+
+        latest, seen, last = self._from_ring(since)
+        if seen == totals['count']:
+            updates, source = list(latest.values()), 'memory'
+        else:
+            updates, source = self._from_database(since, variable_ids, server_id), 'database'
+            last = totals['last']
+
+        if variable_ids is not None:
+            variable_ids = set(variable_ids)
+            updates = [update for update in updates if update.variable_id in variable_ids]
+        if server_id is not None:
+            updates = [update for update in updates if update.server_id == server_id]
+        return sorted(updates, key=lambda update: update.id), last, source
+
+    def _from_database(self, since: int, variable_ids=None, server_id=None) -> List[LiveUpdate]:
+        changed = DataVariable.objects.filter(
+            id__in=DataReading.objects.filter(id__gt=since).values('variable_id')
+        )
+        if variable_ids is not None:
+            changed = changed.filter(id__in=variable_ids)
+        if server_id is not None:
+            changed = changed.filter(server_id=server_id)
+        readings = DataReading.objects.latest_per_variable(changed).select_related('variable')
+        return [LiveUpdate(reading) for reading in readings]
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def snapshot(variable_ids: Optional[Iterable[int]] = None, server_id: Optional[int] = None):
+    """Último valor de cada variable y secuencia actual (primera petición)"""
+    variables = DataVariable.objects.all()
+    if variable_ids is not None:
+        variables = variables.filter(id__in=variable_ids)
+    if server_id is not None:
+        variables = variables.filter(server_id=server_id)
+    last = DataReading.objects.aggregate(last=Max('id'))['last'] or 0
+    readings = DataReading.objects.latest_per_variable(variables).select_related('variable')
+    return sorted((LiveUpdate(reading) for reading in readings), key=lambda update: update.id), last
+
+
+# Instancia global del feed de cambios
+change_feed = ChangeFeed(settings.CHANGE_FEED_RING_SIZE)
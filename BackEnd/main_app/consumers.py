@@ -0,0 +1,156 @@
+# consumers.py
+"""
+Gateway WebSocket para dashboards (navegador)
+Los clientes se suscriben a variables y/o servidores y reciben los cambios
+del hub en vivo. Cada actualización se codifica una sola vez y el mismo
+frame se envía a todos los suscriptores; cada cliente tiene su propio límite
+de mensajes por segundo (con coalescencia del último valor por variable) y
+se desconecta si no consume a tiempo.
+
+Mensajes del cliente:
+    {"action": "auth", "token": "<token DRF>"}
+    {"action": "subscribe", "variables": [1, 2], "servers": [3]}
+    {"action": "unsubscribe", "variables": [1], "servers": [3]}
+    {"action": "ping"}
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .live import LiveUpdate, live_hub
+from .models import DataReading, DataServer, DataVariable
+
+logger = logging.getLogger(__name__)
+
+# Código de cierre para clientes que no consumen a tiempo
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+def _snapshot(variable_ids, server_ids):
+    """Última lectura de las variables y servidores suscritos"""
+    variables = DataVariable.objects.filter(id__in=variable_ids) | \
+        DataVariable.objects.filter(server_id__in=server_ids)
+    readings = DataReading.objects.latest_per_variable(variables).select_related('variable')
+    return sorted((LiveUpdate(reading) for reading in readings), key=lambda update: update.id)
+
+
+def _existing_ids(variable_ids, server_ids):
+    """Filtrar ids inexistentes"""
+    return (
+        set(DataVariable.objects.filter(id__in=variable_ids).values_list('id', flat=True)),
+        set(DataServer.objects.filter(id__in=server_ids).values_list('id', flat=True)),
+    )
+
+
+class LiveGatewayConsumer(AsyncWebsocketConsumer):
+    """Conexión de un dashboard al hub en vivo"""
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.subscription = None
+        self.sender_task = None
+        await self.accept()
+
+        self.subscription = live_hub.subscribe()
+        self.sender_task = asyncio.create_task(self._sender())
+
+    async def disconnect(self, code):
+        if self.sender_task:
+            self.sender_task.cancel()
+        if self.subscription:
+            live_hub.unsubscribe(self.subscription)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+            action = message.get('action')
+        except (ValueError, AttributeError):
+            await self.send_json({'type': 'error', 'message': 'Mensaje JSON inválido'})
+            return
+
+        if action == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif action == 'auth':
+            await self._authenticate(message.get('token'))
+        elif action in ('subscribe', 'unsubscribe'):
+            if not (self.user and self.user.is_authenticated):
+                await self.send_json({'type': 'error', 'message': 'Autenticación requerida'})
+                return
+            try:
+                variable_ids = [int(pk) for pk in message.get('variables', [])]
+                server_ids = [int(pk) for pk in message.get('servers', [])]
+            except (TypeError, ValueError):
+                await self.send_json({'type': 'error', 'message': 'Ids inválidos'})
+                return
+            if action == 'subscribe':
+                await self._subscribe(variable_ids, server_ids)
+            else:
+                live_hub.unwatch(self.subscription, variable_ids, server_ids)
+                await self.send_json({
+                    'type': 'unsubscribed', 'variables': variable_ids, 'servers': server_ids
+                })
+        else:
+            await self.send_json({'type': 'error', 'message': f'Acción no soportada: {action}'})
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content, separators=(',', ':')))
+
+    async def _authenticate(self, key):
+        try:
+            user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(key or '')
+        except exceptions.AuthenticationFailed as e:
+            await self.send_json({'type': 'error', 'message': str(e.detail)})
+            return
+        self.user = user
+        await self.send_json({'type': 'authenticated', 'username': self.user.username})
+
+    async def _subscribe(self, variable_ids, server_ids):
+        variable_ids, server_ids = await sync_to_async(_existing_ids)(variable_ids, server_ids)
+        live_hub.watch(self.subscription, variable_ids, server_ids)
+        await self.send_json({
+            'type': 'subscribed', 'variables': sorted(variable_ids), 'servers': sorted(server_ids)
+        })
+
+        # Estado actual de lo suscrito, por la misma cola que los cambios
+        self.subscription.requeue(await sync_to_async(_snapshot)(variable_ids, server_ids))
+
+    async def _sender(self):
+        """
+        Enviar las actualizaciones pendientes respetando el límite por cliente
+        (cubeta de tokens); lo que no cabe se vuelve a encolar y se coalesce
+        """
+        rate = settings.LIVE_GATEWAY_MAX_MESSAGES_PER_SECOND
+        timeout = settings.LIVE_GATEWAY_SEND_TIMEOUT
+        tokens = float(rate)
+        refilled = time.monotonic()
+
+        while True:
+            await self.subscription.wait()
+
+            now = time.monotonic()
+            tokens = min(float(rate), tokens + (now - refilled) * rate)
+            refilled = now
+            if tokens < 1:
+                await asyncio.sleep((1 - tokens) / rate)
+                continue
+
+            updates = self.subscription.drain()
+            allowed = int(tokens)
+            self.subscription.requeue(updates[allowed:])
+            for update in updates[:allowed]:
+                try:
+                    await asyncio.wait_for(self.send(text_data=update.frame), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Cliente WebSocket lento desconectado")
+                    live_hub.unsubscribe(self.subscription)
+                    await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                    return
+                tokens -= 1
@@ -11,7 +11,9 @@ import threading
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from .telemetry import ClientTelemetry
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +27,8 @@ class DataClientBase(ABC):
         self.is_connected = False
         self.callbacks = {}
         self.error_callbacks = {}
+        # Latencias y tamaños de lote (los mide el DataManager)
+        self.telemetry = ClientTelemetry()
         
     @abstractmethod
     async def connect(self) -> bool:
@@ -51,6 +55,34 @@ class DataClientBase(ABC):
         """Suscribirse a cambios en una variable"""
         pass
     
+    async def read_variables(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[Any, str]]:
+        """
+        Leer varias variables [(address, config)] y devolver [(valor, calidad)]
+        en el mismo orden. Por defecto lanza las lecturas individuales en
+        paralelo; los protocolos con lectura múltiple nativa lo sobrescriben.
+        """
+        values = await asyncio.gather(
+            *(self.read_variable(address, config) for address, config in items),
+            return_exceptions=True
+        )
+        return [
+            (None, 'BAD') if value is None or isinstance(value, Exception) else (value, 'GOOD')
+            for value in values
+        ]
+    
+    async def write_variables(self, items: List[Tuple[str, Any, Dict[str, Any]]]) -> List[Tuple[bool, Optional[int]]]:
+        """
+        Escribir varias variables [(address, valor, config)] y devolver
+        [(éxito, código de estado del protocolo)] en el mismo orden. Por
+        defecto lanza las escrituras individuales en paralelo; los protocolos
+        con escritura múltiple nativa lo sobrescriben.
+        """
+        results = await asyncio.gather(
+            *(self.write_variable(address, value, config) for address, value, config in items),
+            return_exceptions=True
+        )
+        return [(result is True, None) for result in results]
+    
     def add_data_callback(self, address: str, callback: Callable):
         """Agregar callback para datos de una variable"""
         if address not in self.callbacks:
@@ -64,6 +96,22 @@ class DataClientBase(ABC):
         self.error_callbacks['error'].append(callback)
 
 
+def ua_value_attribute():
+    """Identificador del atributo Value de OPC-UA"""
+    from opcua import ua
+    return ua.AttributeIds.Value
+
+
+def opcua_quality(status_code) -> str:
+    """Calidad de lectura a partir de un StatusCode OPC-UA (bits de severidad)"""
+    severity = (status_code.value if status_code is not None else 0) >> 30
+    if severity == 0:
+        return 'GOOD'
+    if severity == 1:
+        return 'UNCERTAIN'
+    return 'BAD'
+
+
 class OpcUaClient(DataClientBase):
     """Cliente para servidores OPC-UA"""
     
@@ -126,6 +174,25 @@ class OpcUaClient(DataClientBase):
             logger.error(f"Error leyendo variable OPC-UA {address}: {e}")
             return None
     
+    async def read_variables(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[Any, str]]:
+        """Leer varias variables OPC-UA con un único servicio Read"""
+        try:
+            if not self.is_connected:
+                await self.connect()
+            
+            node_ids = [self.client.get_node(address).nodeid for address, _ in items]
+            results = await asyncio.get_event_loop().run_in_executor(
+                None, self.client.uaclient.get_attributes, node_ids, ua_value_attribute()
+            )
+            return [
+                (result.Value.Value if result.Value else None, opcua_quality(result.StatusCode))
+                for result in results
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error leyendo variables OPC-UA: {e}")
+            return [(None, 'ERROR')] * len(items)
+    
     async def write_variable(self, address: str, value: Any, config: Dict[str, Any] = None) -> bool:
         """Escribir a una variable OPC-UA"""
         try:
@@ -140,6 +207,25 @@ class OpcUaClient(DataClientBase):
             logger.error(f"Error escribiendo variable OPC-UA {address}: {e}")
             return False
     
+    async def write_variables(self, items: List[Tuple[str, Any, Dict[str, Any]]]) -> List[Tuple[bool, Optional[int]]]:
+        """Escribir varias variables OPC-UA con un único servicio Write"""
+        try:
+            from opcua.common.ua_utils import value_to_datavalue
+            
+            if not self.is_connected:
+                await self.connect()
+            
+            node_ids = [self.client.get_node(address).nodeid for address, _, _ in items]
+            data_values = [value_to_datavalue(value) for _, value, _ in items]
+            results = await asyncio.get_event_loop().run_in_executor(
+                None, self.client.uaclient.set_attributes, node_ids, data_values
+            )
+            return [(result.is_good(), result.value) for result in results]
+            
+        except Exception as e:
+            logger.error(f"Error escribiendo variables OPC-UA: {e}")
+            return [(False, None)] * len(items)
+    
     async def subscribe_variable(self, address: str, callback: Callable, config: Dict[str, Any] = None):
         """Suscribirse a cambios en una variable OPC-UA"""
         try:
@@ -399,6 +485,35 @@ class DataManager:
     def __init__(self):
         self.clients: Dict[str, DataClientBase] = {}
         self.active_subscriptions: Dict[str, List[str]] = {}  # server_id -> [addresses]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+    
+    # === BUCLE DE ADQUISICIÓN COMPARTIDO ===
+    # Todos los clientes viven en un único event loop en un hilo dedicado, de
+    # modo que las conexiones (y sus tareas de recepción) sobreviven entre
+    # peticiones y las vistas async pueden esperar operaciones sin bloquear.
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop de adquisición (se inicia bajo demanda)"""
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(
+                        target=loop.run_forever, name='data-manager-loop', daemon=True
+                    )
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+    
+    def submit(self, coro) -> asyncio.Future:
+        """Programar una corrutina en el bucle de adquisición (awaitable desde otro loop)"""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+    
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        """Ejecutar una corrutina en el bucle de adquisición desde código síncrono"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
         
     async def add_server(self, server_id: str, server_type: str, server_config: Dict[str, Any]) -> bool:
         """Agregar un servidor al manager"""
@@ -406,7 +521,10 @@ class DataManager:
             client = DataClientFactory.create_client(server_type, server_config)
             if client:
                 self.clients[server_id] = client
-                return await client.connect()
+                start = time.perf_counter()
+                connected = await client.connect()
+                client.telemetry.record('connect', time.perf_counter() - start, ok=connected)
+                return connected
             return False
         except Exception as e:
             logger.error(f"Error agregando servidor {server_id}: {e}")
@@ -427,7 +545,9 @@ class DataManager:
         """Leer una variable de un servidor específico"""
         try:
             if server_id in self.clients:
-                return await self.clients[server_id].read_variable(address, config)
+                client = self.clients[server_id]
+                with client.telemetry.measure('read', 1):
+                    return await client.read_variable(address, config)
             else:
                 logger.error(f"Servidor no encontrado: {server_id}")
                 return None
@@ -435,11 +555,35 @@ class DataManager:
             logger.error(f"Error leyendo variable {address} de servidor {server_id}: {e}")
             return None
     
+    async def read_variables(self, server_id: str, items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[Any, str]]:
+        """Leer en bloque varias variables [(address, config)] de un servidor"""
+        try:
+            if server_id in self.clients:
+                client = self.clients[server_id]
+                with client.telemetry.measure('read', len(items)):
+                    return await client.read_variables(items)
+            else:
+                logger.error(f"Servidor no encontrado: {server_id}")
+                return [(None, 'BAD')] * len(items)
+        except Exception as e:
+            logger.error(f"Error leyendo variables de servidor {server_id}: {e}")
+            return [(None, 'ERROR')] * len(items)
+    
+    async def read_many(self, groups: Dict[str, List[Tuple[str, Dict[str, Any]]]]) -> Dict[str, List[Tuple[Any, str]]]:
+        """Leer grupos {server_id: [(address, config)]} en paralelo, una lectura por servidor"""
+        server_ids = list(groups)
+        results = await asyncio.gather(
+            *(self.read_variables(server_id, groups[server_id]) for server_id in server_ids)
+        )
+        return dict(zip(server_ids, results))
+    
     async def write_variable(self, server_id: str, address: str, value: Any, config: Dict[str, Any] = None) -> bool:
         """Escribir una variable en un servidor específico"""
         try:
             if server_id in self.clients:
-                return await self.clients[server_id].write_variable(address, value, config)
+                client = self.clients[server_id]
+                with client.telemetry.measure('write', 1):
+                    return await client.write_variable(address, value, config)
             else:
                 logger.error(f"Servidor no encontrado: {server_id}")
                 return False
@@ -447,6 +591,28 @@ class DataManager:
             logger.error(f"Error escribiendo variable {address} en servidor {server_id}: {e}")
             return False
     
+    async def write_variables(self, server_id: str, items: List[Tuple[str, Any, Dict[str, Any]]]) -> List[Tuple[bool, Optional[int]]]:
+        """Escribir en bloque varias variables [(address, valor, config)] en un servidor"""
+        try:
+            if server_id in self.clients:
+                client = self.clients[server_id]
+                with client.telemetry.measure('write', len(items)):
+                    return await client.write_variables(items)
+            else:
+                logger.error(f"Servidor no encontrado: {server_id}")
+                return [(False, None)] * len(items)
+        except Exception as e:
+            logger.error(f"Error escribiendo variables en servidor {server_id}: {e}")
+            return [(False, None)] * len(items)
+    
+    async def write_many(self, groups: Dict[str, List[Tuple[str, Any, Dict[str, Any]]]]) -> Dict[str, List[Tuple[bool, Optional[int]]]]:
+        """Escribir grupos {server_id: [(address, valor, config)]} en paralelo, una escritura por servidor"""
+        server_ids = list(groups)
+        results = await asyncio.gather(
+            *(self.write_variables(server_id, groups[server_id]) for server_id in server_ids)
+        )
+        return dict(zip(server_ids, results))
+    
     async def subscribe_variable(self, server_id: str, address: str, callback: Callable, config: Dict[str, Any] = None):
         """Suscribirse a una variable de un servidor específico"""
         try:
@@ -471,7 +637,8 @@ class DataManager:
             return {
                 'server_id': server_id,
                 'connected': client.is_connected,
-                'subscriptions': self.active_subscriptions.get(server_id, [])
+                'subscriptions': self.active_subscriptions.get(server_id, []),
+                'latency': client.telemetry.summary()
             }
         return {'server_id': server_id, 'connected': False, 'error': 'Servidor no encontrado'}
     
@@ -4,122 +4,98 @@ Vistas para el sistema de datos multi-protocolo
 Soporta: OPC-UA, OPC Classic, WebSockets, Modbus, MQTT
 """
 
-import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 
+import numpy as np
+from django.conf import settings
+from django.db.models import BigIntegerField, Case, Count, FloatField, Func, Q, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.http import JsonResponse
 from django.utils import timezone
 from rest_framework import status, viewsets, permissions
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import DataServer, DataVariable, DataReading, VariableType
+from .models import Alarm, DataServer, DataVariable, DataReading, VariableType
 from .serializers import (
     DataServerSerializer, DataVariableSerializer, DataReadingSerializer,
     DataReadingCreateSerializer, DashboardDataVariableSerializer,
-    ServerConnectionStatusSerializer
+    ServerConnectionStatusSerializer, get_sparse_fieldset
 )
+from .active_alarms import SEVERITY_ORDER, active_alarms
 from .data_clients import data_manager
+from .caching import (
+    conditional_on_changes, conditional_response, get_config_version, get_dashboard_summary,
+    get_last_reading_id
+)
+from .ingest import reading_ingestor
+from .renderers import TimeSeriesBinaryRenderer, TIME_SERIES_DTYPES, pack_time_series
 
 logger = logging.getLogger(__name__)
 
 
+class EpochMilliseconds(Func):
+    """Timestamp como entero epoch ms (truncado) calculado en la base de datos"""
+    template = 'CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) * 1000) AS BIGINT)'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite guarda 'YYYY-MM-DD HH:MM:SS[.ffffff]' en UTC: segundos más los milisegundos del texto
+        return self.as_sql(
+            compiler, connection,
+            template="(CAST(strftime('%%%%s', substr(%(expressions)s, 1, 19)) AS INTEGER) * 1000"
+                     " + CAST(substr(%(expressions)s, 21, 3) AS INTEGER))",
+            **extra_context
+        )
+
+
 class DataServerViewSet(viewsets.ModelViewSet):
     """ViewSet para gestionar servidores de datos multi-protocolo"""
     queryset = DataServer.objects.all()
     serializer_class = DataServerSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        """Servidores con el número de variables anotado (solo si se solicita)"""
+        fields = get_sparse_fieldset(self.request, self.get_serializer_class().Meta.fields)
+        queryset = DataServer.objects.all()
+        
+        if 'created_by_name' in fields:
+            queryset = queryset.select_related('created_by')
+        
+        if 'variables_count' in fields or self.action in ('status', 'all_status'):
+            queryset = queryset.annotate(variables_count=Count('datavariable'))
+        
+        return queryset
+    
     def perform_create(self, serializer):
         """Asignar usuario creador al crear servidor"""
         serializer.save(created_by=self.request.user)
     
-    @action(detail=True, methods=['post'])
-    def connect(self, request, pk=None):
-        """Conectar a un servidor específico"""
-        try:
-            server = self.get_object()
-            
-            # Preparar configuración del servidor
-            server_config = {
-                'endpoint_url': server.endpoint_url,
-                'username': server.username,
-                'password': server.password,
-                'connection_config': server.get_connection_config()
-            }
-            
-            # Usar asyncio para conectar
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            success = loop.run_until_complete(
-                data_manager.add_server(str(server.id), server.server_type, server_config)
-            )
-            
-            loop.close()
-            
-            if success:
-                return Response({
-                    'status': 'connected',
-                    'message': f'Conectado exitosamente a {server.name}'
-                })
-            else:
-                return Response({
-                    'status': 'error',
-                    'message': f'Error conectando a {server.name}'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            logger.error(f"Error conectando servidor {pk}: {e}")
-            return Response({
-                'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    @action(detail=True, methods=['post'])
-    def disconnect(self, request, pk=None):
-        """Desconectar de un servidor específico"""
-        try:
-            server = self.get_object()
-            
-            # Usar asyncio para desconectar
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            loop.run_until_complete(data_manager.remove_server(str(server.id)))
-            loop.close()
-            
-            return Response({
-                'status': 'disconnected',
-                'message': f'Desconectado de {server.name}'
-            })
-            
-        except Exception as e:
-            logger.error(f"Error desconectando servidor {pk}: {e}")
-            return Response({
-                'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    def get_status_info(self, server):
+        """Estado de conexión del manager enriquecido con información del modelo"""
+        status_info = data_manager.get_server_status(str(server.id))
+        return {
+            'server_id': str(server.id),
+            'server_name': server.name,
+            'server_type': server.server_type,
+            'is_connected': status_info.get('connected', False),
+            'endpoint_url': server.endpoint_url,
+            'variables_count': server.variables_count,
+            'active_subscriptions': status_info.get('subscriptions', []),
+            'latency': status_info.get('latency', {})
+        }
     
     @action(detail=True, methods=['get'])
     def status(self, request, pk=None):
         """Obtener estado de conexión de un servidor"""
         try:
             server = self.get_object()
-            status_info = data_manager.get_server_status(str(server.id))
-            
-            # Enriquecer con información del modelo
-            status_info.update({
-                'server_name': server.name,
-                'server_type': server.server_type,
-                'endpoint_url': server.endpoint_url,
-                'variables_count': server.datavariable_set.count()
-            })
-            
-            serializer = ServerConnectionStatusSerializer(status_info)
+            serializer = ServerConnectionStatusSerializer(self.get_status_info(server))
             return Response(serializer.data)
             
         except Exception as e:
@@ -134,17 +110,7 @@ class DataServerViewSet(viewsets.ModelViewSet):
         """Obtener estado de todos los servidores"""
         try:
             servers = self.get_queryset()
-            status_list = []
-            
-            for server in servers:
-                status_info = data_manager.get_server_status(str(server.id))
-                status_info.update({
-                    'server_name': server.name,
-                    'server_type': server.server_type,
-                    'endpoint_url': server.endpoint_url,
-                    'variables_count': server.datavariable_set.count()
-                })
-                status_list.append(status_info)
+            status_list = [self.get_status_info(server) for server in servers]
             
             serializer = ServerConnectionStatusSerializer(status_list, many=True)
             return Response(serializer.data)
@@ -163,9 +129,28 @@ class DataVariableViewSet(viewsets.ModelViewSet):
     serializer_class = DataVariableSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    # Relación necesaria para cada campo del serializer
+    related_fields = {
+        'server_name': 'server',
+        'server_type': 'server',
+        'variable_type_name': 'variable_type',
+        'created_by_name': 'created_by',
+    }
+    
     def get_queryset(self):
         """Filtrar variables por servidor si se especifica"""
-        queryset = DataVariable.objects.all().select_related('server', 'variable_type', 'created_by')
+        queryset = DataVariable.objects.all()
+        
+        # Solo las relaciones y anotaciones de los campos solicitados
+        fields = get_sparse_fieldset(self.request, self.get_serializer_class().Meta.fields)
+        related = {
+            relation for field_name, relation in self.related_fields.items() if field_name in fields
+        }
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        
+        if fields & {'current_value', 'last_reading_time'}:
+            queryset = queryset.with_latest_reading()
         
         server_id = self.request.query_params.get('server', None)
         if server_id:
@@ -177,122 +162,17 @@ class DataVariableViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def paginate_queryset(self, queryset):
+        """Página de resultados con sus últimas lecturas cargadas en una consulta"""
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            page = DataVariable.attach_latest_readings(page)
+        return page
+    
     def perform_create(self, serializer):
         """Asignar usuario creador al crear variable"""
         serializer.save(created_by=self.request.user)
     
-    @action(detail=True, methods=['post'])
-    def read_value(self, request, pk=None):
-        """Leer el valor actual de una variable"""
-        try:
-            variable = self.get_object()
-            
-            # Usar asyncio para leer
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            value = loop.run_until_complete(
-                data_manager.read_variable(
-                    str(variable.server.id),
-                    variable.address,
-                    variable.get_protocol_config()
-                )
-            )
-            
-            loop.close()
-            
-            if value is not None:
-                # Crear lectura en la base de datos
-                reading = DataReading(
-                    variable=variable,
-                    timestamp=timezone.now(),
-                    quality='GOOD'
-                )
-                reading.set_value(value)
-                reading.save()
-                
-                return Response({
-                    'variable': variable.name,
-                    'value': value,
-                    'timestamp': reading.timestamp,
-                    'quality': reading.quality
-                })
-            else:
-                return Response({
-                    'status': 'error',
-                    'message': 'No se pudo leer la variable'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            logger.error(f"Error leyendo variable {pk}: {e}")
-            return Response({
-                'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    @action(detail=True, methods=['post'])
-    def write_value(self, request, pk=None):
-        """Escribir un valor a una variable"""
-        try:
-            variable = self.get_object()
-            value = request.data.get('value')
-            
-            if value is None:
-                return Response({
-                    'status': 'error',
-                    'message': 'Valor requerido'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if not variable.is_writable:
-                return Response({
-                    'status': 'error',
-                    'message': 'Variable no es escribible'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Usar asyncio para escribir
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            success = loop.run_until_complete(
-                data_manager.write_variable(
-                    str(variable.server.id),
-                    variable.address,
-                    value,
-                    variable.get_protocol_config()
-                )
-            )
-            
-            loop.close()
-            
-            if success:
-                # Crear lectura de confirmación
-                reading = DataReading(
-                    variable=variable,
-                    timestamp=timezone.now(),
-                    quality='GOOD'
-                )
-                reading.set_value(value)
-                reading.save()
-                
-                return Response({
-                    'variable': variable.name,
-                    'value': value,
-                    'timestamp': reading.timestamp,
-                    'status': 'written'
-                })
-            else:
-                return Response({
-                    'status': 'error',
-                    'message': 'No se pudo escribir la variable'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            logger.error(f"Error escribiendo variable {pk}: {e}")
-            return Response({
-                'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
     @action(detail=True, methods=['post'])
     def subscribe(self, request, pk=None):
         """Suscribirse a una variable para recibir actualizaciones"""
@@ -309,17 +189,14 @@ class DataVariableViewSet(viewsets.ModelViewSet):
                         quality='GOOD'
                     )
                     reading.set_value(value)
-                    reading.save()
+                    reading_ingestor.ingest([reading])
                     
                     logger.info(f"Nueva lectura para {variable.name}: {value}")
                 except Exception as e:
                     logger.error(f"Error guardando lectura: {e}")
             
-            # Usar asyncio para suscribirse
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            loop.run_until_complete(
+            # Suscribirse en el bucle de adquisición compartido
+            data_manager.run(
                 data_manager.subscribe_variable(
                     str(variable.server.id),
                     variable.address,
@@ -328,8 +205,6 @@ class DataVariableViewSet(viewsets.ModelViewSet):
                 )
             )
             
-            loop.close()
-            
             return Response({
                 'variable': variable.name,
                 'status': 'subscribed',
@@ -343,15 +218,48 @@ class DataVariableViewSet(viewsets.ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=True, methods=['post'])
+    def shelve(self, request, pk=None):
+        """Archivar las alarmas de una variable durante 'minutes' minutos"""
+        variable = self.get_object()
+        try:
+            minutes = int(request.data.get('minutes', 60))
+        except (TypeError, ValueError):
+            minutes = 0
+        if not 0 < minutes <= settings.ALARM_SHELVE_MAX_MINUTES:
+            return Response({
+                'status': 'error',
+                'message': f'minutes debe estar entre 1 y {settings.ALARM_SHELVE_MAX_MINUTES}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        variable.alarm_shelved_until = timezone.now() + timedelta(minutes=minutes)
+        variable.alarm_shelved_by = request.user
+        variable.save(update_fields=['alarm_shelved_until', 'alarm_shelved_by', 'updated_at'])
+        return Response({
+            'variable': variable.name,
+            'status': 'shelved',
+            'shelved_until': variable.alarm_shelved_until
+        })
+    
+    @action(detail=True, methods=['post'])
+    def unshelve(self, request, pk=None):
+        """Quitar el archivado: las alarmas activas vuelven a registrarse"""
+        variable = self.get_object()
+        variable.alarm_shelved_until = None
+        variable.alarm_shelved_by = None
+        variable.save(update_fields=['alarm_shelved_until', 'alarm_shelved_by', 'updated_at'])
+        return Response({'variable': variable.name, 'status': 'unshelved'})
+    
+    @action(detail=False, methods=['get'], serializer_class=DashboardDataVariableSerializer)
+    @conditional_on_changes('data-variables-dashboard')
     def dashboard(self, request):
         """Obtener variables para el dashboard"""
         try:
             # Obtener solo variables monitoreadas
-            variables = self.get_queryset().filter(is_monitored=True)
+            variables = DataVariable.attach_latest_readings(self.get_queryset().filter(is_monitored=True))
             
             # Usar serializer ligero
-            serializer = DashboardDataVariableSerializer(variables, many=True)
+            serializer = self.get_serializer(variables, many=True)
             return Response(serializer.data)
             
         except Exception as e:
@@ -367,12 +275,25 @@ class DataReadingViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = DataReading.objects.all()
     serializer_class = DataReadingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [TimeSeriesBinaryRenderer]
     
     def get_queryset(self):
         """Filtrar lecturas por variable, servidor o fechas"""
-        queryset = DataReading.objects.all().select_related(
-            'variable', 'variable__server'
-        ).order_by('-timestamp')
+        queryset = self.get_filtered_queryset()
+        
+        # El valor depende del tipo de dato de la variable
+        fields = get_sparse_fieldset(self.request, self.get_serializer_class().Meta.fields)
+        if fields & {'server_name', 'server_type'}:
+            queryset = queryset.select_related('variable', 'variable__server')
+        elif fields & {'variable_name', 'value'}:
+            queryset = queryset.select_related('variable')
+        
+        # Limitar resultados por defecto
+        return queryset[:self.get_limit()]
+    
+    def get_filtered_queryset(self):
+        """Aplicar los filtros de la consulta sin limitar resultados"""
+        queryset = DataReading.objects.all().order_by('-timestamp')
         
         # Filtros
         variable_id = self.request.query_params.get('variable', None)
@@ -401,29 +322,75 @@ class DataReadingViewSet(viewsets.ReadOnlyModelViewSet):
             except ValueError:
                 pass
         
-        # Limitar resultados por defecto
-        limit = self.request.query_params.get('limit', 1000)
+        return queryset
+    
+    def get_limit(self):
+        """Número máximo de lecturas a devolver (por defecto 1000)"""
         try:
-            limit = int(limit)
-            queryset = queryset[:limit]
+            return int(self.request.query_params.get('limit', 1000))
         except ValueError:
-            queryset = queryset[:1000]
+            return 1000
+    
+    def list(self, request, *args, **kwargs):
+        """Listar lecturas; con ?format=bin se devuelve la serie en binario"""
+        if request.accepted_renderer.format == TimeSeriesBinaryRenderer.format:
+            return self.binary_series(request)
+        return super().list(request, *args, **kwargs)
+    
+    def binary_series(self, request):
+        """
+        Serie temporal binaria para gráficos de alta densidad: timestamps
+        int64 (epoch ms) seguidos de los valores float32/float64, ambos
+        little-endian y en el mismo orden que la respuesta JSON.
+        """
+        value_dtype = request.query_params.get('dtype', 'float32')
+        if value_dtype not in TIME_SERIES_DTYPES:
+            return Response({
+                'status': 'error',
+                'message': f'dtype no soportado: {value_dtype}'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return queryset
+        # Valor numérico calculado en la base de datos (booleanos como 0/1)
+        rows = self.get_filtered_queryset().annotate(
+            series_value=Coalesce(
+                'value_float',
+                Cast('value_integer', FloatField()),
+                Case(
+                    When(value_boolean=True, then=Value(1.0)),
+                    When(value_boolean=False, then=Value(0.0)),
+                    output_field=FloatField()
+                )
+            )
+        ).values_list(EpochMilliseconds('timestamp'), 'series_value')[:self.get_limit()]
+        
+        timestamps, values = zip(*rows) if rows else ((), ())
+        timestamps_ms = np.array(timestamps, dtype=np.int64)
+        
+        response = Response(pack_time_series(timestamps_ms, values, value_dtype))
+        response['X-Series-Count'] = str(len(timestamps))
+        response['X-Series-Dtype'] = value_dtype
+        return response
     
     @action(detail=False, methods=['get'])
     def latest(self, request):
         """Obtener las últimas lecturas de todas las variables"""
         try:
-            # Obtener la última lectura por variable
-            latest_readings = []
+            variables = DataVariable.objects.filter(is_monitored=True)
             
-            for variable in DataVariable.objects.filter(is_monitored=True):
-                last_reading = variable.readings.first()
-                if last_reading:
-                    latest_readings.append(last_reading)
+            server_id = request.query_params.get('server', None)
+            if server_id:
+                variables = variables.filter(server_id=server_id)
             
-            serializer = DataReadingSerializer(latest_readings, many=True)
+            server_type = request.query_params.get('server_type', None)
+            if server_type:
+                variables = variables.filter(server__server_type=server_type)
+            
+            # Última lectura por variable en una sola consulta
+            latest_readings = DataReading.objects.latest_per_variable(variables).select_related(
+                'variable', 'variable__server'
+            )
+            
+            serializer = self.get_serializer(latest_readings, many=True)
             return Response(serializer.data)
             
         except Exception as e:
@@ -462,101 +429,91 @@ def supported_protocols(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['POST'])
-def test_connection(request):
-    """Probar conexión a un servidor sin guardarlo"""
+def parse_alarm_filters(params):
+    """Filtros de la consola: severity (lista separada por comas) y server"""
+    severities = None
+    if params.get('severity'):
+        severities = [severity.strip().upper() for severity in str(params['severity']).split(',')]
+        invalid = [severity for severity in severities if severity not in SEVERITY_ORDER]
+        if invalid:
+            raise ValueError(f'Severidad no válida: {", ".join(invalid)}')
+    server_id = params.get('server')
+    if server_id not in (None, ''):
+        try:
+            server_id = int(server_id)
+        except (TypeError, ValueError):
+            raise ValueError('server debe ser un id numérico')
+    else:
+        server_id = None
+    return severities, server_id
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def active_alarms_console(request):
+    """Alarmas activas (en memoria) con filtros y conteos por severidad"""
     try:
-        data = request.data
-        
-        server_config = {
-            'endpoint_url': data.get('endpoint_url'),
-            'username': data.get('username'),
-            'password': data.get('password'),
-            'connection_config': data.get('connection_config', {})
-        }
-        
-        server_type = data.get('server_type')
-        
-        # Usar asyncio para probar conexión
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        from .data_clients import DataClientFactory
-        client = DataClientFactory.create_client(server_type, server_config)
-        
-        if client:
-            success = loop.run_until_complete(client.connect())
-            if success:
-                loop.run_until_complete(client.disconnect())
-                loop.close()
-                
-                return Response({
-                    'status': 'success',
-                    'message': 'Conexión exitosa'
-                })
-            else:
-                loop.close()
-                return Response({
-                    'status': 'error',
-                    'message': 'No se pudo conectar al servidor'
-                }, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            loop.close()
+        severities, server_id = parse_alarm_filters(request.query_params)
+    except ValueError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    acknowledged = request.query_params.get('acknowledged')
+    if acknowledged is not None:
+        acknowledged = acknowledged.lower() in ('1', 'true', 'yes')
+    return Response(active_alarms.query(severities, server_id, acknowledged))
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def acknowledge_alarms(request):
+    """
+    Reconocer alarmas activas en bloque con una sola sentencia UPDATE:
+    {"ids": [1, 2]} o {"all": true, "severity": "HIGH", "server": 3}
+    """
+    if 'ids' in request.data:
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
             return Response({
                 'status': 'error',
-                'message': 'Tipo de servidor no soportado'
+                'message': 'ids debe ser una lista de ids numéricos'
             }, status=status.HTTP_400_BAD_REQUEST)
-            
-    except Exception as e:
-        logger.error(f"Error probando conexión: {e}")
+    elif request.data.get('all'):
+        try:
+            ids = active_alarms.ids(*parse_alarm_filters(request.data))
+        except ValueError as e:
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    else:
         return Response({
             'status': 'error',
-            'message': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            'message': 'Indique ids o all'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    now = timezone.now()
+    acknowledged = Alarm.objects.filter(id__in=ids, is_active=True, acknowledged=False).update(
+        acknowledged=True, acknowledged_by=request.user, acknowledged_at=now
+    )
+    active_alarms.acknowledge(ids, request.user.username, now)
+    return Response({'acknowledged': acknowledged})
+
+
+def connected_servers_key():
+    """Servidores conectados actualmente (parte del estado del resumen en caché)"""
+    return sorted(
+        server_id for server_id, client in data_manager.clients.items() if client.is_connected
+    )
 
 
 @api_view(['GET'])
 def dashboard_summary(request):
-    """Obtener resumen del dashboard multi-protocolo"""
+    """
+    Obtener resumen del dashboard multi-protocolo. El resumen en caché se
+    reconstruye si hay lecturas, configuración o conexiones nuevas, y el
+    ETag se calcula sobre el resumen servido
+    """
     try:
-        # Estadísticas de servidores
-        total_servers = DataServer.objects.count()
-        active_servers = DataServer.objects.filter(is_active=True).count()
-        
-        # Estadísticas de variables
-        total_variables = DataVariable.objects.count()
-        monitored_variables = DataVariable.objects.filter(is_monitored=True).count()
-        
-        # Estadísticas de lecturas (últimas 24 horas)
-        last_24h = timezone.now() - timedelta(hours=24)
-        recent_readings = DataReading.objects.filter(timestamp__gte=last_24h).count()
-        
-        # Estado de conexiones
-        connected_servers = 0
-        for server in DataServer.objects.filter(is_active=True):
-            status = data_manager.get_server_status(str(server.id))
-            if status.get('connected', False):
-                connected_servers += 1
-        
-        # Protocolos en uso
-        protocols_in_use = DataServer.objects.values_list('server_type', flat=True).distinct()
-        
-        return Response({
-            'servers': {
-                'total': total_servers,
-                'active': active_servers,
-                'connected': connected_servers
-            },
-            'variables': {
-                'total': total_variables,
-                'monitored': monitored_variables
-            },
-            'readings': {
-                'last_24h': recent_readings
-            },
-            'protocols': list(protocols_in_use),
-            'timestamp': timezone.now()
-        })
+        state = (get_config_version(), get_last_reading_id(), connected_servers_key())
+        summary, etag = get_dashboard_summary(build_dashboard_summary, state)
+        return conditional_response(request, summary, etag)
         
     except Exception as e:
         logger.error(f"Error obteniendo resumen del dashboard: {e}")
@@ -564,3 +521,47 @@ def dashboard_summary(request):
             'status': 'error',
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def build_dashboard_summary():
+    """Construir el resumen del dashboard (se guarda en caché con TTL corto)"""
+    # Estadísticas de servidores y variables con conteos condicionales
+    servers = DataServer.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True))
+    )
+    variables = DataVariable.objects.aggregate(
+        total=Count('id'),
+        monitored=Count('id', filter=Q(is_monitored=True))
+    )
+    
+    # Lecturas de las últimas 24 horas desde los contadores por minuto
+    last_24h = timezone.now() - timedelta(hours=24)
+    recent_readings = reading_ingestor.count_since(last_24h)
+    
+    # Estado de conexiones (en memoria)
+    active_server_ids = DataServer.objects.filter(is_active=True).values_list('id', flat=True)
+    connected_servers = sum(
+        1 for server_id in active_server_ids
+        if data_manager.get_server_status(str(server_id)).get('connected', False)
+    )
+    
+    # Protocolos en uso
+    protocols_in_use = DataServer.objects.order_by().values_list('server_type', flat=True).distinct()
+    
+    return {
+        'servers': {
+            'total': servers['total'],
+            'active': servers['active'],
+            'connected': connected_servers
+        },
+        'variables': {
+            'total': variables['total'],
+            'monitored': variables['monitored']
+        },
+        'readings': {
+            'last_24h': recent_readings
+        },
+        'protocols': list(protocols_in_use),
+        'timestamp': timezone.now()
+    }
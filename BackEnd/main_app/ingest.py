@@ -0,0 +1,96 @@
+# ingest.py
+"""
+Ruta de ingesta de lecturas del sistema multi-protocolo
+Todas las lecturas nuevas pasan por aquí para persistirse en bloque y
+mantener los agregados derivados (contadores por minuto)
+"""
+
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Iterable, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .metrics import ingest_batch_seconds, ingest_batches, ingest_errors, ingest_readings
+from .models import DataReading, ReadingMinuteCounter
+
+logger = logging.getLogger(__name__)
+
+# Horas de contadores por minuto que se conservan
+COUNTER_RETENTION_HOURS = 25
+
+# Enviada tras confirmar la transacción de cada lote (argumento: readings)
+readings_ingested = Signal()
+
+
+class ReadingIngestor:
+    """Persistencia en bloque de lecturas y mantenimiento de contadores"""
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+
+    def ingest(self, readings: Iterable[DataReading]) -> List[DataReading]:
+        """Guardar lecturas con un único INSERT por lote y actualizar contadores"""
+        readings = list(readings)
+        if not readings:
+            return readings
+
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                DataReading.objects.bulk_create(readings, batch_size=self.batch_size)
+                self._update_counters(readings)
+                transaction.on_commit(lambda: self._notify(readings))
+        except Exception:
+            ingest_errors.inc()
+            raise
+
+        ingest_batch_seconds.observe(time.perf_counter() - start)
+        ingest_batches.inc()
+        ingest_readings.inc(len(readings))
+        return readings
+
+    def _notify(self, readings: List[DataReading]):
+        """Avisar a los consumidores en vivo; sus errores no afectan a la ingesta"""
+        for receiver, response in readings_ingested.send_robust(sender=self.__class__, readings=readings):
+            if isinstance(response, Exception):
+                logger.error(f"Error en receptor de lecturas {receiver}: {response}")
+
+    def _update_counters(self, readings: List[DataReading]):
+        """Incrementar el contador del minuto de cada lectura"""
+        buckets = Counter(
+            reading.timestamp.replace(second=0, microsecond=0) for reading in readings
+        )
+
+        created = False
+        for minute, count in buckets.items():
+            updated = ReadingMinuteCounter.objects.filter(minute=minute).update(count=F('count') + count)
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    ReadingMinuteCounter.objects.create(minute=minute, count=count)
+                created = True
+            except IntegrityError:
+                # Otro proceso creó el minuto en paralelo
+                ReadingMinuteCounter.objects.filter(minute=minute).update(count=F('count') + count)
+
+        # Purgar minutos antiguos solo al abrir un minuto nuevo
+        if created:
+            cutoff = timezone.now() - timedelta(hours=COUNTER_RETENTION_HOURS)
+            ReadingMinuteCounter.objects.filter(minute__lt=cutoff).delete()
+
+    def count_since(self, since) -> int:
+        """Número de lecturas ingresadas desde una fecha (según los contadores)"""
+        since = since.replace(second=0, microsecond=0)
+        total = ReadingMinuteCounter.objects.filter(minute__gte=since).aggregate(total=Sum('count'))['total']
+        return total or 0
+
+
+# Instancia global de la ruta de ingesta
+reading_ingestor = ReadingIngestor()
@@ -0,0 +1,171 @@
+# live.py
+"""
+Distribución en vivo de lecturas a los clientes conectados (SSE y WebSocket)
+El hub recibe cada lote ingresado (señal readings_ingested) y lo reparte a
+las suscripciones interesadas; cada suscripción conserva solo el último
+valor por variable hasta que su conexión lo envía (coalescencia).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class LiveUpdate:
+    """
+    Actualización de una variable. Se crea una vez por lectura y se comparte
+    entre todas las suscripciones; el frame JSON se codifica una sola vez
+    """
+    __slots__ = ('id', 'variable_id', 'server_id', 'data', '_frame')
+
+    def __init__(self, reading):
+        self.id = reading.id or 0
+        self.variable_id = reading.variable_id
+        self.server_id = reading.variable.server_id
+        self.data = {
+            'id': reading.id,
+            'variable_id': reading.variable_id,
+            'value': reading.get_value(),
+            'quality': reading.quality,
+            'timestamp': reading.timestamp,
+        }
+        self._frame = None
+
+    @property
+    def frame(self) -> str:
+        """Mensaje WebSocket {"type": "update", "data": ...}"""
+        if self._frame is None:
+            self._frame = json.dumps(
+                {'type': 'update', 'data': self.data}, cls=JSONEncoder, separators=(',', ':')
+            )
+        return self._frame
+
+
+class LiveSubscription:
+    """Suscripción de una conexión a variables y/o servidores"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.variable_ids = set()
+        self.server_ids = set()
+        self._pending: Dict[int, LiveUpdate] = {}
+        self._lock = threading.Lock()
+        self._event = asyncio.Event()
+        self._signalled = False
+
+    def offer(self, update: LiveUpdate):
+        """Encolar una actualización (llamado desde cualquier hilo); gana la última"""
+        with self._lock:
+            current = self._pending.get(update.variable_id)
+            if current is None or update.id >= current.id:
+                self._pending[update.variable_id] = update
+            if self._signalled:
+                return
+            self._signalled = True
+        try:
+            self.loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # El loop de la conexión ya se cerró
+            pass
+
+    def requeue(self, updates: Iterable[LiveUpdate]):
+        """Devolver actualizaciones no enviadas salvo que ya haya otras más nuevas"""
+        for update in updates:
+            self.offer(update)
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Esperar hasta que haya actualizaciones pendientes"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def drain(self) -> List[LiveUpdate]:
+        """Tomar las actualizaciones pendientes, ordenadas por id de lectura"""
+        with self._lock:
+            self._event.clear()
+            self._signalled = False
+            pending, self._pending = self._pending, {}
+        return sorted(pending.values(), key=lambda update: update.id)
+
+
+class LiveHub:
+    """Índices variable -> suscripciones y servidor -> suscripciones del proceso"""
+
+    def __init__(self):
+        self._by_variable: Dict[int, set] = defaultdict(set)
+        self._by_server: Dict[int, set] = defaultdict(set)
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, variable_ids: Iterable[int] = (), server_ids: Iterable[int] = ()) -> LiveSubscription:
+        """Crear una suscripción ligada al event loop actual"""
+        subscription = LiveSubscription(asyncio.get_running_loop())
+        self.watch(subscription, variable_ids, server_ids)
+        return subscription
+
+    def watch(self, subscription: LiveSubscription, variable_ids: Iterable[int] = (), server_ids: Iterable[int] = ()):
+        """Añadir variables/servidores a una suscripción"""
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for variable_id in variable_ids:
+                subscription.variable_ids.add(variable_id)
+                self._by_variable[variable_id].add(subscription)
+            for server_id in server_ids:
+                subscription.server_ids.add(server_id)
+                self._by_server[server_id].add(subscription)
+
+    def unwatch(self, subscription: LiveSubscription, variable_ids: Iterable[int] = (), server_ids: Iterable[int] = ()):
+        """Quitar variables/servidores de una suscripción"""
+        with self._lock:
+            self._discard(self._by_variable, subscription, subscription.variable_ids, variable_ids)
+            self._discard(self._by_server, subscription, subscription.server_ids, server_ids)
+
+    def unsubscribe(self, subscription: LiveSubscription):
+        with self._lock:
+            self._discard(self._by_variable, subscription, subscription.variable_ids, list(subscription.variable_ids))
+            self._discard(self._by_server, subscription, subscription.server_ids, list(subscription.server_ids))
+            self._subscriptions.discard(subscription)
+
+    @staticmethod
+    def _discard(index, subscription, own_keys, keys):
+        for key in keys:
+            own_keys.discard(key)
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del index[key]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, readings: Iterable):
+        """Repartir un lote de lecturas a las suscripciones interesadas"""
+        with self._lock:
+            if not self._subscriptions:
+                return
+            targets = []
+            for reading in readings:
+                subscribers = self._by_variable.get(reading.variable_id, set()) | \
+                    self._by_server.get(reading.variable.server_id, set())
+                if subscribers:
+                    targets.append((reading, subscribers))
+
+        for reading, subscribers in targets:
+            update = LiveUpdate(reading)
+            for subscription in subscribers:
+                subscription.offer(update)
+
+
+# Instancia global del hub en vivo
+live_hub = LiveHub()
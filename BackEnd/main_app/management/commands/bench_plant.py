@@ -0,0 +1,360 @@
+# bench_plant.py
+"""
+Benchmark de extremo a extremo con una planta sintética
+Levanta N simuladores WebSocket (IndustrialWebSocketServer) y N servidores
+OPC-UA (OpcUaServer.crear_servidor_opcua) con M tags cada uno en este mismo
+proceso, los conecta por el DataManager (suscripción WebSocket y lectura en
+bloque OPC-UA) e ingiere las lecturas por la ruta normal (reading_ingestor,
+con sus receptores: alarmas, hub en vivo, feed de cambios). Mide el
+rendimiento sostenido, la latencia fuente -> base de datos (para OPC-UA el
+valor del tag es la marca de tiempo de origen; incluye la antigüedad del
+sondeo), CPU y memoria. Los servidores y variables creados se borran al
+terminar salvo con --keep.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.data_clients import data_manager
+from main_app.ingest import reading_ingestor
+from main_app.models import DataReading, DataServer, DataVariable, VariableType
+from main_app.telemetry import Histogram
+
+
+def process_stats():
+    """(segundos de CPU, RSS actual MB, RSS máximo MB); None donde no hay soporte"""
+    try:
+        import resource
+    except ImportError:
+        return None, None, None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss: KB en Linux, bytes en macOS
+    peak = usage.ru_maxrss / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024)
+    current = None
+    try:
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    return usage.ru_utime + usage.ru_stime, current, max(peak, current or 0)
+
+
+class WebSocketPlant:
+    """Simuladores IndustrialWebSocketServer en un event loop propio"""
+
+    def __init__(self, host, ports, tags, rate):
+        from opcpr_project.websocket_server_example import IndustrialWebSocketServer
+
+        self.servers = []
+        for port in ports:
+            # Modo de muchos tags (tag_0..tag_M-1 vectorizados)
+            self.servers.append(IndustrialWebSocketServer(
+                host=host, port=port, update_interval=1 / rate, tag_groups=[{'count': tags, 'rate': rate}]
+            ))
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='bench-ws-plant', daemon=True)
+        self._listeners = []
+        self._tasks = []
+
+    def start(self):
+        import websockets
+
+        self._thread.start()
+
+        async def serve():
+            for server in self.servers:
+                server.running = True
+                self._listeners.append(await websockets.serve(server.handle_client, server.host, server.port))
+                self._tasks.append(asyncio.create_task(server.periodic_update()))
+
+        asyncio.run_coroutine_threadsafe(serve(), self.loop).result(10)
+
+    def stop(self):
+        async def close():
+            for server in self.servers:
+                server.running = False
+            for task in self._tasks:
+                task.cancel()
+            for listener in self._listeners:
+                listener.close()
+                await listener.wait_closed()
+
+        if self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class OpcUaPlant:
+    """Servidores OPC-UA con un hilo que escribe la marca de tiempo actual en cada tag"""
+
+    def __init__(self, host, ports, tags, rate):
+        from opcpr_project.OpcUaServer import crear_servidor_opcua
+
+        self.interval = 1 / rate
+        self.servers = [crear_servidor_opcua(f'opc.tcp://{host}:{port}', tags) for port in ports]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bench-opcua-plant', daemon=True)
+
+    def start(self):
+        for server, _, _ in self.servers:
+            server.start()
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            for _, variables, _ in self.servers:
+                now = time.time()
+                for variable in variables:
+                    variable.set_value(now)
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self._stop.set()
+        for server, _, _ in self.servers:
+            server.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de extremo a extremo: N simuladores WebSocket/OPC-UA con M tags conectados '
+        'por el DataManager; rendimiento de ingesta, latencia fuente -> BD, CPU y RSS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--websocket-servers', type=int, default=2, help='Simuladores WebSocket')
+        parser.add_argument('--opcua-servers', type=int, default=1, help='Servidores OPC-UA')
+        parser.add_argument('--tags', type=int, default=100, help='Tags por servidor')
+        parser.add_argument('--rate', type=float, default=1.0, help='Actualizaciones por segundo de cada tag')
+        parser.add_argument('--duration', type=float, default=30.0, help='Segundos medidos')
+        parser.add_argument('--warmup', type=float, default=5.0, help='Segundos previos sin medir')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lecturas máximas por lote de ingesta')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--websocket-port', type=int, default=18765, help='Primer puerto WebSocket')
+        parser.add_argument('--opcua-port', type=int, default=48450, help='Primer puerto OPC-UA')
+        parser.add_argument('--keep', action='store_true', help='Conservar servidores, variables y lecturas')
+        parser.add_argument('--json', action='store_true', help='Salida en formato JSON')
+        parser.add_argument('--output', help='Guardar también el resultado JSON en un archivo')
+
+    def handle(self, *args, **options):
+        if options['rate'] <= 0 or options['duration'] <= 0 or options['tags'] <= 0:
+            raise CommandError('--rate, --duration y --tags deben ser positivos')
+        if options['websocket_servers'] + options['opcua_servers'] <= 0:
+            raise CommandError('Se necesita al menos un simulador')
+
+        self.samples = deque()
+        ws_servers, opcua_servers = self._create_servers(options)
+        plants = []
+        try:
+            if ws_servers:
+                plants.append(WebSocketPlant(
+                    options['host'], [server.port for server, _ in ws_servers], options['tags'], options['rate']))
+            if opcua_servers:
+                plants.append(OpcUaPlant(
+                    options['host'], [server.port for server, _ in opcua_servers], options['tags'], options['rate']))
+            for plant in plants:
+                plant.start()
+
+            self._connect(ws_servers + opcua_servers)
+            for server, variables in ws_servers:
+                self._subscribe(server, variables)
+            poller = asyncio.run_coroutine_threadsafe(
+                self._poll(opcua_servers, 1 / options['rate']), data_manager.loop
+            ) if opcua_servers else None
+
+            results = self._measure(options)
+            if poller is not None:
+                poller.cancel()
+            results['connected_servers'] = sum(
+                1 for server, _ in ws_servers + opcua_servers
+                if data_manager.get_server_status(str(server.id)).get('connected')
+            )
+        finally:
+            for server, _ in ws_servers + opcua_servers:
+                try:
+                    data_manager.run(data_manager.remove_server(str(server.id)), timeout=10)
+                except Exception as e:
+                    # Un cliente saturado puede no cerrar a tiempo; no impide el informe
+                    self.stderr.write(f'No se pudo desconectar {server.name}: {e!r}')
+            for plant in plants:
+                plant.stop()
+            if not options['keep']:
+                DataServer.objects.filter(id__in=[server.id for server, _ in ws_servers + opcua_servers]).delete()
+
+        self._report(results, options)
+
+    # === PREPARACIÓN ===
+
+    def _create_servers(self, options):
+        """Servidores y variables de la planta (puerto en server.port)"""
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_active': False})
+        variable_type, _ = VariableType.objects.get_or_create(name='Benchmark')
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+
+        created = []
+        kinds = (
+            ('WEBSOCKET', options['websocket_servers'], options['websocket_port'], 'ws://{host}:{port}'),
+            ('OPC_UA', options['opcua_servers'], options['opcua_port'], 'opc.tcp://{host}:{port}'),
+        )
+        for server_type, count, first_port, url in kinds:
+            servers = []
+            for i in range(count):
+                port = first_port + i
+                server = DataServer.objects.create(
+                    name=f'bench-{server_type.lower()}-{i}-{stamp}', server_type=server_type,
+                    endpoint_url=url.format(host=options['host'], port=port),
+                    description='Planta sintética de bench_plant', created_by=user,
+                )
+                server.port = port
+                # OPC-UA: ns=2 es el primer namespace registrado por crear_servidor_opcua
+                addresses = [
+                    f'ns=2;s=tag_{n}' if server_type == 'OPC_UA' else f'tag_{n}' for n in range(options['tags'])
+                ]
+                DataVariable.objects.bulk_create([
+                    DataVariable(server=server, address=address, name=f'{server.name}-{address}',
+                                 variable_type=variable_type, data_type='FLOAT', created_by=user)
+                    for address in addresses
+                ])
+                variables = list(DataVariable.objects.filter(server=server).select_related('server').order_by('id'))
+                servers.append((server, variables))
+            created.append(servers)
+        return created
+
+    def _connect(self, servers):
+        for server, _ in servers:
+            connected = data_manager.run(data_manager.add_server(str(server.id), server.server_type, {
+                'endpoint_url': server.endpoint_url, 'connection_config': server.connection_config,
+            }), timeout=30)
+            if not connected:
+                raise CommandError(f'No se pudo conectar a {server.endpoint_url}')
+
+    def _subscribe(self, server, variables):
+        """Suscripción WebSocket: la marca de tiempo de origen viene en cada mensaje"""
+        samples = self.samples
+        for variable in variables:
+            def callback(address, value, timestamp, variable=variable):
+                source = datetime.fromisoformat(timestamp).timestamp()
+                samples.append((variable, value, source))
+
+            data_manager.run(data_manager.subscribe_variable(
+                str(server.id), variable.address, callback, variable.get_protocol_config()
+            ), timeout=10)
+
+    async def _poll(self, servers, interval):
+        """Lectura en bloque OPC-UA (una por servidor y ciclo); el valor es la marca de origen"""
+        groups = {
+            str(server.id): [(variable.address, variable.get_protocol_config()) for variable in variables]
+            for server, variables in servers
+        }
+        by_server = {str(server.id): variables for server, variables in servers}
+        while True:
+            started = time.monotonic()
+            results = await data_manager.read_many(groups)
+            for server_id, values in results.items():
+                for variable, (value, quality) in zip(by_server[server_id], values):
+                    if quality == 'GOOD' and value:
+                        self.samples.append((variable, value, float(value)))
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    # === MEDICIÓN ===
+
+    def _measure(self, options):
+        """Ingerir lo recibido en lotes; medir solo después del calentamiento"""
+        samples = self.samples
+        latency = Histogram()
+        batch_size = options['batch_size']
+        measured = batches = 0
+
+        started = time.time()
+        measure_from = started + options['warmup']
+        deadline = measure_from + options['duration']
+        cpu_start, _, _ = process_stats()
+        measuring = False
+        while True:
+            now = time.time()
+            if now >= deadline:
+                break
+            if not measuring and now >= measure_from:
+                # Empieza la medición: descartar lo del calentamiento
+                measuring = True
+                cpu_start, _, _ = process_stats()
+                measured = batches = 0
+                latency = Histogram()
+
+            batch = [samples.popleft() for _ in range(min(len(samples), batch_size))]
+            if not batch:
+                time.sleep(0.005)
+                continue
+
+            readings = []
+            for variable, value, source in batch:
+                reading = DataReading(variable=variable, quality='GOOD',
+                                      timestamp=datetime.fromtimestamp(source, dt_timezone.utc))
+                reading.set_value(value)
+                readings.append(reading)
+            reading_ingestor.ingest(readings)
+
+            stored = time.time()
+            for _, _, source in batch:
+                latency.record((stored - source) * 1_000_000)
+            measured += len(batch)
+            batches += 1
+
+        cpu_end, rss, peak_rss = process_stats()
+        elapsed = time.time() - measure_from
+        summary = latency.summary(scale=1000)
+        return {
+            'readings': measured,
+            'batches': batches,
+            'duration_s': round(elapsed, 3),
+            'throughput_rps': round(measured / elapsed, 1) if elapsed > 0 else None,
+            'expected_rps': round(
+                (options['websocket_servers'] + options['opcua_servers']) * options['tags'] * options['rate'], 1),
+            'backlog': len(samples),
+            'latency_ms': {key: summary[key] for key in ('mean', 'p50', 'p95', 'p99', 'max')},
+            'cpu_percent': round((cpu_end - cpu_start) / elapsed * 100, 1) if cpu_start is not None else None,
+            'measured': measuring,
+            'rss_mb': round(rss, 1) if rss is not None else None,
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        }
+
+    def _report(self, results, options):
+        results = {
+            'config': {
+                key: options[key] for key in
+                ('websocket_servers', 'opcua_servers', 'tags', 'rate', 'duration', 'warmup', 'batch_size')
+            },
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            **results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        config = results['config']
+        latency = results['latency_ms']
+        self.stdout.write(
+            f"Planta: {config['websocket_servers']} WebSocket + {config['opcua_servers']} OPC-UA, "
+            f"{config['tags']} tags a {config['rate']} Hz ({results['connected_servers']} conectados)"
+        )
+        self.stdout.write(
+            f"  Ingesta:  {results['throughput_rps']} lecturas/s (esperadas {results['expected_rps']}), "
+            f"{results['readings']} lecturas en {results['batches']} lotes, pendientes {results['backlog']}"
+        )
+        self.stdout.write(
+            f"  Latencia fuente -> BD (ms): p50 {latency['p50']}  p95 {latency['p95']}  "
+            f"p99 {latency['p99']}  máx {latency['max']}"
+        )
+        self.stdout.write(f"  CPU: {results['cpu_percent']}%  RSS: {results['rss_mb']} MB (máx {results['peak_rss_mb']} MB)")
+        self.stdout.write(self.style.SUCCESS('Benchmark completado'))
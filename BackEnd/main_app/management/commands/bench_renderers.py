@@ -0,0 +1,80 @@
+# bench_renderers.py
+"""
+Benchmark de renderers JSON: renderer por defecto de DRF frente a orjson
+sobre respuestas de lecturas de datos
+"""
+
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from main_app.models import DataReading, DataServer, DataVariable, VariableType
+from main_app.renderers import ORJSONRenderer, orjson
+from main_app.serializers import DataReadingSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara el renderer JSON de DRF con ORJSONRenderer sobre N lecturas serializadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=10000, help='Lecturas por respuesta')
+        parser.add_argument('--iterations', type=int, default=20, help='Repeticiones por renderer')
+        parser.add_argument('--json', action='store_true', help='Salida en formato JSON')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson no está instalado')
+
+        payload = DataReadingSerializer(self._build_readings(options['readings']), many=True).data
+        results = {
+            'readings': options['readings'],
+            'iterations': options['iterations'],
+            'renderers': {}
+        }
+
+        for name, renderer in (('drf_json', JSONRenderer()), ('orjson', ORJSONRenderer())):
+            body = renderer.render(payload)
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                renderer.render(payload)
+            elapsed = (time.perf_counter() - started) / options['iterations']
+            results['renderers'][name] = {
+                'mean_ms': round(elapsed * 1000, 3),
+                'bytes': len(body)
+            }
+
+        drf_ms = results['renderers']['drf_json']['mean_ms']
+        orjson_ms = results['renderers']['orjson']['mean_ms']
+        results['speedup'] = round(drf_ms / orjson_ms, 2) if orjson_ms else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        self.stdout.write(f"Lecturas por respuesta: {results['readings']} ({results['iterations']} repeticiones)")
+        for name, data in results['renderers'].items():
+            self.stdout.write(f"  {name:<10} {data['mean_ms']:>10.3f} ms  {data['bytes']:>10} bytes")
+        self.stdout.write(self.style.SUCCESS(f"Aceleración orjson: x{results['speedup']}"))
+
+    def _build_readings(self, count):
+        """Lecturas en memoria (sin base de datos) con sus relaciones cargadas"""
+        user = User(username='benchmark')
+        server = DataServer(id=1, name='Benchmark', server_type='OPC_UA',
+                            endpoint_url='opc.tcp://localhost:4840', created_by=user)
+        variable = DataVariable(id=1, server=server, address='ns=2;i=2', name='temperature_1',
+                                variable_type=VariableType(name='Analógica'), data_type='FLOAT',
+                                created_by=user)
+        now = timezone.now()
+
+        readings = []
+        for i in range(count):
+            reading = DataReading(id=i + 1, variable=variable, timestamp=now - timedelta(seconds=i),
+                                  quality='GOOD', protocol_metadata={'source': 'benchmark'})
+            reading.set_value(20.0 + (i % 100) * 0.1)
+            readings.append(reading)
+        return readings
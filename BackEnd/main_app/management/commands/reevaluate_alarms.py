@@ -0,0 +1,34 @@
+# reevaluate_alarms.py
+"""
+Reevaluar las alarmas de todas las variables contra su último valor
+(tras un reinicio o una edición masiva de límites)
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from main_app.alarms import reevaluate_alarms
+
+
+class Command(BaseCommand):
+    help = 'Reevalúa en bloque las alarmas de las variables con alarmas habilitadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variable', type=int, action='append', dest='variables',
+                            help='Limitar a estas variables (se puede repetir)')
+        parser.add_argument('--json', action='store_true', help='Salida en formato JSON')
+
+    def handle(self, *args, **options):
+        result = reevaluate_alarms(options['variables'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Variables evaluadas: {result['evaluated']} | "
+            f"Alarmas activadas: {result['raised']} | "
+            f"Alarmas aclaradas: {result['cleared']} | "
+            f"Tiempo: {result['elapsed_ms']} ms"
+        ))
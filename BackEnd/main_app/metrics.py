@@ -0,0 +1,337 @@
+# metrics.py
+"""
+Métricas en formato Prometheus (GET /metrics)
+Registro en proceso sin dependencias externas: contadores, gauges e
+histogramas con etiquetas. Cada serie tiene su propio lock (sin contención
+entre series) y se actualiza una vez por lote o petición, nunca por lectura.
+Lo que ya existe en memoria (telemetría de clientes, colas de auditoría y
+notificaciones, alarmas activas) se lee al exportar mediante colectores, sin
+coste en la ruta caliente. Como el hub en vivo, los valores son por proceso.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _Value:
+    """Valor de una serie de contador o gauge"""
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    """Conteos por cubeta (no acumulados), suma y total de una serie"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metric:
+    """Familia de series con el mismo nombre y etiquetas"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        """Serie con esos valores de etiqueta (se crea la primera vez)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: se esperaban las etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """(nombre, etiquetas, valores, valor) de cada serie"""
+        return [
+            (self.name, self.labelnames, key, child.value)
+            for key, child in sorted(self._children.items())
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional['Registry'] = None, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        samples = []
+        bucket_labels = self.labelnames + ('le',)
+        for key, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                samples.append((f'{self.name}_bucket', bucket_labels, key + (_format_value(bound),), cumulative))
+            samples.append((f'{self.name}_sum', self.labelnames, key, total))
+            samples.append((f'{self.name}_count', self.labelnames, key, count))
+        return samples
+
+
+class Registry:
+    """Métricas registradas y colectores que generan métricas al exportar"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Metric]]):
+        self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> List[Metric]:
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self) -> str:
+        """Exposición de texto de Prometheus (versión 0.0.4)"""
+        lines = []
+        for metric in self.collect():
+            documentation = metric.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+            lines.append(f'# HELP {metric.name} {documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labelnames, values, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labelnames, values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Registro global del proceso
+registry = Registry()
+
+# === API (middleware de tiempos) ===
+http_requests = Counter(
+    'opcpr_http_requests_total', 'Peticiones HTTP atendidas', ('method', 'view', 'status'), registry)
+http_request_seconds = Histogram(
+    'opcpr_http_request_duration_seconds', 'Duración de las peticiones HTTP', ('method', 'view'), registry)
+
+# === INGESTA ===
+ingest_readings = Counter('opcpr_ingest_readings_total', 'Lecturas persistidas', registry=registry)
+ingest_batches = Counter('opcpr_ingest_batches_total', 'Lotes de lecturas persistidos', registry=registry)
+ingest_errors = Counter('opcpr_ingest_errors_total', 'Lotes de lecturas con error', registry=registry)
+ingest_batch_seconds = Histogram(
+    'opcpr_ingest_batch_duration_seconds', 'Duración de la escritura de un lote', registry=registry)
+
+# === MOTOR DE ALARMAS ===
+alarm_readings = Counter(
+    'opcpr_alarm_readings_evaluated_total', 'Lecturas evaluadas por el motor de alarmas', registry=registry)
+alarms_raised = Counter(
+    'opcpr_alarms_raised_total', 'Alarmas creadas por el motor', ('type', 'severity'), registry)
+alarm_process_seconds = Histogram(
+    'opcpr_alarm_process_duration_seconds', 'Duración de la evaluación de un lote', registry=registry)
+
+
+def histogram_from_telemetry(metric: Histogram, key: Tuple[str, ...], source, scale: float):
+    """
+    Cargar una serie desde un histograma logarítmico de telemetry (valores
+    divididos por scale); cada cubeta cuenta en el primer límite que cubre su máximo
+    """
+    from .telemetry import bucket_range
+
+    child = metric.labels(*key)
+    counts = [0] * (len(metric.buckets) + 1)
+    for index, bucket in enumerate(source.counts):
+        if bucket:
+            counts[bisect_left(metric.buckets, bucket_range(index)[1] / scale)] += bucket
+    child.counts, child.sum, child.count = counts, source.total / scale, source.count
+
+
+@registry.register_collector
+def collect_runtime() -> List[Metric]:
+    """Estado en memoria del proceso: clientes de datos, colas y alarmas activas"""
+    from .alarms import alarm_engine
+    from .audit import audit_writer
+    from .data_clients import data_manager
+    from .live import live_hub
+    from .notifications import alarm_notifier
+
+    servers = Gauge('opcpr_data_servers', 'Servidores en el DataManager por estado', ('state',))
+    operation_seconds = Histogram(
+        'opcpr_device_operation_duration_seconds', 'Latencia de las operaciones con dispositivos',
+        ('server', 'operation'))
+    operation_errors = Counter(
+        'opcpr_device_operation_errors_total', 'Operaciones con dispositivos fallidas', ('server', 'operation'))
+    batch_items = Counter(
+        'opcpr_device_batch_items_total', 'Variables leídas o escritas en lote', ('server', 'operation'))
+
+    clients = dict(data_manager.clients)
+    connected = sum(1 for client in clients.values() if client.is_connected)
+    servers.labels('connected').set(connected)
+    servers.labels('disconnected').set(len(clients) - connected)
+    for server_id, client in sorted(clients.items()):
+        state = client.telemetry.snapshot()
+        for operation, histogram in state['latency'].items():
+            histogram_from_telemetry(operation_seconds, (server_id, operation), histogram, 1_000_000)
+            operation_errors.labels(server_id, operation).inc(state['errors'][operation])
+        for operation, histogram in state['batch_size'].items():
+            batch_items.labels(server_id, operation).inc(histogram.total)
+
+    audit_buffer = Gauge('opcpr_audit_buffer_size', 'Eventos de auditoría pendientes de escribir')
+    audit_buffer.set(len(audit_writer))
+    audit_dropped = Counter('opcpr_audit_dropped_total', 'Eventos de auditoría descartados (búfer lleno)')
+    audit_dropped.inc(audit_writer.dropped)
+
+    notify_queue = Gauge('opcpr_alarm_notify_queue_size', 'Lotes de alarmas pendientes de notificar')
+    notify_queue.set(alarm_notifier._queue.qsize())
+    notify_retries = Gauge('opcpr_alarm_notify_pending_retries', 'Notificaciones pendientes de reintento')
+    notify_retries.set(alarm_notifier.pending_retries())
+    notify_dropped = Counter('opcpr_alarm_notify_dropped_total', 'Alarmas no notificadas (cola llena)')
+    notify_dropped.inc(alarm_notifier.dropped)
+
+    active = Gauge('opcpr_alarm_conditions_active', 'Condiciones de alarma activas en el motor')
+    active.set(alarm_engine.active_count())
+    subscribers = Gauge('opcpr_live_subscribers', 'Suscripciones en vivo (SSE y WebSocket)')
+    subscribers.set(live_hub.subscriber_count())
+
+    return [
+        servers, operation_seconds, operation_errors, batch_items, audit_buffer, audit_dropped,
+        notify_queue, notify_retries, notify_dropped, active, subscribers,
+    ]
+
+
+class MetricsMiddleware:
+    """
+    Contar y medir las peticiones HTTP por método, vista (nombre de la URL,
+    nunca la ruta, para acotar las series) y estado
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _record(request, response, elapsed: float):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name or 'unnamed') if match is not None else 'unmatched'
+        http_requests.labels(request.method, view, response.status_code).inc()
+        http_request_seconds.labels(request.method, view).observe(elapsed)
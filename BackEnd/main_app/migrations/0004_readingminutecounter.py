@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:44
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    """Inicializar los contadores con las lecturas de las últimas 24 horas"""
+    DataReading = apps.get_model('main_app', 'DataReading')
+    ReadingMinuteCounter = apps.get_model('main_app', 'ReadingMinuteCounter')
+
+    since = timezone.now() - timedelta(hours=24)
+    buckets = DataReading.objects.filter(timestamp__gte=since).annotate(
+        bucket=TruncMinute('timestamp')
+    ).values('bucket').annotate(total=Count('id')).order_by()
+
+    ReadingMinuteCounter.objects.bulk_create([
+        ReadingMinuteCounter(minute=row['bucket'], count=row['total']) for row in buckets
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_dataserver_datavariable_datareading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingMinuteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField(unique=True, verbose_name='Minuto')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Lecturas')),
+            ],
+            options={
+                'verbose_name': 'Contador de Lecturas por Minuto',
+                'verbose_name_plural': 'Contadores de Lecturas por Minuto',
+                'ordering': ['-minute'],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_readingminutecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarm',
+            name='data_variable',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alarms', to='main_app.datavariable', verbose_name='Variable de datos'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_deadband',
+            field=models.FloatField(default=0, verbose_name='Histéresis de alarma'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_off_delay',
+            field=models.FloatField(default=0, verbose_name='Retardo de desactivación (s)'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_on_delay',
+            field=models.FloatField(default=0, verbose_name='Retardo de activación (s)'),
+        ),
+        migrations.AlterField(
+            model_name='alarm',
+            name='variable',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alarms', to='main_app.opcuavariable', verbose_name='Variable'),
+        ),
+    ]
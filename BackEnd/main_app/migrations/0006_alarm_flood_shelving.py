@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_alarm_engine'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarm',
+            name='data_server',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alarms', to='main_app.dataserver', verbose_name='Servidor de datos'),
+        ),
+        migrations.AddField(
+            model_name='alarm',
+            name='last_occurrence',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última ocurrencia'),
+        ),
+        migrations.AddField(
+            model_name='alarm',
+            name='occurrence_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Ocurrencias'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_shelved_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shelved_variables', to=settings.AUTH_USER_MODEL, verbose_name='Archivadas por'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_shelved_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Alarmas archivadas hasta'),
+        ),
+        migrations.AlterField(
+            model_name='alarm',
+            name='alarm_type',
+            field=models.CharField(choices=[('HIGH', 'Valor alto'), ('LOW', 'Valor bajo'), ('QUALITY', 'Calidad'), ('COMMUNICATION', 'Comunicación'), ('SYSTEM', 'Sistema'), ('FLOOD', 'Avalancha de alarmas')], max_length=20, verbose_name='Tipo de alarma'),
+        ),
+    ]
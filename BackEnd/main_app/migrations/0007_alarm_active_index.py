@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_alarm_flood_shelving'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alarm',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['severity', '-timestamp'], name='alarm_active_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_alarm_active_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_deviation_limit',
+            field=models.FloatField(blank=True, null=True, verbose_name='Desviación máxima de la consigna'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_rate_limit',
+            field=models.FloatField(blank=True, null=True, verbose_name='Límite de tasa de cambio'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_rate_unit',
+            field=models.CharField(choices=[('s', 'Por segundo'), ('min', 'Por minuto')], default='s', max_length=3, verbose_name='Unidad de tasa de cambio'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_rate_window',
+            field=models.FloatField(default=10, verbose_name='Ventana de tasa de cambio (s)'),
+        ),
+        migrations.AddField(
+            model_name='datavariable',
+            name='alarm_setpoint',
+            field=models.FloatField(blank=True, null=True, verbose_name='Consigna'),
+        ),
+        migrations.AlterField(
+            model_name='alarm',
+            name='alarm_type',
+            field=models.CharField(choices=[('HIGH', 'Valor alto'), ('LOW', 'Valor bajo'), ('QUALITY', 'Calidad'), ('COMMUNICATION', 'Comunicación'), ('SYSTEM', 'Sistema'), ('FLOOD', 'Avalancha de alarmas'), ('RATE', 'Tasa de cambio'), ('DEVIATION', 'Desviación de consigna')], max_length=20, verbose_name='Tipo de alarma'),
+        ),
+    ]
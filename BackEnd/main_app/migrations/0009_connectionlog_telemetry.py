@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_alarm_rate_deviation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionlog',
+            name='data_server',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connection_logs', to='main_app.dataserver', verbose_name='Servidor de datos'),
+        ),
+        migrations.AddField(
+            model_name='connectionlog',
+            name='metrics',
+            field=models.JSONField(blank=True, help_text='Percentiles de latencia y tamaño de lote del intervalo (LATENCY)', null=True, verbose_name='Métricas'),
+        ),
+        migrations.AlterField(
+            model_name='connectionlog',
+            name='event_type',
+            field=models.CharField(choices=[('CONNECT', 'Conexión'), ('DISCONNECT', 'Desconexión'), ('ERROR', 'Error'), ('RECONNECT', 'Reconexión'), ('LATENCY', 'Latencia')], max_length=20, verbose_name='Tipo de evento'),
+        ),
+        migrations.AlterField(
+            model_name='connectionlog',
+            name='server',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connection_logs', to='main_app.opcuaserver', verbose_name='Servidor'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import OuterRef, Q, Subquery
 from django.contrib.auth.models import User
 from django.utils import timezone
 import json
@@ -122,6 +123,23 @@ class VariableType(models.Model):
         return self.name
 
 
+class DataVariableQuerySet(models.QuerySet):
+    """Consultas frecuentes sobre variables de datos"""
+    
+    def with_latest_reading(self):
+        """
+        Anotar el id de la última lectura de cada variable (latest_reading_id)
+        con una subconsulta correlacionada sobre el índice variable/-timestamp;
+        DataVariable.attach_latest_readings() carga esas lecturas de la página
+        en una sola consulta
+        """
+        latest_reading = DataReading.objects.filter(
+            variable=OuterRef('pk')
+        ).order_by('-timestamp', '-id').values('pk')[:1]
+        
+        return self.annotate(latest_reading_id=Subquery(latest_reading))
+
+
 class DataVariable(models.Model):
     """Modelo para variables monitoreadas desde cualquier tipo de servidor"""
     server = models.ForeignKey(DataServer, on_delete=models.CASCADE, verbose_name="Servidor")
@@ -156,11 +174,28 @@ class DataVariable(models.Model):
     alarm_enabled = models.BooleanField(default=False, verbose_name="Alarmas habilitadas")
     alarm_high_limit = models.FloatField(blank=True, null=True, verbose_name="Límite alto de alarma")
     alarm_low_limit = models.FloatField(blank=True, null=True, verbose_name="Límite bajo de alarma")
+    alarm_deadband = models.FloatField(default=0, verbose_name="Histéresis de alarma")
+    alarm_on_delay = models.FloatField(default=0, verbose_name="Retardo de activación (s)")
+    alarm_off_delay = models.FloatField(default=0, verbose_name="Retardo de desactivación (s)")
+    alarm_rate_limit = models.FloatField(blank=True, null=True, verbose_name="Límite de tasa de cambio")
+    alarm_rate_unit = models.CharField(
+        max_length=3,
+        choices=[('s', 'Por segundo'), ('min', 'Por minuto')],
+        default='s',
+        verbose_name="Unidad de tasa de cambio"
+    )
+    alarm_rate_window = models.FloatField(default=10, verbose_name="Ventana de tasa de cambio (s)")
+    alarm_setpoint = models.FloatField(blank=True, null=True, verbose_name="Consigna")
+    alarm_deviation_limit = models.FloatField(blank=True, null=True, verbose_name="Desviación máxima de la consigna")
+    alarm_shelved_until = models.DateTimeField(blank=True, null=True, verbose_name="Alarmas archivadas hasta")
+    alarm_shelved_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='shelved_variables', verbose_name="Archivadas por")
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Fecha de actualización")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Creado por")
     
+    objects = DataVariableQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Variable de Datos"
         verbose_name_plural = "Variables de Datos"
@@ -199,6 +234,99 @@ class DataVariable(models.Model):
         config = default_configs.get(self.server.server_type, {})
         config.update(self.protocol_config)
         return config
+    
+    def coerce_value(self, value):
+        """
+        Convertir un valor a escribir al tipo de dato de la variable y validar
+        los límites; lanza ValueError con el motivo si no es válido
+        """
+        if value is None:
+            raise ValueError('Valor requerido')
+        
+        data_type = self.data_type
+        if data_type == 'BOOLEAN':
+            if isinstance(value, bool):
+                return value
+            if value in (0, 1):
+                return bool(value)
+            if isinstance(value, str) and value.lower() in ('true', 'false'):
+                return value.lower() == 'true'
+            raise ValueError('Se esperaba un valor booleano')
+        
+        if data_type in ('INTEGER', 'FLOAT'):
+            if isinstance(value, bool):
+                raise ValueError('Se esperaba un valor numérico')
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError('Se esperaba un valor numérico')
+            if data_type == 'INTEGER':
+                if not number.is_integer():
+                    raise ValueError('Se esperaba un valor entero')
+                number = int(number)
+            if self.min_value is not None and number < self.min_value:
+                raise ValueError(f'Valor por debajo del mínimo ({self.min_value})')
+            if self.max_value is not None and number > self.max_value:
+                raise ValueError(f'Valor por encima del máximo ({self.max_value})')
+            return number
+        
+        if data_type == 'STRING':
+            if not isinstance(value, str):
+                raise ValueError('Se esperaba un texto')
+            return value
+        
+        if data_type == 'ARRAY':
+            if not isinstance(value, list):
+                raise ValueError('Se esperaba una lista')
+            return value
+        
+        if data_type == 'JSON':
+            if isinstance(value, (dict, list)):
+                return value
+            try:
+                return json.loads(str(value))
+            except json.JSONDecodeError:
+                raise ValueError('Se esperaba un objeto JSON')
+        
+        return value
+    
+    @staticmethod
+    def attach_latest_readings(variables):
+        """
+        Cargar con una consulta pk__in las últimas lecturas de variables
+        anotadas con with_latest_reading() (p. ej. una página de resultados)
+        y dejarlas en cada variable; devuelve la lista de variables
+        """
+        variables = list(variables)
+        if not variables or not hasattr(variables[0], 'latest_reading_id'):
+            return variables
+        
+        readings = DataReading.objects.order_by().in_bulk(
+            [variable.latest_reading_id for variable in variables if variable.latest_reading_id]
+        )
+        for variable in variables:
+            reading = readings.get(variable.latest_reading_id)
+            if reading is not None:
+                reading.variable = variable
+            variable._latest_reading = reading
+        return variables
+    
+    def get_latest_reading(self):
+        """
+        Última lectura como diccionario {value, timestamp, quality}; usa la
+        lectura cargada por attach_latest_readings() cuando está disponible
+        """
+        if hasattr(self, '_latest_reading'):
+            last_reading = self._latest_reading
+        else:
+            last_reading = self.readings.first()
+        if last_reading:
+            return {
+                'value': last_reading.get_value(),
+                'timestamp': last_reading.timestamp,
+                'quality': last_reading.quality
+            }
+        return None
 
 
 class OpcUaVariable(models.Model):
@@ -242,6 +370,26 @@ class OpcUaVariable(models.Model):
         return f"{self.name} ({self.server.name})"
 
 
+class DataReadingQuerySet(models.QuerySet):
+    """Consultas frecuentes sobre lecturas de datos"""
+    
+    def latest_per_variable(self, variables=None):
+        """
+        Última lectura de cada variable en una sola consulta (subconsulta
+        correlacionada sobre el índice variable/-timestamp)
+        """
+        if variables is None:
+            variables = DataVariable.objects.all()
+        
+        latest_reading = DataReading.objects.filter(
+            variable=OuterRef('pk')
+        ).order_by('-timestamp', '-id').values('pk')[:1]
+        
+        return self.filter(
+            pk__in=variables.annotate(latest_reading_id=Subquery(latest_reading)).values('latest_reading_id')
+        )
+
+
 class DataReading(models.Model):
     """Modelo para almacenar lecturas de variables de cualquier protocolo"""
     variable = models.ForeignKey(DataVariable, on_delete=models.CASCADE, related_name='readings', verbose_name="Variable")
@@ -274,6 +422,8 @@ class DataReading(models.Model):
     # Metadatos del protocolo
     protocol_metadata = models.JSONField(default=dict, blank=True, verbose_name="Metadatos del protocolo")
     
+    objects = DataReadingQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Lectura de Datos"
         verbose_name_plural = "Lecturas de Datos"
@@ -323,6 +473,20 @@ class DataReading(models.Model):
         return f"{self.variable.name}: {self.get_value()} ({self.timestamp})"
 
 
+class ReadingMinuteCounter(models.Model):
+    """Contador de lecturas ingresadas por minuto (mantenido por la ingesta)"""
+    minute = models.DateTimeField(unique=True, verbose_name="Minuto")
+    count = models.BigIntegerField(default=0, verbose_name="Lecturas")
+    
+    class Meta:
+        verbose_name = "Contador de Lecturas por Minuto"
+        verbose_name_plural = "Contadores de Lecturas por Minuto"
+        ordering = ['-minute']
+    
+    def __str__(self):
+        return f"{self.minute}: {self.count}"
+
+
 class VariableReading(models.Model):
     """Modelo para almacenar lecturas de variables (Compatibilidad)"""
     variable = models.ForeignKey(OpcUaVariable, on_delete=models.CASCADE, related_name='readings', verbose_name="Variable")
@@ -385,8 +549,9 @@ class VariableReading(models.Model):
 
 
 class ConnectionLog(models.Model):
-    """Modelo para registrar conexiones y desconexiones"""
-    server = models.ForeignKey(OpcUaServer, on_delete=models.CASCADE, related_name='connection_logs', verbose_name="Servidor")
+    """Modelo para registrar conexiones, desconexiones y telemetría de latencia"""
+    server = models.ForeignKey(OpcUaServer, on_delete=models.CASCADE, related_name='connection_logs', blank=True, null=True, verbose_name="Servidor")
+    data_server = models.ForeignKey(DataServer, on_delete=models.CASCADE, related_name='connection_logs', blank=True, null=True, verbose_name="Servidor de datos")
     timestamp = models.DateTimeField(default=timezone.now, verbose_name="Marca de tiempo")
     event_type = models.CharField(
         max_length=20,
@@ -394,13 +559,16 @@ class ConnectionLog(models.Model):
             ('CONNECT', 'Conexión'),
             ('DISCONNECT', 'Desconexión'),
             ('ERROR', 'Error'),
-            ('RECONNECT', 'Reconexión')
+            ('RECONNECT', 'Reconexión'),
+            ('LATENCY', 'Latencia')
         ],
         verbose_name="Tipo de evento"
     )
     message = models.TextField(blank=True, null=True, verbose_name="Mensaje")
     error_code = models.IntegerField(blank=True, null=True, verbose_name="Código de error")
     response_time = models.FloatField(blank=True, null=True, verbose_name="Tiempo de respuesta (ms)")
+    metrics = models.JSONField(blank=True, null=True, verbose_name="Métricas",
+                               help_text="Percentiles de latencia y tamaño de lote del intervalo (LATENCY)")
     user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Usuario")
     
     class Meta:
@@ -409,12 +577,15 @@ class ConnectionLog(models.Model):
         ordering = ['-timestamp']
     
     def __str__(self):
-        return f"{self.server.name} - {self.event_type} @ {self.timestamp}"
+        server = self.server or self.data_server
+        return f"{server.name if server else '-'} - {self.event_type} @ {self.timestamp}"
 
 
 class Alarm(models.Model):
     """Modelo para alarmas del sistema"""
-    variable = models.ForeignKey(OpcUaVariable, on_delete=models.CASCADE, related_name='alarms', verbose_name="Variable")
+    variable = models.ForeignKey(OpcUaVariable, on_delete=models.CASCADE, related_name='alarms', blank=True, null=True, verbose_name="Variable")
+    data_variable = models.ForeignKey(DataVariable, on_delete=models.CASCADE, related_name='alarms', blank=True, null=True, verbose_name="Variable de datos")
+    data_server = models.ForeignKey(DataServer, on_delete=models.CASCADE, related_name='alarms', blank=True, null=True, verbose_name="Servidor de datos")
     timestamp = models.DateTimeField(default=timezone.now, verbose_name="Marca de tiempo")
     alarm_type = models.CharField(
         max_length=20,
@@ -423,7 +594,10 @@ class Alarm(models.Model):
             ('LOW', 'Valor bajo'),
             ('QUALITY', 'Calidad'),
             ('COMMUNICATION', 'Comunicación'),
-            ('SYSTEM', 'Sistema')
+            ('SYSTEM', 'Sistema'),
+            ('FLOOD', 'Avalancha de alarmas'),
+            ('RATE', 'Tasa de cambio'),
+            ('DEVIATION', 'Desviación de consigna')
         ],
         verbose_name="Tipo de alarma"
     )
@@ -445,14 +619,26 @@ class Alarm(models.Model):
     acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Reconocida por")
     acknowledged_at = models.DateTimeField(blank=True, null=True, verbose_name="Reconocida en")
     cleared_at = models.DateTimeField(blank=True, null=True, verbose_name="Aclarada en")
+    occurrence_count = models.PositiveIntegerField(default=1, verbose_name="Ocurrencias")
+    last_occurrence = models.DateTimeField(blank=True, null=True, verbose_name="Última ocurrencia")
     
     class Meta:
         verbose_name = "Alarma"
         verbose_name_plural = "Alarmas"
         ordering = ['-timestamp']
+        indexes = [
+            # Índice parcial: solo las alarmas activas (consola y arranque del motor)
+            models.Index(fields=['severity', '-timestamp'], condition=Q(is_active=True), name='alarm_active_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.variable.name} - {self.alarm_type} - {self.severity}"
+        source = self.source_variable or self.data_server
+        return f"{source.name if source else '-'} - {self.alarm_type} - {self.severity}"
+    
+    @property
+    def source_variable(self):
+        """Variable que originó la alarma (multi-protocolo o OPC-UA heredada)"""
+        return self.data_variable or self.variable
 
 
 class UserProfile(models.Model):
@@ -0,0 +1,190 @@
+# notifications.py
+"""
+Notificaciones de alarmas por email
+El motor de alarmas solo encola las activaciones (sin esperas ni consultas
+salvo al recargar los destinatarios); un hilo propio las agrupa por
+destinatario en resúmenes cada ALARM_NOTIFY_WINDOW segundos y los envía por
+SMTP con un pool de conexiones abiertas. Los envíos fallidos pasan a una cola
+de reintentos con espera exponencial. Destinatarios: usuarios activos con
+email y UserProfile.email_notifications.
+"""
+
+import heapq
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima entre reintentos (segundos)
+MAX_RETRY_DELAY = 3600
+
+
+class AlarmNotifier:
+    """Resúmenes de alarmas por destinatario enviados en segundo plano"""
+
+    def __init__(self, window: float = 60, pool_size: int = 2, max_retries: int = 5,
+                 queue_size: int = 10000, background: bool = True):
+        self.window = window
+        self.background = background
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending: Dict[str, List[Dict]] = defaultdict(list)
+        self._retries = []
+        self._sequence = 0
+        self._recipients: Optional[List[str]] = None
+        self._connections = queue.LifoQueue()
+        self._executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    # === ENCOLADO (ruta del motor) ===
+
+    def recipients(self) -> List[str]:
+        recipients = self._recipients
+        if recipients is None:
+            recipients = self._recipients = sorted(set(
+                UserProfile.objects.filter(email_notifications=True, user__is_active=True)
+                .exclude(user__email='').values_list('user__email', flat=True)
+            ))
+        return recipients
+
+    def invalidate_recipients(self):
+        self._recipients = None
+
+    def submit(self, alarms: Iterable):
+        """Encolar alarmas activadas; nunca bloquea (si la cola está llena se descartan)"""
+        items = [
+            {
+                'timestamp': alarm.timestamp, 'severity': alarm.severity,
+                'alarm_type': alarm.alarm_type, 'message': alarm.message,
+            }
+            for alarm in alarms
+        ]
+        if not items:
+            return
+        recipients = self.recipients()
+        if not recipients:
+            return
+        try:
+            self._queue.put_nowait((recipients, items))
+        except queue.Full:
+            self.dropped += len(items)
+            logger.warning(f"Cola de notificaciones llena: {len(items)} alarmas descartadas")
+            return
+        if self.background:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='alarm-notifier', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.window
+            while (remaining := deadline - time.monotonic()) > 0:
+                self.collect(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error enviando notificaciones de alarmas: {e}")
+
+    # === AGRUPACIÓN Y ENVÍO ===
+
+    def collect(self, timeout: float = 0):
+        """Pasar lo encolado a los resúmenes pendientes por destinatario"""
+        try:
+            batch = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            recipients, items = batch
+            for recipient in recipients:
+                self._pending[recipient].extend(items)
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """Enviar los resúmenes pendientes y los reintentos vencidos; devuelve los enviados"""
+        self.collect()
+        now = time.monotonic() if now is None else now
+
+        pending, self._pending = self._pending, defaultdict(list)
+        messages = [(self._digest(recipient, items), 0) for recipient, items in pending.items()]
+        while self._retries and self._retries[0][0] <= now:
+            _, _, attempts, message = heapq.heappop(self._retries)
+            messages.append((message, attempts))
+        if not messages:
+            return 0
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='alarm-smtp')
+        results = list(self._executor.map(lambda entry: self._send(entry[0]), messages))
+
+        sent = 0
+        for (message, attempts), ok in zip(messages, results):
+            if ok:
+                sent += 1
+            elif attempts < self.max_retries:
+                delay = min(self.window * 2 ** attempts, MAX_RETRY_DELAY)
+                self._sequence += 1
+                heapq.heappush(self._retries, (now + delay, self._sequence, attempts + 1, message))
+            else:
+                logger.error(f"Notificación a {', '.join(message.to)} descartada tras {attempts} reintentos")
+        return sent
+
+    def pending_retries(self) -> int:
+        return len(self._retries)
+
+    def _digest(self, recipient: str, items: List[Dict]) -> EmailMessage:
+        items = sorted(items, key=lambda item: item['timestamp'])
+        if len(items) == 1:
+            subject = f"[OPCPR] Alarma {items[0]['severity']}: {items[0]['message']}"
+        else:
+            subject = f"[OPCPR] {len(items)} alarmas nuevas"
+        lines = [
+            f"{item['timestamp']:%Y-%m-%d %H:%M:%S} [{item['severity']}] {item['alarm_type']}: {item['message']}"
+            for item in items
+        ]
+        return EmailMessage(subject, '\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [recipient])
+
+    def _send(self, message: EmailMessage) -> bool:
+        """Enviar por una conexión del pool; una conexión con error se descarta"""
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            connection.send_messages([message])
+        except Exception as e:
+            logger.warning(f"Error SMTP enviando notificación a {', '.join(message.to)}: {e}")
+            try:
+                connection.close()
+            except Exception:
+                pass
+            return False
+        self._connections.put(connection)
+        return True
+
+
+# Instancia global del notificador de alarmas
+alarm_notifier = AlarmNotifier(
+    settings.ALARM_NOTIFY_WINDOW, settings.ALARM_NOTIFY_POOL_SIZE,
+    settings.ALARM_NOTIFY_MAX_RETRIES, settings.ALARM_NOTIFY_QUEUE_SIZE
+)
@@ -0,0 +1,27 @@
+# parsers.py
+"""
+Parsers adicionales para la API REST
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional (API_FAST_JSON)
+    orjson = None
+
+
+class ORJSONParser(parsers.JSONParser):
+    """Parser JSON basado en orjson"""
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured('ORJSONParser requiere el paquete orjson')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
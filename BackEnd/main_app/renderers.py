@@ -0,0 +1,114 @@
+# renderers.py
+"""
+Renderers adicionales para la API REST
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query import QuerySet
+from django.utils.functional import Promise
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional (API_FAST_JSON)
+    orjson = None
+
+
+# Tipos de valor admitidos en las series binarias (little-endian)
+TIME_SERIES_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float64': np.dtype('<f8'),
+}
+
+
+def pack_time_series(timestamps_ms, values, value_dtype='float32'):
+    """
+    Empaquetar una serie temporal como dos arrays contiguos little-endian:
+    primero los timestamps (int64, epoch en ms) y a continuación los valores
+    (float32/float64). Los valores nulos se codifican como NaN.
+    """
+    dtype = TIME_SERIES_DTYPES[value_dtype]
+    ts_array = np.asarray(timestamps_ms, dtype='<i8')
+    value_array = np.asarray(values, dtype=np.float64).astype(dtype, copy=False)
+    return ts_array.tobytes() + value_array.tobytes()
+
+
+class TimeSeriesBinaryRenderer(renderers.BaseRenderer):
+    """
+    Renderer para series temporales binarias (application/octet-stream).
+    La vista entrega los bytes ya empaquetados; cualquier otro contenido
+    (p. ej. errores) se devuelve como JSON codificado.
+    """
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def orjson_default(obj):
+    """Tipos que orjson no serializa de forma nativa (mismo criterio que DRF)"""
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        # Formato del encoder de DRF (OPT_PASSTHROUGH_DATETIME) para no cambiar la salida
+        return JSONEncoder().default(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return tuple(item for item in obj)
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    Renderer JSON basado en orjson. Serializa de forma nativa los arrays
+    NumPy; fechas, horas y Decimal se emiten igual que el renderer por
+    defecto de DRF.
+    """
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured('ORJSONRenderer requiere el paquete orjson')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(data, default=orjson_default, option=option)
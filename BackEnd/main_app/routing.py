@@ -0,0 +1,12 @@
+# routing.py
+"""
+Rutas WebSocket del sistema multi-protocolo
+"""
+
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/live/', consumers.LiveGatewayConsumer.as_asgi()),
+]
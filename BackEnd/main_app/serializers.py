@@ -1,10 +1,11 @@
-from rest_framework import serializers
+from rest_framework import permissions, serializers
 from django.contrib.auth.models import User
 from .models import (
     OpcUaServer, VariableType, OpcUaVariable, VariableReading,
     ConnectionLog, Alarm, UserProfile, SystemConfiguration, AuditLog,
     DataServer, DataVariable, DataReading
 )
+from .ingest import reading_ingestor
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -96,32 +97,33 @@ class VariableReadingSerializer(serializers.ModelSerializer):
 
 class ConnectionLogSerializer(serializers.ModelSerializer):
     server_name = serializers.CharField(source='server.name', read_only=True)
+    data_server_name = serializers.CharField(source='data_server.name', read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
     
     class Meta:
         model = ConnectionLog
         fields = [
-            'id', 'server', 'server_name', 'timestamp', 'event_type',
-            'message', 'error_code', 'response_time', 'user', 'user_name'
+            'id', 'server', 'server_name', 'data_server', 'data_server_name', 'timestamp',
+            'event_type', 'message', 'error_code', 'response_time', 'metrics', 'user', 'user_name'
         ]
-        read_only_fields = ['id', 'server_name', 'user_name', 'timestamp']
+        read_only_fields = ['id', 'server_name', 'data_server_name', 'user_name', 'timestamp']
 
 class AlarmSerializer(serializers.ModelSerializer):
-    variable_name = serializers.CharField(source='variable.name', read_only=True)
-    server_name = serializers.CharField(source='variable.server.name', read_only=True)
+    variable_name = serializers.CharField(source='source_variable.name', read_only=True)
+    server_name = serializers.CharField(source='source_variable.server.name', read_only=True)
     acknowledged_by_name = serializers.CharField(source='acknowledged_by.username', read_only=True)
     
     class Meta:
         model = Alarm
         fields = [
-            'id', 'variable', 'variable_name', 'server_name', 'timestamp',
-            'alarm_type', 'severity', 'message', 'value', 'is_active',
+            'id', 'variable', 'data_variable', 'data_server', 'variable_name', 'server_name',
+            'timestamp', 'alarm_type', 'severity', 'message', 'value', 'is_active',
             'acknowledged', 'acknowledged_by', 'acknowledged_by_name',
-            'acknowledged_at', 'cleared_at'
+            'acknowledged_at', 'cleared_at', 'occurrence_count', 'last_occurrence'
         ]
         read_only_fields = [
             'id', 'variable_name', 'server_name', 'acknowledged_by_name',
-            'timestamp', 'acknowledged_at', 'cleared_at'
+            'timestamp', 'acknowledged_at', 'cleared_at', 'occurrence_count', 'last_occurrence'
         ]
 
 class SystemConfigurationSerializer(serializers.ModelSerializer):
@@ -178,8 +180,8 @@ class DashboardVariableSerializer(serializers.ModelSerializer):
 
 class DashboardAlarmSerializer(serializers.ModelSerializer):
     """Serializer ligero para alarmas en el dashboard"""
-    variable_name = serializers.CharField(source='variable.name', read_only=True)
-    server_name = serializers.CharField(source='variable.server.name', read_only=True)
+    variable_name = serializers.CharField(source='source_variable.name', read_only=True)
+    server_name = serializers.CharField(source='source_variable.server.name', read_only=True)
     
     class Meta:
         model = Alarm
@@ -202,7 +204,43 @@ class ConnectionStatusSerializer(serializers.Serializer):
 
 # === NUEVOS SERIALIZERS PARA SISTEMA MULTI-PROTOCOLO ===
 
-class DataServerSerializer(serializers.ModelSerializer):
+def get_sparse_fieldset(request, field_names):
+    """
+    Campos a incluir según los parámetros ?fields=a,b y ?omit=c de la
+    petición (solo en peticiones de lectura)
+    """
+    selected = set(field_names)
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return selected
+    
+    fields = request.query_params.get('fields')
+    if fields:
+        selected &= {name.strip() for name in fields.split(',') if name.strip()}
+    
+    omit = request.query_params.get('omit')
+    if omit:
+        selected -= {name.strip() for name in omit.split(',')}
+    
+    return selected
+
+
+class SparseFieldsetMixin:
+    """
+    Elimina los campos no solicitados (?fields= / ?omit=) antes de serializar,
+    de modo que tampoco se ejecutan sus SerializerMethodField
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        request = self.context.get('request')
+        selected = get_sparse_fieldset(request, self.fields.keys())
+        for field_name in list(self.fields.keys()):
+            if field_name not in selected:
+                self.fields.pop(field_name)
+
+
+class DataServerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para servidores de datos multi-protocolo"""
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     connection_status = serializers.SerializerMethodField()
@@ -228,11 +266,13 @@ class DataServerSerializer(serializers.ModelSerializer):
         return status.get('connected', False)
     
     def get_variables_count(self, obj):
-        """Obtener número de variables del servidor"""
+        """Obtener número de variables del servidor (anotado en el queryset si existe)"""
+        if hasattr(obj, 'variables_count'):
+            return obj.variables_count
         return obj.datavariable_set.count()
 
 
-class DataVariableSerializer(serializers.ModelSerializer):
+class DataVariableSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para variables de datos multi-protocolo"""
     server_name = serializers.CharField(source='server.name', read_only=True)
     server_type = serializers.CharField(source='server.server_type', read_only=True)
@@ -248,30 +288,33 @@ class DataVariableSerializer(serializers.ModelSerializer):
             'description', 'variable_type', 'variable_type_name', 'data_type',
             'unit', 'min_value', 'max_value', 'is_writable', 'is_monitored',
             'sampling_interval', 'protocol_config', 'alarm_enabled',
-            'alarm_high_limit', 'alarm_low_limit', 'created_by', 'created_by_name',
+            'alarm_high_limit', 'alarm_low_limit', 'alarm_deadband', 'alarm_on_delay',
+            'alarm_off_delay', 'alarm_rate_limit', 'alarm_rate_unit', 'alarm_rate_window',
+            'alarm_setpoint', 'alarm_deviation_limit', 'alarm_shelved_until', 'alarm_shelved_by', 'created_by', 'created_by_name',
             'created_at', 'updated_at', 'current_value', 'last_reading_time'
         ]
         read_only_fields = [
             'id', 'server_name', 'server_type', 'variable_type_name', 'created_by_name',
+            'alarm_shelved_until', 'alarm_shelved_by',
             'created_at', 'updated_at', 'current_value', 'last_reading_time'
         ]
     
     def get_current_value(self, obj):
         """Obtener el último valor leído"""
-        last_reading = obj.readings.first()
+        last_reading = obj.get_latest_reading()
         if last_reading:
-            return last_reading.get_value()
+            return last_reading['value']
         return None
     
     def get_last_reading_time(self, obj):
         """Obtener timestamp de la última lectura"""
-        last_reading = obj.readings.first()
+        last_reading = obj.get_latest_reading()
         if last_reading:
-            return last_reading.timestamp
+            return last_reading['timestamp']
         return None
 
 
-class DataReadingSerializer(serializers.ModelSerializer):
+class DataReadingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para lecturas de datos multi-protocolo"""
     variable_name = serializers.CharField(source='variable.name', read_only=True)
     server_name = serializers.CharField(source='variable.server.name', read_only=True)
@@ -308,12 +351,12 @@ class DataReadingCreateSerializer(serializers.ModelSerializer):
         value = validated_data.pop('value')
         reading = DataReading(**validated_data)
         reading.set_value(value)
-        reading.save()
+        reading_ingestor.ingest([reading])
         return reading
 
 
 # Serializers simplificados para el dashboard multi-protocolo
-class DashboardDataVariableSerializer(serializers.ModelSerializer):
+class DashboardDataVariableSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer ligero para variables en el dashboard"""
     current_value = serializers.SerializerMethodField()
     server_name = serializers.CharField(source='server.name', read_only=True)
@@ -328,14 +371,7 @@ class DashboardDataVariableSerializer(serializers.ModelSerializer):
     
     def get_current_value(self, obj):
         """Obtener valor actual con metadatos"""
-        last_reading = obj.readings.first()
-        if last_reading:
-            return {
-                'value': last_reading.get_value(),
-                'timestamp': last_reading.timestamp,
-                'quality': last_reading.quality
-            }
-        return None
+        return obj.get_latest_reading()
 
 
 class ServerConnectionStatusSerializer(serializers.Serializer):
@@ -349,3 +385,4 @@ class ServerConnectionStatusSerializer(serializers.Serializer):
     error_count = serializers.IntegerField(default=0)
     variables_count = serializers.IntegerField(default=0)
     active_subscriptions = serializers.ListField(child=serializers.CharField(), default=list)
+    latency = serializers.DictField(default=dict)  # p50/p95/p99 por operación (ms)
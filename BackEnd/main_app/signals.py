@@ -0,0 +1,95 @@
+# signals.py
+"""
+Señales del sistema multi-protocolo
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .active_alarms import active_alarms
+from .alarms import REEVALUATION_FIELDS, alarm_engine, reevaluate_alarms
+from .authentication import token_cache
+from .caching import configuration_changed
+from .changes import change_feed
+from .ingest import readings_ingested
+from .live import live_hub
+from .models import Alarm, DataServer, DataVariable, UserProfile
+from .notifications import alarm_notifier
+
+
+@receiver(post_save, sender=DataServer)
+@receiver(post_delete, sender=DataServer)
+@receiver(post_save, sender=DataVariable)
+@receiver(post_delete, sender=DataVariable)
+def data_configuration_changed(sender, **kwargs):
+    """Invalidar agregados en caché y ETags al cambiar la configuración"""
+    configuration_changed()
+
+
+@receiver(readings_ingested)
+def publish_live_readings(sender, readings, **kwargs):
+    """Repartir las lecturas nuevas a los flujos en vivo y al feed de cambios"""
+    live_hub.publish(readings)
+    change_feed.publish(readings)
+
+
+@receiver(pre_save, sender=DataVariable)
+def remember_alarm_limits(sender, instance, update_fields=None, **kwargs):
+    """Guardar los límites almacenados antes de la edición para detectar cambios"""
+    instance._stored_alarm_limits = None
+    if instance.pk is None or (update_fields is not None and not set(update_fields) & set(REEVALUATION_FIELDS)):
+        return
+    instance._stored_alarm_limits = sender.objects.filter(pk=instance.pk).values_list(
+        *REEVALUATION_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=DataVariable)
+def variable_alarm_limits_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Reevaluar las alarmas de la variable solo si cambiaron sus límites"""
+    if created:
+        if not instance.alarm_enabled:
+            return
+    else:
+        stored = getattr(instance, '_stored_alarm_limits', None)
+        current = tuple(getattr(instance, field) for field in REEVALUATION_FIELDS)
+        if stored is None or tuple(stored) == current:
+            return
+    transaction.on_commit(lambda: reevaluate_alarms([instance.id]), robust=True)
+
+
+@receiver(readings_ingested)
+def evaluate_alarms(sender, readings, **kwargs):
+    """Evaluar límites de alarma de las lecturas nuevas y encolar sus notificaciones"""
+    alarm_notifier.submit(alarm_engine.process(readings))
+
+
+@receiver(post_save, sender=Alarm)
+@receiver(post_delete, sender=Alarm)
+def alarm_changed(sender, **kwargs):
+    """Alarma editada fuera del motor: reconstruir la consola de activas"""
+    active_alarms.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Logout o revocación: quitar el token de la caché de autenticación"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Desactivación u otros cambios del usuario: descartar sus credenciales en caché"""
+    token_cache.invalidate_user(instance.pk)
+    alarm_notifier.invalidate_recipients()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def notification_preferences_changed(sender, **kwargs):
+    """Recargar los destinatarios de notificaciones de alarmas"""
+    alarm_notifier.invalidate_recipients()
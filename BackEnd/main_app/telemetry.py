@@ -0,0 +1,253 @@
+# telemetry.py
+"""
+Telemetría de conexiones por servidor de datos
+Cada cliente lleva histogramas de latencia (connect, read, write) y de tamaño
+de lote en memoria, con cubetas logarítmicas al estilo HDR: 16 subcubetas por
+potencia de dos (error relativo < 6%) en un array de enteros fijo, así que
+registrar es O(1) y sin asignaciones. Las latencias se guardan en
+microsegundos. El estado de servidores muestra los percentiles acumulados
+desde la conexión; TelemetryRollup escribe periódicamente el intervalo en
+ConnectionLog (event_type LATENCY). Sin dependencias de Django salvo en el
+volcado, para poder usar los clientes fuera del servidor.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Subcubetas: valores < 32 exactos, después 16 por potencia de dos
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+# Valor máximo representable (~19 h en microsegundos); lo mayor se satura
+MAX_VALUE = (1 << 36) - 1
+BUCKET_COUNT = (MAX_VALUE.bit_length() - SUB_BUCKET_BITS) * SUB_BUCKET_HALF + SUB_BUCKET_COUNT
+
+# Operaciones medidas
+LATENCY_OPERATIONS = ('connect', 'read', 'write')
+BATCH_OPERATIONS = ('read', 'write')
+
+# Percentiles publicados
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_index(value: int) -> int:
+    shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+    return shift * SUB_BUCKET_HALF + (value >> shift)
+
+
+def bucket_range(index: int) -> Tuple[int, int]:
+    """Valores mínimo y máximo de una cubeta"""
+    shift = 0 if index < SUB_BUCKET_COUNT else index // SUB_BUCKET_HALF - 1
+    low = (index - shift * SUB_BUCKET_HALF) << shift
+    return low, low + (1 << shift) - 1
+
+
+def bucket_value(index: int) -> int:
+    """Valor medio representativo de una cubeta"""
+    low, high = bucket_range(index)
+    return (low + high) // 2
+
+
+class Histogram:
+    """Histograma de enteros no negativos con cubetas logarítmicas"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        value = min(max(int(value), 0), MAX_VALUE)
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        if percent >= 100:
+            return self.max
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def copy(self) -> 'Histogram':
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.count, other.total, other.max = self.count, self.total, self.max
+        return other
+
+    def __sub__(self, other: 'Histogram') -> 'Histogram':
+        """Diferencia de dos copias del mismo histograma (intervalo)"""
+        delta = Histogram()
+        delta.counts = [a - b for a, b in zip(self.counts, other.counts)]
+        delta.count = self.count - other.count
+        delta.total = self.total - other.total
+        if delta.count:
+            top = max(index for index, bucket in enumerate(delta.counts) if bucket)
+            delta.max = min(bucket_range(top)[1], self.max)
+        return delta
+
+    def summary(self, scale: float = 1.0, digits: int = 3) -> Dict:
+        """Conteo, media, percentiles y máximo (divididos por scale)"""
+        result = {'count': self.count}
+        result['mean'] = round(self.total / self.count / scale, digits) if self.count else None
+        for percent in PERCENTILES:
+            result[f'p{percent}'] = round(self.percentile(percent) / scale, digits) if self.count else None
+        result['max'] = round(self.max / scale, digits) if self.count else None
+        return result
+
+
+class ClientTelemetry:
+    """Histogramas de un cliente de datos (latencias en µs, lotes en variables)"""
+
+    def __init__(self):
+        self.latency = {operation: Histogram() for operation in LATENCY_OPERATIONS}
+        self.batch_size = {operation: Histogram() for operation in BATCH_OPERATIONS}
+        self.errors = {operation: 0 for operation in LATENCY_OPERATIONS}
+        self._baseline: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float, batch_size: Optional[int] = None, ok: bool = True):
+        with self._lock:
+            self.latency[operation].record(seconds * 1_000_000)
+            if batch_size is not None:
+                self.batch_size[operation].record(batch_size)
+            if not ok:
+                self.errors[operation] += 1
+
+    @contextmanager
+    def measure(self, operation: str, batch_size: Optional[int] = None):
+        """Medir el bloque (también await); una excepción cuenta como error"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(operation, time.perf_counter() - start, batch_size, ok=False)
+            raise
+        self.record(operation, time.perf_counter() - start, batch_size)
+
+    def snapshot(self) -> Dict:
+        """Copia coherente de los histogramas y errores"""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> Dict:
+        return {
+            'latency': {operation: histogram.copy() for operation, histogram in self.latency.items()},
+            'batch_size': {operation: histogram.copy() for operation, histogram in self.batch_size.items()},
+            'errors': dict(self.errors),
+        }
+
+    @staticmethod
+    def _summarize(state: Dict) -> Dict:
+        summary = {
+            operation: dict(histogram.summary(scale=1000), errors=state['errors'][operation])
+            for operation, histogram in state['latency'].items()
+        }
+        summary['batch_size'] = {
+            operation: histogram.summary(digits=1) for operation, histogram in state['batch_size'].items()
+        }
+        return summary
+
+    def summary(self) -> Dict:
+        """Percentiles acumulados (latencias en ms)"""
+        return self._summarize(self.snapshot())
+
+    def interval(self) -> Optional[Dict]:
+        """Percentiles desde el intervalo anterior (None si no hubo operaciones)"""
+        with self._lock:
+            state = self._state()
+            baseline, self._baseline = self._baseline, state
+        if baseline is not None:
+            state = {
+                'latency': {op: h - baseline['latency'][op] for op, h in state['latency'].items()},
+                'batch_size': {op: h - baseline['batch_size'][op] for op, h in state['batch_size'].items()},
+                'errors': {op: n - baseline['errors'][op] for op, n in state['errors'].items()},
+            }
+        if not any(histogram.count for histogram in state['latency'].values()):
+            return None
+        return self._summarize(state)
+
+
+class TelemetryRollup:
+    """Volcado periódico de la telemetría de los clientes a ConnectionLog"""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Arrancar el hilo de volcado (una vez por proceso; TELEMETRY_ROLLUP_INTERVAL por defecto)"""
+        from django.conf import settings
+
+        with self._lock:
+            if self.interval is None:
+                self.interval = settings.TELEMETRY_ROLLUP_INTERVAL
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name='telemetry-rollup', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(self.interval)
+            close_old_connections()
+            try:
+                self.rollup()
+            except Exception as e:
+                logger.error(f"Error volcando telemetría de conexiones: {e}")
+
+    def rollup(self, clients: Optional[Dict] = None) -> List:
+        """Crear una fila LATENCY por servidor con operaciones en el intervalo"""
+        from .data_clients import data_manager
+        from .models import ConnectionLog, DataServer
+
+        clients = dict(data_manager.clients if clients is None else clients)
+        server_ids = {server_id for server_id in clients if str(server_id).isdigit()}
+        existing = set(
+            DataServer.objects.filter(id__in=[int(server_id) for server_id in server_ids])
+            .values_list('id', flat=True)
+        )
+
+        logs = []
+        for server_id in sorted(server_ids, key=int):
+            if int(server_id) not in existing:
+                continue
+            metrics = clients[server_id].telemetry.interval()
+            if metrics is None:
+                continue
+            read = metrics['read']
+            logs.append(ConnectionLog(
+                data_server_id=int(server_id),
+                event_type='LATENCY',
+                response_time=read['p95'],
+                message=' '.join(
+                    f"{operation}: n={metrics[operation]['count']} p50={metrics[operation]['p50']} "
+                    f"p95={metrics[operation]['p95']} p99={metrics[operation]['p99']} ms;"
+                    for operation in LATENCY_OPERATIONS if metrics[operation]['count']
+                ),
+                metrics=metrics,
+            ))
+        return ConnectionLog.objects.bulk_create(logs)
+
+
+# Instancia global del volcado de telemetría
+telemetry_rollup = TelemetryRollup()
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from rest_framework import status
 import json
@@ -98,3 +98,1591 @@ class SupervisorioOpcuaTestCase(TestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DataApiTestCase(TestCase):
+    """Base para pruebas de la API multi-protocolo"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from .models import DataServer, VariableType
+
+        self.user = User.objects.create_user(username='operador', password='secreto123')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.variable_type = VariableType.objects.create(name='Analógica')
+        self.server = DataServer.objects.create(
+            name='Planta 1', server_type='WEBSOCKET',
+            endpoint_url='ws://localhost:8765', created_by=self.user
+        )
+
+    def create_variable(self, name, data_type='FLOAT', server=None, **kwargs):
+        from .models import DataVariable
+
+        return DataVariable.objects.create(
+            server=server or self.server, address=name, name=name,
+            variable_type=self.variable_type, data_type=data_type,
+            created_by=self.user, **kwargs
+        )
+
+    def create_reading(self, variable, value, timestamp=None, **kwargs):
+        from django.utils import timezone
+        from .models import DataReading
+
+        reading = DataReading(variable=variable, timestamp=timestamp or timezone.now(), **kwargs)
+        reading.set_value(value)
+        reading.save()
+        return reading
+
+
+class DataReadingBinaryTestCase(DataApiTestCase):
+    def test_binary_series(self):
+        """Serie binaria: timestamps int64 seguidos de valores float32"""
+        import numpy as np
+        from datetime import datetime, timezone as dt_timezone
+
+        variable = self.create_variable('temperature_1')
+        base = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        for i in range(5):
+            self.create_reading(variable, 20.5 + i, timestamp=base.replace(second=i))
+
+        response = self.api.get(reverse('datareading-list'), {'variable': variable.id, 'format': 'bin'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(response['X-Series-Count'], '5')
+
+        timestamps = np.frombuffer(response.content[:40], dtype='<i8')
+        values = np.frombuffer(response.content[40:], dtype='<f4')
+        expected_ts = int(base.timestamp() * 1000)
+        self.assertEqual(list(timestamps), [expected_ts + i * 1000 for i in range(4, -1, -1)])
+        self.assertEqual(list(values), [24.5, 23.5, 22.5, 21.5, 20.5])
+
+    def test_binary_series_submillisecond_timestamp(self):
+        """Epoch ms calculado en la base de datos, truncando los microsegundos"""
+        import numpy as np
+        from datetime import datetime, timezone as dt_timezone
+
+        variable = self.create_variable('temperature_1')
+        self.create_reading(variable, 1.0, timestamp=datetime(2025, 1, 1, 0, 0, 1, 999999, tzinfo=dt_timezone.utc))
+        self.create_reading(variable, 2.0, timestamp=datetime(2025, 1, 1, 0, 0, 2, tzinfo=dt_timezone.utc))
+
+        response = self.api.get(reverse('datareading-list'), {'variable': variable.id, 'format': 'bin'})
+        self.assertEqual(list(np.frombuffer(response.content[:16], dtype='<i8')), [1735689602000, 1735689601999])
+
+    def test_binary_series_float64_and_booleans(self):
+        """Booleanos como 0/1 y dtype float64"""
+        import numpy as np
+
+        variable = self.create_variable('motor_1_status', data_type='BOOLEAN')
+        self.create_reading(variable, True)
+
+        response = self.api.get(
+            reverse('datareading-list'), {'variable': variable.id, 'format': 'bin', 'dtype': 'float64'}
+        )
+        self.assertEqual(response['X-Series-Dtype'], 'float64')
+        self.assertEqual(list(np.frombuffer(response.content[8:], dtype='<f8')), [1.0])
+
+    def test_binary_series_invalid_dtype(self):
+        response = self.api.get(reverse('datareading-list'), {'format': 'bin', 'dtype': 'int8'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LatestReadingsTestCase(DataApiTestCase):
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import DataServer
+
+        self.other_server = DataServer.objects.create(
+            name='Planta 2', server_type='OPC_UA',
+            endpoint_url='opc.tcp://localhost:4840', created_by=self.user
+        )
+        now = timezone.now()
+        for server in (self.server, self.other_server):
+            for i in range(3):
+                variable = self.create_variable(f'tag_{server.id}_{i}', server=server)
+                self.create_reading(variable, 1.0, timestamp=now - timedelta(minutes=1))
+                self.create_reading(variable, 2.0, timestamp=now)
+        self.create_variable('sin_monitoreo', is_monitored=False)
+
+    def test_latest_single_query(self):
+        """Una única consulta independientemente del número de variables"""
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('datareading-latest'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 6)
+        self.assertTrue(all(item['value'] == 2.0 for item in response.data))
+
+    def test_latest_filtered_by_server_and_type(self):
+        response = self.api.get(reverse('datareading-latest'), {'server': self.server.id})
+        self.assertEqual({item['server_name'] for item in response.data}, {'Planta 1'})
+        self.assertEqual(len(response.data), 3)
+
+        response = self.api.get(reverse('datareading-latest'), {'server_type': 'OPC_UA'})
+        self.assertEqual({item['server_type'] for item in response.data}, {'OPC_UA'})
+
+
+class AnnotatedListQueriesTestCase(DataApiTestCase):
+    """Las listas deben ejecutar un número constante de consultas"""
+
+    def setUp(self):
+        super().setUp()
+        from .models import DataServer, DataVariable
+
+        DataServer.objects.bulk_create([
+            DataServer(name=f'Servidor {i}', server_type='MODBUS',
+                       endpoint_url=f'tcp://10.0.0.{i % 250}', created_by=self.user)
+            for i in range(999)
+        ])
+        DataVariable.objects.bulk_create([
+            DataVariable(server=self.server, address=f'tag_{i}', name=f'tag_{i}',
+                         variable_type=self.variable_type, data_type='FLOAT', created_by=self.user)
+            for i in range(1000)
+        ])
+        self.first_variable = DataVariable.objects.get(address='tag_0')
+        self.create_reading(self.first_variable, 42.5)
+
+    def test_variable_serializer_constant_queries(self):
+        from .models import DataVariable
+        from .serializers import DataVariableSerializer
+
+        queryset = DataVariable.objects.select_related(
+            'server', 'variable_type', 'created_by'
+        ).with_latest_reading()
+        # Variables con el id de su última lectura + esas lecturas en un solo pk__in
+        with self.assertNumQueries(2):
+            variables = DataVariable.attach_latest_readings(queryset)
+            data = DataVariableSerializer(variables, many=True).data
+        self.assertEqual(len(data), 1000)
+        current = {item['address']: item['current_value'] for item in data}
+        self.assertEqual(current['tag_0'], 42.5)
+        self.assertIsNone(current['tag_1'])
+
+    def test_dashboard_constant_queries(self):
+        # Consulta de variables, sus últimas lecturas y secuencia de cambios del ETag
+        with self.assertNumQueries(3):
+            response = self.api.get(reverse('datavariable-dashboard'))
+        self.assertEqual(len(response.data), 1000)
+        item = next(item for item in response.data if item['id'] == self.first_variable.id)
+        self.assertEqual(item['current_value']['value'], 42.5)
+        self.assertEqual(item['current_value']['quality'], 'GOOD')
+
+    def test_server_list_and_status_constant_queries(self):
+        from .serializers import DataServerSerializer
+        from .data_views import DataServerViewSet
+
+        with self.assertNumQueries(1):
+            data = DataServerSerializer(DataServerViewSet(request=None).get_queryset(), many=True).data
+        self.assertEqual(len(data), 1000)
+        counts = {item['id']: item['variables_count'] for item in data}
+        self.assertEqual(counts[self.server.id], 1000)
+
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('dataserver-all-status'))
+        self.assertEqual(len(response.data), 1000)
+
+
+class DashboardSummaryTestCase(DataApiTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        super().setUp()
+        self.variable = self.create_variable('temperature_1')
+
+    def ingest(self, count, timestamp=None):
+        from django.utils import timezone
+        from .ingest import reading_ingestor
+        from .models import DataReading
+
+        readings = []
+        for i in range(count):
+            reading = DataReading(variable=self.variable, timestamp=timestamp or timezone.now())
+            reading.set_value(float(i))
+            readings.append(reading)
+        return reading_ingestor.ingest(readings)
+
+    def test_ingest_maintains_minute_counters(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .ingest import reading_ingestor
+        from .models import DataReading, ReadingMinuteCounter
+
+        self.ingest(3)
+        self.ingest(2)
+        self.ingest(4, timestamp=timezone.now() - timedelta(hours=30))
+        self.assertEqual(DataReading.objects.count(), 9)
+        self.assertEqual(reading_ingestor.count_since(timezone.now() - timedelta(hours=24)), 5)
+        self.assertEqual(ReadingMinuteCounter.objects.filter(minute__gte=timezone.now() - timedelta(hours=1)).count(), 1)
+
+    def test_summary_cached_and_invalidated(self):
+        url = reverse('dashboard_summary')
+        self.ingest(3)
+
+        response = self.api.get(url)
+        self.assertEqual(response.data['readings']['last_24h'], 3)
+        self.assertEqual(response.data['variables']['total'], 1)
+
+        # Respuesta servida desde caché (solo la secuencia de cambios del ETag)
+        with self.assertNumQueries(1):
+            self.api.get(url)
+
+        self.create_variable('pressure_1')
+        response = self.api.get(url)
+        self.assertEqual(response.data['variables']['total'], 2)
+        self.assertEqual(response.data['protocols'], ['WEBSOCKET'])
+
+    def test_summary_etag_follows_served_body(self):
+        from unittest import mock
+
+        url = reverse('dashboard_summary')
+        self.ingest(3)
+        response = self.api.get(url)
+        etag = response['ETag']
+
+        # Lecturas nuevas dentro del TTL: cuerpo y ETag cambian a la vez
+        self.ingest(2)
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['readings']['last_24h'], 5)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Servidor conectado dentro del TTL
+        client = mock.Mock(is_connected=True)
+        with mock.patch.dict('main_app.data_views.data_manager.clients', {str(self.server.id): client}), \
+                mock.patch('main_app.data_views.data_manager.get_server_status', return_value={'connected': True}):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['servers']['connected'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalGetTestCase(DataApiTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        super().setUp()
+        self.variable = self.create_variable('temperature_1')
+        self.create_reading(self.variable, 21.0)
+
+    def assert_conditional(self, url):
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Sin cambios: 304 sin ejecutar la vista (solo la consulta de secuencia)
+        with self.assertNumQueries(1):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # Nueva lectura ingresada: nueva versión
+        self.create_reading(self.variable, 22.0)
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        # Cambio de configuración: nueva versión
+        self.variable.unit = '°C'
+        self.variable.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_dashboard_variables_etag(self):
+        self.assert_conditional(reverse('datavariable-dashboard'))
+
+    def test_dashboard_summary_etag(self):
+        self.assert_conditional(reverse('dashboard_summary'))
+
+
+class ORJSONRendererTestCase(TestCase):
+    def setUp(self):
+        from .renderers import orjson
+
+        if orjson is None:
+            self.skipTest('orjson no está instalado')
+
+    def test_matches_drf_renderer(self):
+        """Misma salida que el renderer de DRF para tipos habituales"""
+        import datetime
+        import decimal
+        import numpy as np
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+
+        payload = {
+            'timestamp': datetime.datetime(2025, 1, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            'limit': decimal.Decimal('12.5'),
+            'values': [1, 2.5, None, 'texto', True],
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(payload)),
+            json.loads(JSONRenderer().render(payload))
+        )
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render({'series': np.array([1.5, 2.5])})),
+            {'series': [1.5, 2.5]}
+        )
+
+    def test_datetime_format_matches_drf_renderer(self):
+        """Fechas con microsegundos, naive, fecha y hora: mismos bytes que DRF"""
+        import datetime
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+
+        payload = {
+            'utc': datetime.datetime(2025, 1, 1, 12, 30, 5, 123456, tzinfo=datetime.timezone.utc),
+            'offset': datetime.datetime(2025, 1, 1, 9, 30, 5, 120000,
+                                        tzinfo=datetime.timezone(datetime.timedelta(hours=-3))),
+            'naive': datetime.datetime(2025, 1, 1, 12, 30, 5, 1),
+            'date': datetime.date(2025, 1, 1),
+            'time': datetime.time(12, 30, 5, 999),
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_parser(self):
+        import io
+        from rest_framework.exceptions import ParseError
+        from .parsers import ORJSONParser
+
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"value": 25.5}')), {'value': 25.5})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"invalid": json}'))
+
+
+class SparseFieldsetTestCase(DataApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variable = self.create_variable('temperature_1')
+        self.create_reading(self.variable, 21.5)
+
+    def capture(self, url, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_variables_fields(self):
+        """Solo id y nombre: sin joins ni subconsultas de última lectura"""
+        response, sql = self.capture(reverse('datavariable-list'), {'fields': 'id,name'})
+        self.assertEqual(response.data['results'], [{'id': self.variable.id, 'name': 'temperature_1'}])
+        self.assertNotIn('"main_app_dataserver"."name"', sql)
+        self.assertNotIn('"auth_user"', sql)
+        self.assertNotIn('latest_reading_id', sql)
+
+    def test_variables_omit(self):
+        response, sql = self.capture(
+            reverse('datavariable-list'), {'omit': 'current_value,last_reading_time'}
+        )
+        item = response.data['results'][0]
+        self.assertNotIn('current_value', item)
+        self.assertEqual(item['server_name'], 'Planta 1')
+        self.assertNotIn('latest_reading_id', sql)
+
+    def test_servers_and_readings_fields(self):
+        response, sql = self.capture(reverse('dataserver-list'), {'fields': 'id,name'})
+        self.assertEqual(response.data['results'], [{'id': self.server.id, 'name': 'Planta 1'}])
+        self.assertNotIn('COUNT', sql.split('LIMIT')[-1])
+
+        response, sql = self.capture(reverse('datareading-list'), {'fields': 'timestamp,value'})
+        self.assertEqual(set(response.data['results'][0]), {'timestamp', 'value'})
+        self.assertEqual(response.data['results'][0]['value'], 21.5)
+        self.assertNotIn('"main_app_dataserver"', sql)
+
+
+def make_fake_client(values=None):
+    """Cliente en memoria para probar las operaciones con dispositivos"""
+    from .data_clients import DataClientBase
+
+    class FakeDataClient(DataClientBase):
+        def __init__(self):
+            super().__init__({})
+            self.values = dict(values or {})
+            self.is_connected = True
+            self.batch_reads = 0
+            self.batch_writes = 0
+
+        async def connect(self):
+            self.is_connected = True
+            return True
+
+        async def disconnect(self):
+            self.is_connected = False
+
+        async def read_variable(self, address, config=None):
+            return self.values.get(address)
+
+        async def read_variables(self, items):
+            self.batch_reads += 1
+            return await super().read_variables(items)
+
+        async def write_variable(self, address, value, config=None):
+            self.values[address] = value
+            return True
+
+        async def write_variables(self, items):
+            self.batch_writes += 1
+            return await super().write_variables(items)
+
+        async def subscribe_variable(self, address, callback, config=None):
+            pass
+
+    return FakeDataClient()
+
+
+class AsyncDeviceViewsTestCase(DataApiTestCase):
+    def setUp(self):
+        from .data_clients import data_manager
+
+        super().setUp()
+        self.variable = self.create_variable('temperature_1', is_writable=True)
+        self.fake = make_fake_client({'temperature_1': 21.5})
+        data_manager.clients[str(self.server.id)] = self.fake
+        self.addCleanup(data_manager.clients.pop, str(self.server.id), None)
+
+    def test_read_value_persists_reading(self):
+        response = self.api.post(reverse('datavariable-read-value', args=[self.variable.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['value'], 21.5)
+        self.assertEqual(data['quality'], 'GOOD')
+        self.assertEqual(self.variable.readings.count(), 1)
+
+    def test_write_value(self):
+        url = reverse('datavariable-write-value', args=[self.variable.id])
+        response = self.api.post(url, {'value': 30.0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['status'], 'written')
+        self.assertEqual(self.fake.values['temperature_1'], 30.0)
+
+        response = self.api.post(url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_authentication_and_not_found(self):
+        from rest_framework.test import APIClient
+
+        response = APIClient().post(reverse('datavariable-read-value', args=[self.variable.id]))
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+        response = self.api.post(reverse('datavariable-read-value', args=[9999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_disconnect(self):
+        response = self.api.post(reverse('dataserver-disconnect', args=[self.server.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.fake.is_connected)
+
+    def test_read_many_grouped_by_server(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .data_clients import data_manager
+        from .models import DataReading, DataServer
+
+        other_server = DataServer.objects.create(
+            name='Planta 2', server_type='WEBSOCKET', endpoint_url='ws://localhost:8766',
+            created_by=self.user
+        )
+        other_fake = make_fake_client({'pressure_1': 3.2})
+        data_manager.clients[str(other_server.id)] = other_fake
+        self.addCleanup(data_manager.clients.pop, str(other_server.id), None)
+        pressure = self.create_variable('pressure_1', server=other_server)
+        missing = self.create_variable('level_1')
+
+        ids = [pressure.id, self.variable.id, missing.id, 9999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.post(
+                reverse('datavariable-read-many'), {'variable_ids': ids}, format='json'
+            )
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "main_app_datareading"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual([item['id'] for item in data['results']], ids[:3])
+        self.assertEqual(data['results'][0]['value'], 3.2)
+        self.assertEqual(data['results'][1]['quality'], 'GOOD')
+        self.assertEqual(data['results'][2]['quality'], 'BAD')
+        self.assertEqual(data['not_found'], [9999])
+        self.assertEqual((self.fake.batch_reads, other_fake.batch_reads), (1, 1))
+        self.assertEqual(DataReading.objects.count(), 2)
+
+        response = self.api.post(reverse('datavariable-read-many'), {'variable_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_write_many_validates_before_writing(self):
+        from .models import DataReading
+
+        setpoint = self.create_variable('setpoint_1', data_type='INTEGER', is_writable=True, max_value=100)
+        readonly = self.create_variable('level_1')
+        url = reverse('datavariable-write-many')
+
+        response = self.api.post(url, {'writes': [
+            {'variable_id': self.variable.id, 'value': 30.5},
+            {'variable_id': setpoint.id, 'value': 250},
+            {'variable_id': readonly.id, 'value': 1.0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = json.loads(response.content)['errors']
+        self.assertEqual([error['id'] for error in errors], [setpoint.id, readonly.id])
+        self.assertEqual(self.fake.batch_writes, 0)
+
+        response = self.api.post(url, {'writes': [
+            {'variable_id': self.variable.id, 'value': '30.5'},
+            {'variable_id': setpoint.id, 'value': 42},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual((data['written'], data['failed']), (2, 0))
+        self.assertEqual([item['status'] for item in data['results']], ['written', 'written'])
+        self.assertEqual(self.fake.batch_writes, 1)
+        self.assertEqual(self.fake.values['setpoint_1'], 42)
+        self.assertEqual(self.fake.values['temperature_1'], 30.5)
+        self.assertEqual(DataReading.objects.filter(value_integer=42).count(), 1)
+
+
+class ConnectionTelemetryTestCase(DataApiTestCase):
+    def setUp(self):
+        from .data_clients import data_manager
+
+        super().setUp()
+        self.variable = self.create_variable('temperature_1')
+        self.fake = make_fake_client({'temperature_1': 21.5})
+        data_manager.clients[str(self.server.id)] = self.fake
+        self.addCleanup(data_manager.clients.pop, str(self.server.id), None)
+
+    def test_histogram_percentiles(self):
+        from .telemetry import Histogram
+
+        histogram = Histogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        for percent in (50, 95, 99):
+            self.assertAlmostEqual(histogram.percentile(percent), percent * 100, delta=percent * 100 * 0.06)
+        self.assertEqual(histogram.percentile(100), 10000)
+        self.assertEqual(Histogram().summary()['p99'], None)
+
+    def test_status_reports_latency_percentiles(self):
+        self.api.post(reverse('datavariable-read-value', args=[self.variable.id]))
+        self.fake.telemetry.record('read', 0.250, batch_size=20)
+
+        response = self.api.get(reverse('dataserver-status', args=[self.server.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        latency = json.loads(response.content)['latency']
+        self.assertEqual(latency['read']['count'], 2)
+        self.assertAlmostEqual(latency['read']['p99'], 250, delta=250 * 0.06)
+        self.assertEqual(latency['batch_size']['read']['max'], 20)
+        self.assertEqual(latency['write']['count'], 0)
+
+    def test_rollup_writes_interval_to_connection_log(self):
+        from .models import ConnectionLog
+        from .telemetry import TelemetryRollup
+
+        rollup = TelemetryRollup(interval=0)
+        for milliseconds in (2, 4, 8):
+            self.fake.telemetry.record('read', milliseconds / 1000, batch_size=10)
+        logs = rollup.rollup()
+        self.assertEqual(len(logs), 1)
+
+        log = ConnectionLog.objects.get()
+        self.assertEqual((log.data_server, log.server, log.event_type), (self.server, None, 'LATENCY'))
+        self.assertEqual(log.metrics['read']['count'], 3)
+        self.assertAlmostEqual(log.response_time, 8, delta=0.5)
+
+        # Sin operaciones nuevas no hay fila; después solo cuenta el intervalo
+        self.assertEqual(rollup.rollup(), [])
+        self.fake.telemetry.record('write', 0.001, batch_size=1)
+        rollup.rollup()
+        log = ConnectionLog.objects.latest('id')
+        self.assertEqual((log.metrics['read']['count'], log.metrics['write']['count']), (0, 1))
+
+
+class MetricsTestCase(DataApiTestCase):
+    def test_text_exposition_format(self):
+        from .metrics import Counter, Histogram, Registry
+
+        registry = Registry()
+        requests = Counter('demo_requests_total', 'Peticiones', ('path',), registry)
+        latency = Histogram('demo_seconds', 'Latencia', registry=registry, buckets=(0.1, 1))
+        requests.labels('/a"b').inc(2)
+        for value in (0.05, 0.5, 3):
+            latency.observe(value)
+
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE demo_requests_total counter', lines)
+        self.assertIn('demo_requests_total{path="/a\\"b"} 2', lines)
+        self.assertEqual([line for line in lines if line.startswith('demo_seconds')], [
+            'demo_seconds_bucket{le="0.1"} 1', 'demo_seconds_bucket{le="1"} 2',
+            'demo_seconds_bucket{le="+Inf"} 3', 'demo_seconds_sum 3.55', 'demo_seconds_count 3',
+        ])
+
+    def test_metrics_endpoint(self):
+        from django.utils import timezone
+        from .data_clients import data_manager
+        from .ingest import reading_ingestor
+        from .metrics import ingest_readings
+        from .models import DataReading
+
+        fake = make_fake_client()
+        fake.telemetry.record('read', 0.003, batch_size=5)
+        data_manager.clients[str(self.server.id)] = fake
+        self.addCleanup(data_manager.clients.pop, str(self.server.id), None)
+
+        variable = self.create_variable('tag_1')
+        before = ingest_readings.labels().value
+        reading = DataReading(variable=variable, timestamp=timezone.now())
+        reading.set_value(1.5)
+        reading_ingestor.ingest([reading])
+        self.assertEqual(ingest_readings.labels().value, before + 1)
+
+        self.client.get(reverse('health_check'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn(f'opcpr_ingest_readings_total {int(before + 1)}', lines)
+        self.assertTrue(any(
+            line.startswith('opcpr_http_requests_total{method="GET",view="health_check",status="200"}')
+            for line in lines
+        ))
+        server = str(self.server.id)
+        self.assertIn(
+            f'opcpr_device_operation_duration_seconds_bucket{{server="{server}",operation="read",le="0.005"}} 1', lines
+        )
+        self.assertIn(f'opcpr_device_batch_items_total{{server="{server}",operation="read"}} 5', lines)
+        self.assertIn('opcpr_data_servers{state="connected"} 1', lines)
+
+    @override_settings(METRICS_TOKEN='scraper')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scraper')
+        self.assertEqual(response.status_code, 200)
+
+
+class WebSocketSimulatorTestCase(TestCase):
+    def test_vectorized_tag_groups(self):
+        from opcpr_project.websocket_server_example import IndustrialWebSocketServer
+
+        server = IndustrialWebSocketServer(update_interval=1.0, seed=7, tag_groups=[
+            {'prefix': 'fast', 'count': 10, 'rate': 4},
+            {'prefix': 'flow', 'count': 5000, 'rate': 1, 'value': 0.0, 'min': -1.0, 'max': 1.0, 'unit': 'm3/h'},
+        ])
+        self.assertEqual(server.update_interval, 0.25)
+        self.assertEqual(len(server.variables), 5010)
+        self.assertEqual(server.variables['flow_3']['unit'], 'm3/h')
+
+        # Ciclo 0: ambos grupos; ciclo 1: solo el rápido
+        server._update_variables()
+        flow = server.tags.values[10:].copy()
+        server._update_variables()
+        self.assertTrue(server.tags.updated(0))
+        self.assertFalse(server.tags.updated(server.tags.index['flow_0']))
+        self.assertTrue((server.tags.values[10:] == flow).all())
+        self.assertTrue(((flow >= -1.0) & (flow <= 1.0)).all())
+
+        server.variables['flow_3']['value'] = 0.5
+        self.assertEqual(server.variables['flow_3']['value'], 0.5)
+
+        for rate in (0, -1):
+            with self.assertRaises(ValueError):
+                IndustrialWebSocketServer(tag_groups=[{'count': 10, 'rate': rate}])
+
+
+class LiveStreamTestCase(DataApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variable = self.create_variable('temperature_1')
+        self.reading = self.create_reading(self.variable, 21.5)
+
+    def make_reading(self, pk, value):
+        from django.utils import timezone
+        from .models import DataReading
+
+        reading = DataReading(id=pk, variable=self.variable, timestamp=timezone.now())
+        reading.set_value(value)
+        return reading
+
+    async def test_snapshot_then_coalesced_updates(self):
+        from .async_views import live_events
+        from .live import live_hub
+
+        events = live_events([self.variable.id], interval=0.05, heartbeat=5)
+        self.assertTrue((await events.__anext__()).startswith(b'retry:'))
+
+        snapshot = (await events.__anext__()).decode()
+        self.assertIn(f'id: {self.reading.id}\n', snapshot)
+        self.assertIn('"value":21.5', snapshot)
+
+        # Dentro del intervalo solo se envía el último valor
+        live_hub.publish([self.make_reading(self.reading.id + 1, 22.0)])
+        live_hub.publish([self.make_reading(self.reading.id + 2, 23.0)])
+        update = (await events.__anext__()).decode()
+        self.assertIn(f'id: {self.reading.id + 2}\n', update)
+        self.assertNotIn('22.0', update)
+        self.assertEqual(json.loads(update.split('data: ')[1])[0]['value'], 23.0)
+
+        await events.aclose()
+        self.assertEqual(live_hub.subscriber_count(), 0)
+
+    def test_resume_and_ingest_publishing(self):
+        from asgiref.sync import async_to_sync, sync_to_async
+        from .async_views import _latest_updates
+        from .ingest import reading_ingestor
+        from .live import live_hub
+
+        self.assertEqual(_latest_updates([self.variable.id], self.reading.id), [])
+        self.assertEqual(len(_latest_updates([self.variable.id], self.reading.id - 1)), 1)
+
+        def ingest():
+            with self.captureOnCommitCallbacks(execute=True):
+                reading_ingestor.ingest([self.make_reading(None, 30.0)])
+
+        async def subscribe_and_ingest():
+            subscription = live_hub.subscribe([self.variable.id])
+            try:
+                await sync_to_async(ingest)()
+                self.assertTrue(await subscription.wait(1))
+                return subscription.drain()
+            finally:
+                live_hub.unsubscribe(subscription)
+
+        updates = async_to_sync(subscribe_and_ingest)()
+        self.assertEqual([update.data['value'] for update in updates], [30.0])
+
+    def test_stream_requires_variables(self):
+        response = self.api.get(reverse('live_stream'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.api.get(reverse('live_stream'), {'variables': '9999'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+def gateway_communicator(consumer_class=None):
+    """Comunicador ASGI para el gateway WebSocket (sin servidor)"""
+    from asgiref.testing import ApplicationCommunicator
+    from .consumers import LiveGatewayConsumer
+
+    class GatewayCommunicator(ApplicationCommunicator):
+        async def connect(self):
+            await self.send_input({'type': 'websocket.connect'})
+            return (await self.receive_output(1))['type'] == 'websocket.accept'
+
+        async def send_json_to(self, data):
+            await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+        async def receive_from(self):
+            return (await self.receive_output(1))['text']
+
+        async def receive_json_from(self):
+            return json.loads(await self.receive_from())
+
+        async def disconnect(self):
+            await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await self.wait(1)
+
+    application = (consumer_class or LiveGatewayConsumer).as_asgi()
+    return GatewayCommunicator(application, {'type': 'websocket', 'path': '/ws/live/', 'headers': []})
+
+
+class LiveGatewayTestCase(DataApiTestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.variables = [self.create_variable(f'temperature_{i}') for i in range(3)]
+        self.create_reading(self.variables[0], 20.0)
+
+    def make_reading(self, pk, variable, value):
+        from django.utils import timezone
+        from .models import DataReading
+
+        reading = DataReading(id=pk, variable=variable, timestamp=timezone.now())
+        reading.set_value(value)
+        return reading
+
+    async def connect(self, consumer_class=None):
+        communicator = gateway_communicator(consumer_class)
+        self.assertTrue(await communicator.connect())
+        await communicator.send_json_to({'action': 'auth', 'token': self.token.key})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'authenticated')
+        return communicator
+
+    async def test_subscribe_requires_auth(self):
+        communicator = gateway_communicator()
+        await communicator.connect()
+        await communicator.send_json_to({'action': 'subscribe', 'variables': [self.variables[0].id]})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_snapshot_and_shared_frames(self):
+        from .live import live_hub
+
+        first, second = await self.connect(), await self.connect()
+        for communicator in (first, second):
+            await communicator.send_json_to({'action': 'subscribe', 'servers': [self.server.id]})
+            self.assertEqual((await communicator.receive_json_from())['type'], 'subscribed')
+            snapshot = await communicator.receive_json_from()
+            self.assertEqual(snapshot['data']['value'], 20.0)
+
+        live_hub.publish([self.make_reading(1000, self.variables[1], 5.5)])
+        frames = [await first.receive_from(), await second.receive_from()]
+        self.assertEqual(frames[0], frames[1])
+        self.assertEqual(json.loads(frames[0])['data']['variable_id'], self.variables[1].id)
+
+        await first.disconnect()
+        await second.disconnect()
+        self.assertEqual(live_hub.subscriber_count(), 0)
+
+    async def test_rate_limit_coalesces(self):
+        from django.test import override_settings
+        from .live import live_hub
+
+        with override_settings(LIVE_GATEWAY_MAX_MESSAGES_PER_SECOND=2):
+            communicator = await self.connect()
+            ids = [variable.id for variable in self.variables[1:]]
+            await communicator.send_json_to({'action': 'subscribe', 'variables': ids})
+            await communicator.receive_json_from()
+
+            # Dos frames caben en la cubeta; el resto se coalesce y espera
+            for pk, value in enumerate([1.0, 2.0, 3.0, 4.0]):
+                live_hub.publish([self.make_reading(1000 + pk, self.variables[1 + pk % 2], value)])
+            received = [await communicator.receive_json_from() for _ in range(2)]
+            self.assertEqual(sorted(item['data']['value'] for item in received), [3.0, 4.0])
+            self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+            await communicator.disconnect()
+
+    async def test_slow_consumer_dropped(self):
+        import asyncio
+        from django.test import override_settings
+        from .consumers import SLOW_CONSUMER_CLOSE_CODE, LiveGatewayConsumer
+        from .live import live_hub
+
+        class SlowConsumer(LiveGatewayConsumer):
+            async def send(self, text_data=None, bytes_data=None, close=False):
+                if text_data and text_data.startswith('{"type":"update"'):
+                    await asyncio.sleep(1)
+                await super().send(text_data, bytes_data, close)
+
+        with override_settings(LIVE_GATEWAY_SEND_TIMEOUT=0.05):
+            communicator = await self.connect(SlowConsumer)
+            await communicator.send_json_to({'action': 'subscribe', 'variables': [self.variables[1].id]})
+            await communicator.receive_json_from()
+            live_hub.publish([self.make_reading(1000, self.variables[1], 1.0)])
+            output = await communicator.receive_output(timeout=1)
+            self.assertEqual(output, {'type': 'websocket.close', 'code': SLOW_CONSUMER_CLOSE_CODE})
+            self.assertEqual(live_hub.subscriber_count(), 0)
+
+
+class ChangeFeedTestCase(DataApiTestCase):
+    def setUp(self):
+        from .changes import ChangeFeed
+
+        super().setUp()
+        self.variables = [self.create_variable(f'temperature_{i}') for i in range(3)]
+        self.base = self.create_reading(self.variables[0], 20.0)
+        self.feed = ChangeFeed(size=100)
+
+    def ingest(self, variable, value):
+        from django.utils import timezone
+        from .ingest import reading_ingestor
+        from .models import DataReading
+
+        reading = DataReading(variable=variable, timestamp=timezone.now())
+        reading.set_value(value)
+        reading_ingestor.ingest([reading])
+        self.feed.publish([reading])
+        return reading
+
+    def test_changes_from_ring(self):
+        self.ingest(self.variables[1], 1.0)
+        last = self.ingest(self.variables[1], 2.0)
+        self.ingest(self.variables[2], 3.0)
+
+        with self.assertNumQueries(1):
+            updates, seq, source = self.feed.changes_since(self.base.id)
+        self.assertEqual(source, 'memory')
+        self.assertEqual([update.data['value'] for update in updates], [2.0, 3.0])
+        self.assertEqual(updates[0].id, last.id)
+
+        updates, _, _ = self.feed.changes_since(self.base.id, server_id=self.server.id,
+                                                variable_ids=[self.variables[2].id])
+        self.assertEqual([update.variable_id for update in updates], [self.variables[2].id])
+        self.assertEqual(self.feed.changes_since(seq), ([], seq, 'memory'))
+
+    def test_database_fallback(self):
+        self.ingest(self.variables[1], 1.0)
+        # Lectura que no pasó por este proceso
+        outside = self.create_reading(self.variables[2], 5.0)
+
+        updates, seq, source = self.feed.changes_since(self.base.id)
+        self.assertEqual(source, 'database')
+        self.assertEqual(seq, outside.id)
+        self.assertEqual({update.data['value'] for update in updates}, {1.0, 5.0})
+
+    def test_endpoint_snapshot_and_since(self):
+        response = self.api.get(reverse('changes'))
+        data = json.loads(response.content)
+        self.assertEqual(data['seq'], self.base.id)
+        self.assertEqual([item['value'] for item in data['changes']], [20.0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingest(self.variables[1], 7.0)
+        response = self.api.get(reverse('changes'), {'since': data['seq']})
+        data = json.loads(response.content)
+        self.assertEqual([item['value'] for item in data['changes']], [7.0])
+
+    async def test_long_poll_wakes_on_publish(self):
+        import asyncio
+
+        waiter = self.feed.waiter()
+        asyncio.get_running_loop().call_later(0.05, self.feed.publish, [])
+        self.assertTrue(await self.feed.wait(waiter, 1))
+        self.assertFalse(await self.feed.wait(self.feed.waiter(), 0.05))
+
+    async def test_long_poll_ignores_unrelated_batches(self):
+        import asyncio
+        import time
+        from asgiref.sync import sync_to_async
+        from .changes import change_feed
+
+        watched, other = self.variables[1], self.variables[2]
+
+        async def publish(variable, value, delay):
+            await asyncio.sleep(delay)
+            change_feed.publish([await sync_to_async(self.create_reading)(variable, value)])
+
+        await self.async_client.aforce_login(self.user)
+        started = time.monotonic()
+        response, _, _ = await asyncio.gather(
+            self.async_client.get(reverse('changes'), {
+                'since': self.base.id, 'wait': 2, 'variables': str(watched.id)
+            }),
+            publish(other, 1.0, 0.05),
+            publish(watched, 2.0, 0.3),
+        )
+        data = json.loads(response.content)
+        self.assertEqual([item['value'] for item in data['changes']], [2.0])
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+
+class CachedTokenAuthenticationTestCase(DataApiTestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+        from rest_framework.test import APIClient
+        from .authentication import token_cache
+
+        super().setUp()
+        token_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client_api = APIClient()
+        self.client_api.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_api.get(reverse('dataserver-list'), {'fields': 'id'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len([q for q in queries.captured_queries if 'authtoken_token' in q['sql']])
+
+    def test_lookup_cached(self):
+        self.assertEqual(self.token_queries(), 1)
+        self.assertEqual(self.token_queries(), 0)
+
+    def test_logout_invalidates(self):
+        self.token_queries()
+        response = self.client_api.post(reverse('logout_user'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client_api.get(reverse('dataserver-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates(self):
+        self.token_queries()
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client_api.get(reverse('dataserver-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lru_and_ttl(self):
+        from .authentication import TokenCache
+
+        cache = TokenCache(max_size=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, self.user, key)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 2)
+
+        expired = TokenCache(max_size=2, ttl=-1)
+        expired.set('a', self.user, 'a')
+        self.assertIsNone(expired.get('a'))
+
+
+class AlarmEngineTestCase(DataApiTestCase):
+    def setUp(self):
+        from .alarms import AlarmEngine
+
+        super().setUp()
+        self.variable = self.create_variable(
+            'temperature_1', alarm_enabled=True, alarm_high_limit=80.0,
+            alarm_low_limit=10.0, alarm_deadband=2.0
+        )
+        self.engine = AlarmEngine()
+
+    def feed(self, *values, start=0, variable=None):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import DataReading
+
+        base = timezone.now()
+        readings = []
+        for offset, value in enumerate(values):
+            reading = DataReading(variable=variable or self.variable,
+                                  timestamp=base + timedelta(seconds=start + offset))
+            reading.set_value(value)
+            readings.append(reading)
+        return self.engine.process(readings)
+
+    def test_transitions_with_hysteresis(self):
+        from .models import Alarm
+
+        raised = self.feed(50.0, 81.0, 85.0, 79.0)
+        self.assertEqual([alarm.alarm_type for alarm in raised], ['HIGH'])
+
+        # Dentro de la banda de histéresis no hay escrituras
+        with self.assertNumQueries(0):
+            self.assertEqual(self.feed(78.5, 79.9), [])
+
+        self.feed(77.0)
+        alarm = Alarm.objects.get()
+        self.assertFalse(alarm.is_active)
+        self.assertIsNotNone(alarm.cleared_at)
+        self.assertEqual(alarm.data_variable, self.variable)
+
+        self.feed(5.0)
+        self.assertEqual(Alarm.objects.filter(is_active=True).get().alarm_type, 'LOW')
+
+    def test_on_and_off_delay(self):
+        from .models import Alarm
+
+        self.variable.alarm_on_delay = 3
+        self.variable.alarm_off_delay = 2
+        self.variable.save()
+
+        self.assertEqual(self.feed(90.0, 90.0, 50.0, 90.0, 90.0, 90.0), [])
+        self.assertEqual(len(self.feed(90.0, start=10)), 1)
+
+        self.feed(50.0, 50.0, start=20)
+        self.assertTrue(Alarm.objects.get().is_active)
+        self.feed(50.0, start=23)
+        self.assertFalse(Alarm.objects.get().is_active)
+
+    def test_rate_of_change(self):
+        from .models import Alarm
+
+        self.variable.alarm_rate_limit = 120.0
+        self.variable.alarm_rate_unit = 'min'
+        self.variable.save()
+
+        # 1 unidad/s en la ventana: por debajo de 2/s
+        self.assertEqual(self.feed(40.0, 41.0, 42.0), [])
+        raised = self.feed(45.0, 50.0, start=3)
+        self.assertEqual([alarm.alarm_type for alarm in raised], ['RATE'])
+        self.assertEqual(self.engine.active_state(self.variable.id, 'RATE'), 'RATE')
+        self.assertIsNone(self.engine.active_state(self.variable.id))
+
+        # Valor estable: la tasa sobre la ventana vuelve a bajar
+        self.feed(*[50.0] * 12, start=5)
+        self.assertFalse(Alarm.objects.get(alarm_type='RATE').is_active)
+
+    def test_deviation_from_setpoint(self):
+        from .models import Alarm
+
+        self.variable.alarm_setpoint = 50.0
+        self.variable.alarm_deviation_limit = 5.0
+        self.variable.save()
+
+        self.assertEqual([alarm.alarm_type for alarm in self.feed(52.0, 56.0)], ['DEVIATION'])
+        self.feed(46.0, 54.5)
+        self.assertTrue(Alarm.objects.get(alarm_type='DEVIATION').is_active)
+        self.feed(53.0)
+        self.assertFalse(Alarm.objects.get(alarm_type='DEVIATION').is_active)
+
+    def test_restores_active_state(self):
+        from .alarms import AlarmEngine
+        from .models import Alarm
+
+        self.feed(90.0)
+        self.engine = AlarmEngine()
+        self.assertEqual(self.feed(91.0), [])
+        self.feed(50.0)
+        self.assertEqual(Alarm.objects.filter(is_active=True).count(), 0)
+
+    def test_ingest_path(self):
+        from .alarms import alarm_engine
+        from .ingest import reading_ingestor
+        from .models import Alarm, DataReading
+
+        alarm_engine.reset()
+        reading = DataReading(variable=self.variable, timestamp=self.variable.created_at)
+        reading.set_value(95.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            reading_ingestor.ingest([reading])
+        self.assertEqual(Alarm.objects.filter(data_variable=self.variable, is_active=True).count(), 1)
+        alarm_engine.reset()
+
+
+@override_settings(ALARM_FLOOD_THRESHOLD=3, ALARM_FLOOD_WINDOW=10, ALARM_CHATTER_WINDOW=60)
+class AlarmStormTestCase(DataApiTestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .alarms import AlarmEngine
+
+        super().setUp()
+        self.variables = [
+            self.create_variable(f'pressure_{i}', alarm_enabled=True, alarm_high_limit=80.0)
+            for i in range(6)
+        ]
+        self.engine = AlarmEngine()
+        self.base = timezone.now()
+        self.step = lambda second: self.base + timedelta(seconds=second)
+
+    def batch(self, values, second=0):
+        from .models import DataReading
+
+        readings = []
+        for variable, value in zip(self.variables, values):
+            reading = DataReading(variable=variable, timestamp=self.step(second))
+            reading.set_value(value)
+            readings.append(reading)
+        return self.engine.process(readings)
+
+    def test_flood_is_aggregated_per_server(self):
+        from .models import Alarm
+
+        self.batch([90.0] * 6)
+        individual = Alarm.objects.filter(alarm_type='HIGH')
+        self.assertEqual(individual.count(), 3)
+        flood = Alarm.objects.get(alarm_type='FLOOD')
+        self.assertEqual((flood.data_server, flood.occurrence_count), (self.server, 3))
+        self.assertEqual(self.engine.flooded_servers(), [self.server.id])
+
+        # Pasada la ventana la avalancha se cierra y se registran las suprimidas activas
+        self.batch([90.0] * 5 + [50.0], second=30)
+        flood.refresh_from_db()
+        self.assertFalse(flood.is_active)
+        self.assertEqual(self.engine.flooded_servers(), [])
+        self.assertEqual(Alarm.objects.filter(alarm_type='HIGH', is_active=True).count(), 5)
+
+    def test_chattering_reuses_record(self):
+        from .models import Alarm
+
+        for second in range(5):
+            self.engine.process([self.reading(90.0, second * 4), self.reading(50.0, second * 4 + 2)])
+        alarm = Alarm.objects.get()
+        self.assertEqual(alarm.occurrence_count, 5)
+        self.assertFalse(alarm.is_active)
+        self.assertIsNotNone(alarm.last_occurrence)
+
+    def test_reactivations_keep_their_own_last_occurrence(self):
+        from .models import Alarm, DataReading
+
+        def reading(variable, value, second):
+            reading = DataReading(variable=variable, timestamp=self.step(second))
+            reading.set_value(value)
+            return reading
+
+        first, second = self.variables[:2]
+        self.engine.process([reading(first, 90.0, 0), reading(second, 90.0, 0)])
+        self.engine.process([reading(first, 50.0, 1), reading(second, 50.0, 1)])
+        self.engine.process([reading(first, 90.0, 10), reading(second, 90.0, 20)])
+
+        occurrences = dict(Alarm.objects.values_list('data_variable_id', 'last_occurrence'))
+        self.assertEqual(occurrences, {first.id: self.step(10), second.id: self.step(20)})
+        self.assertEqual(Alarm.objects.filter(is_active=True, occurrence_count=2).count(), 2)
+
+    def reading(self, value, second):
+        from .models import DataReading
+
+        reading = DataReading(variable=self.variables[0], timestamp=self.step(second))
+        reading.set_value(value)
+        return reading
+
+    def test_shelving(self):
+        from .models import Alarm
+
+        variable = self.variables[0]
+        response = self.api.post(reverse('datavariable-shelve', args=[variable.id]), {'minutes': 0})
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(reverse('datavariable-shelve', args=[variable.id]), {'minutes': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.engine.process([self.reading(95.0, 0)]), [])
+        self.assertFalse(Alarm.objects.exists())
+
+        # Al quitar el archivado (sin reevaluación) la siguiente lectura registra la alarma que sigue activa
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.api.post(reverse('datavariable-unshelve', args=[variable.id]))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(self.engine.process([self.reading(95.0, 1)])), 1)
+        self.assertTrue(Alarm.objects.get(data_variable=variable).is_active)
+
+
+class ActiveAlarmConsoleTestCase(DataApiTestCase):
+    def setUp(self):
+        from .active_alarms import active_alarms
+        from .alarms import AlarmEngine
+        from .models import DataServer
+
+        super().setUp()
+        active_alarms.invalidate()
+        self.other_server = DataServer.objects.create(
+            name='Planta 2', server_type='OPC_UA',
+            endpoint_url='opc.tcp://localhost:4840', created_by=self.user
+        )
+        self.hot = self.create_variable('temperature_1', alarm_enabled=True, alarm_high_limit=80.0)
+        self.remote = self.create_variable('level_1', server=self.other_server,
+                                           alarm_enabled=True, alarm_high_limit=80.0)
+        self.engine = AlarmEngine()
+
+    def tearDown(self):
+        from .active_alarms import active_alarms
+
+        active_alarms.invalidate()
+
+    def raise_alarm(self, variable, value=95.0):
+        from django.utils import timezone
+        from .models import DataReading
+
+        reading = DataReading(variable=variable, timestamp=timezone.now())
+        reading.set_value(value)
+        return self.engine.process([reading])
+
+    def test_console_filters_and_counts(self):
+        from .models import Alarm
+
+        self.raise_alarm(self.hot)
+        Alarm.objects.create(data_variable=self.remote, alarm_type='HIGH', severity='CRITICAL', message='x')
+        Alarm.objects.create(data_variable=self.remote, alarm_type='LOW', message='x', is_active=False)
+
+        response = self.api.get(reverse('active_alarms'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['alarms'][0]['severity'], 'CRITICAL')
+        self.assertEqual(response.data['counts_by_severity']['MEDIUM'], 1)
+
+        # Consultas siguientes y nuevas activaciones del motor: sin leer la base de datos
+        self.raise_alarm(self.create_variable('temperature_2', alarm_enabled=True, alarm_high_limit=80.0))
+        with self.assertNumQueries(0):
+            response = self.api.get(reverse('active_alarms'), {'server': self.server.id, 'severity': 'medium'})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['counts_by_severity']['CRITICAL'], 0)
+
+        self.assertEqual(self.api.get(reverse('active_alarms'), {'severity': 'BAD'}).status_code, 400)
+
+    def test_bulk_acknowledge(self):
+        self.raise_alarm(self.hot)
+        self.raise_alarm(self.remote)
+        self.api.get(reverse('active_alarms'))
+
+        with self.assertNumQueries(1):
+            response = self.api.post(reverse('acknowledge_alarms'), {'all': True, 'server': self.server.id}, format='json')
+        self.assertEqual(response.data['acknowledged'], 1)
+
+        response = self.api.get(reverse('active_alarms'), {'acknowledged': 'false'})
+        self.assertEqual([alarm['data_variable'] for alarm in response.data['alarms']], [self.remote.id])
+        self.assertEqual(self.api.post(reverse('acknowledge_alarms'), {}, format='json').status_code, 400)
+
+
+class FailingEmailBackend:
+    """Backend de email que simula un servidor SMTP caído"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def open(self):
+        raise ConnectionRefusedError('SMTP no disponible')
+
+    def close(self):
+        pass
+
+
+class AlarmNotificationTestCase(DataApiTestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from .models import UserProfile
+        from .notifications import AlarmNotifier
+
+        super().setUp()
+        self.user.email = 'operador@planta.local'
+        self.user.save()
+        UserProfile.objects.create(user=self.user, email_notifications=True)
+        quiet = User.objects.create_user(username='supervisor', email='supervisor@planta.local')
+        UserProfile.objects.create(user=quiet, email_notifications=False)
+        self.notifier = AlarmNotifier(window=60, max_retries=1, background=False)
+
+    def alarms(self, *messages):
+        from .models import Alarm
+
+        return [Alarm(alarm_type='HIGH', severity='HIGH', message=message) for message in messages]
+
+    def test_digest_per_recipient(self):
+        from django.core import mail
+
+        self.notifier.submit(self.alarms('T1 alta'))
+        self.notifier.submit(self.alarms('T2 alta', 'T3 alta'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(self.notifier.flush(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['operador@planta.local'])
+        self.assertEqual(mail.outbox[0].subject, '[OPCPR] 3 alarmas nuevas')
+        self.assertEqual(self.notifier.flush(), 0)
+
+    def test_retry_queue(self):
+        import time
+        from django.core import mail
+
+        self.notifier.submit(self.alarms('T1 alta'))
+        with override_settings(EMAIL_BACKEND='main_app.tests.FailingEmailBackend'):
+            self.assertEqual(self.notifier.flush(), 0)
+        self.assertEqual(self.notifier.pending_retries(), 1)
+
+        # El reintento espera a su vencimiento
+        self.assertEqual(self.notifier.flush(), 0)
+        self.assertEqual(self.notifier.flush(now=time.monotonic() + 120), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_recipients_follow_preferences(self):
+        profile = self.user.userprofile
+        self.assertEqual(self.notifier.recipients(), ['operador@planta.local'])
+        profile.email_notifications = False
+        profile.save()
+        self.notifier.invalidate_recipients()
+        self.assertEqual(self.notifier.recipients(), [])
+
+
+class AuditLogTestCase(DataApiTestCase):
+    def setUp(self):
+        from unittest import mock
+        from .audit import AuditWriter
+
+        super().setUp()
+        self.writer = AuditWriter(max_size=100, batch_size=50)
+        patcher = mock.patch('main_app.audit.audit_writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_requests_are_buffered(self):
+        from .models import AuditLog
+
+        variable = self.create_variable('tag_1')
+        self.api.get(reverse('datavariable-list'))
+        response = self.api.patch(reverse('datavariable-detail', args=[variable.id]), {
+            'description': 'Caudal de entrada'
+        }, format='json', HTTP_USER_AGENT='pruebas')
+        self.assertEqual(response.status_code, 200)
+
+        # Nada se escribe en la ruta de la petición
+        self.assertEqual(AuditLog.objects.count(), 0)
+        self.assertEqual(len(self.writer), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.writer.flush(), 1)
+
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.action, entry.model, entry.object_id), ('update', 'datavariable', str(variable.id)))
+        self.assertEqual((entry.user, entry.ip_address, entry.user_agent), (self.user, '127.0.0.1', 'pruebas'))
+        self.assertEqual(entry.changes, {'description': 'Caudal de entrada'})
+
+    def test_login_events_without_credentials(self):
+        from rest_framework.test import APIClient
+        from .models import AuditLog
+
+        client = APIClient()
+        client.post(reverse('login_user'), {'username': 'operador', 'password': 'secreto123'}, format='json')
+        client.post(reverse('login_user'), {'username': 'operador', 'password': 'otra'}, format='json')
+        self.writer.flush()
+
+        entries = list(AuditLog.objects.order_by('id').values_list('action', 'user', 'changes'))
+        self.assertEqual(entries, [
+            ('login', self.user.id, None),
+            ('login_failed', None, {'username': 'operador'}),
+        ])
+
+    def test_client_ip_requires_trusted_proxy(self):
+        from django.test import RequestFactory
+        from .audit import client_ip
+
+        factory = RequestFactory()
+        forged = factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.9')
+        self.assertEqual(client_ip(forged), '127.0.0.1')
+        with override_settings(AUDIT_TRUSTED_PROXIES=['127.0.0.1', '10.0.0.2']):
+            self.assertEqual(client_ip(forged), '203.0.113.9')
+            chained = factory.get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.9, 10.0.0.2')
+            self.assertEqual(client_ip(chained), '203.0.113.9')
+            self.assertIsNone(client_ip(factory.get('/', HTTP_X_FORWARDED_FOR='no-es-una-ip')))
+        self.assertIsNone(client_ip(factory.get('/', REMOTE_ADDR='desconocido')))
+
+    def test_failed_batch_is_retried_per_row(self):
+        from unittest import mock
+        from .models import AuditLog
+
+        for action in ('a', 'b', 'c'):
+            self.writer.record(AuditLog(action=action, model='x'))
+        self.writer.record(AuditLog(action='d', model='x', ip_address='no-es-una-ip'))
+        original_save = AuditLog.save
+
+        def save(entry, *args, **kwargs):
+            if entry.ip_address == 'no-es-una-ip':
+                raise ValueError('IP inválida')
+            return original_save(entry, *args, **kwargs)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=ValueError('IP inválida')), \
+                mock.patch.object(AuditLog, 'save', save):
+            self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(list(AuditLog.objects.order_by('id').values_list('action', flat=True)), ['a', 'b', 'c'])
+
+    def test_buffer_is_bounded(self):
+        from .audit import AuditWriter
+        from .models import AuditLog
+
+        writer = AuditWriter(max_size=2)
+        for action in ('a', 'b', 'c'):
+            writer.record(AuditLog(action=action, model='x'))
+        self.assertEqual((len(writer), writer.dropped), (2, 1))
+        writer.flush()
+        self.assertEqual(list(AuditLog.objects.order_by('id').values_list('action', flat=True)), ['b', 'c'])
+
+
+class AlarmReevaluationTestCase(DataApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variables = [
+            self.create_variable(f'temperature_{i}', alarm_enabled=True, alarm_high_limit=80.0,
+                                 alarm_low_limit=10.0, alarm_deadband=2.0)
+            for i in range(4)
+        ]
+
+    def test_compute_conditions(self):
+        import numpy as np
+        from .alarms import compute_conditions
+
+        values = np.array([90.0, 79.0, 79.0, 5.0, np.nan, 50.0])
+        high = np.array([80.0, 80.0, 80.0, 80.0, 80.0, np.nan])
+        low = np.array([10.0, 10.0, 10.0, 10.0, 10.0, np.nan])
+        deadband = np.full(6, 2.0)
+        active = np.array([0, 1, 0, 0, 2, 1])
+        self.assertEqual(
+            compute_conditions(values, high, low, deadband, active).tolist(), [1, 1, 0, 2, 2, 0]
+        )
+
+    def test_reevaluate_diffs_against_active_alarms(self):
+        from .alarms import reevaluate_alarms
+        from .models import Alarm
+
+        hot, normal, cold, disabled = self.variables
+        for variable, value in ((hot, 90.0), (normal, 50.0), (cold, 5.0), (disabled, 95.0)):
+            self.create_reading(variable, value)
+        # Alarma activa que ya no corresponde y otra de una variable deshabilitada
+        Alarm.objects.create(data_variable=normal, alarm_type='HIGH', message='x')
+        Alarm.objects.create(data_variable=disabled, alarm_type='HIGH', message='x')
+        DataVariableModel = type(disabled)
+        DataVariableModel.objects.filter(id=disabled.id).update(alarm_enabled=False)
+
+        # variables, últimos valores, alarmas activas y (SAVEPOINT, UPDATE, INSERT, RELEASE)
+        with self.assertNumQueries(7):
+            result = reevaluate_alarms()
+        self.assertEqual((result['evaluated'], result['raised'], result['cleared']), (3, 2, 2))
+        active = dict(Alarm.objects.filter(is_active=True).values_list('data_variable_id', 'alarm_type'))
+        self.assertEqual(active, {hot.id: 'HIGH', cold.id: 'LOW'})
+
+        # Segunda pasada: sin cambios
+        self.assertEqual(reevaluate_alarms()['raised'], 0)
+
+    def test_unrelated_edit_keeps_engine_state(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .alarms import alarm_engine
+        from .models import DataReading
+
+        a, b = self.variables[:2]
+        b.alarm_rate_limit = 5.0
+        b.alarm_on_delay = 10
+        b.save()
+        alarm_engine.reset()
+        base = timezone.now()
+        readings = []
+        for second, value in ((0, 50.0), (1, 52.0), (2, 90.0)):
+            reading = DataReading(variable=b, timestamp=base + timedelta(seconds=second))
+            reading.set_value(value)
+            readings.append(reading)
+        alarm_engine.process(readings)
+        window = alarm_engine._windows[b.id]
+        pending = alarm_engine._states[(b.id, 'LIMIT')].pending_since
+        self.assertIsNotNone(pending)
+
+        # Editar la descripción de A no reevalúa; cambiar su límite solo toca a A
+        a.description = 'Sonda del reactor'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            a.save()
+        self.assertEqual(callbacks, [])
+        self.create_reading(a, 70.0)
+        a.alarm_high_limit = 60.0
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            a.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(alarm_engine.active_state(a.id), 'HIGH')
+        self.assertIs(alarm_engine._windows[b.id], window)
+        self.assertEqual(len(window.samples), 3)
+        self.assertEqual(alarm_engine._states[(b.id, 'LIMIT')].pending_since, pending)
+        alarm_engine.reset()
+
+    def test_queries_run_without_engine_lock(self):
+        import threading
+        from unittest import mock
+        from .alarms import alarm_engine, reevaluate_alarms
+        from .models import Alarm
+
+        observed = []
+
+        def probe():
+            acquired = alarm_engine._lock.acquire(blocking=False)
+            observed.append(acquired)
+            if acquired:
+                alarm_engine._lock.release()
+
+        bulk_create = Alarm.objects.bulk_create
+
+        def probing_bulk_create(*args, **kwargs):
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+            return bulk_create(*args, **kwargs)
+
+        self.create_reading(self.variables[0], 95.0)
+        with mock.patch.object(Alarm.objects, 'bulk_create', side_effect=probing_bulk_create):
+            self.assertEqual(reevaluate_alarms()['raised'], 1)
+        # La ingesta (process) puede tomar el bloqueo mientras se escribe
+        self.assertEqual(observed, [True])
+
+    def test_limit_edit_triggers_reevaluation(self):
+        from .models import Alarm
+
+        variable = self.variables[0]
+        self.create_reading(variable, 70.0)
+        variable.alarm_high_limit = 60.0
+        with self.captureOnCommitCallbacks(execute=True):
+            variable.save()
+        self.assertEqual(Alarm.objects.get(is_active=True).data_variable, variable)
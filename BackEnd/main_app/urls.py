@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from . import data_views
+from . import async_views
 
 # Router para API REST
 router = DefaultRouter()
@@ -16,15 +17,28 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
     
+    # Operaciones con dispositivos (vistas async, antes del router)
+    path('api/data-servers/<int:pk>/connect/', async_views.connect, name='dataserver-connect'),
+    path('api/data-servers/<int:pk>/disconnect/', async_views.disconnect, name='dataserver-disconnect'),
+    path('api/data-variables/read_many/', async_views.read_many, name='datavariable-read-many'),
+    path('api/data-variables/write_many/', async_views.write_many, name='datavariable-write-many'),
+    path('api/data-variables/<int:pk>/read_value/', async_views.read_value, name='datavariable-read-value'),
+    path('api/data-variables/<int:pk>/write_value/', async_views.write_value, name='datavariable-write-value'),
+    
     # API URLs principales
     path('api/', include(router.urls)),
     path('api/health/', views.health_check, name='health_check'),
+    path('metrics', views.metrics, name='metrics'),
     path('api/supervisorio/', views.supervisorio_opcua, name='supervisorio_opcua'),
     
     # URLs del sistema multi-protocolo
     path('api/protocols/supported/', data_views.supported_protocols, name='supported_protocols'),
-    path('api/protocols/test-connection/', data_views.test_connection, name='test_connection'),
+    path('api/protocols/test-connection/', async_views.test_connection, name='test_connection'),
     path('api/dashboard/summary/', data_views.dashboard_summary, name='dashboard_summary'),
+    path('api/live/stream/', async_views.live_stream, name='live_stream'),
+    path('api/changes/', async_views.changes, name='changes'),
+    path('api/alarms/active/', data_views.active_alarms_console, name='active_alarms'),
+    path('api/alarms/acknowledge/', data_views.acknowledge_alarms, name='acknowledge_alarms'),
     
     # URLs de autenticación
     path('api/auth/register/', views.register_user, name='register_user'),
@@ -1,5 +1,7 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -8,7 +10,10 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.hashers import make_password
+import hmac
 import json
+from .audit import audit_event
+from .metrics import CONTENT_TYPE, registry
 from .opcua_client import SIGNALS, LeerOpcUa, EscribirOpcUa, OpcUaServer, simular_datos_opcua
 
 # Vista principal
@@ -40,6 +45,18 @@ def health_check(request):
     }
     return Response(data, status=status.HTTP_200_OK)
 
+# Métricas en formato Prometheus (texto plano, fuera de DRF)
+@require_GET
+def metrics(request):
+    """
+    Exposición de métricas para Prometheus; con METRICS_TOKEN exige
+    'Authorization: Bearer <token>'
+    """
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Token de métricas inválido\n', status=401, content_type='text/plain')
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
 # API para obtener información del servidor
 @api_view(['GET'])
 def server_info(request):
@@ -171,6 +188,7 @@ def register_user(request):
             last_name=data['last_name'],
             password=make_password(data['password'])  # Hasher la contraseña
         )
+        audit_event(request, 'register', 'user', object_id=user.id, object_repr=user.username, user=user)
         
         return Response({
             "status": "success",
@@ -220,6 +238,7 @@ def login_user(request):
         if user is not None:
             # Crear o obtener token
             token, created = Token.objects.get_or_create(user=user)
+            audit_event(request, 'login', 'user', object_id=user.id, object_repr=user.username, user=user)
             
             return Response({
                 "status": "success",
@@ -234,6 +253,7 @@ def login_user(request):
                 }
             }, status=status.HTTP_200_OK)
         else:
+            audit_event(request, 'login_failed', 'user', changes={'username': username})
             return Response({
                 "status": "error",
                 "message": "Credenciales incorrectas"
@@ -259,6 +279,7 @@ def logout_user(request):
     try:
         token = request.auth
         if token:
+            audit_event(request, 'logout', 'user', object_id=request.user.id, object_repr=request.user.username)
             token.delete()
             return Response({
                 "status": "success",
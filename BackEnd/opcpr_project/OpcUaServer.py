@@ -1,17 +1,36 @@
 # backend/app/opcua_server.py
+import time
 from opcua import Server
 from datetime import datetime
-def iniciar_servidor_opcua(url, node_id):
-    try:
-        server = Server()
-        server.set_endpoint(url)
-        uri = "http://example.org"
-        server.register_namespace(uri)
 
-        # Crear un nodo
-        objeto = server.nodes.objects.add_object(uri, "MyObject")
-        variable = objeto.add_variable(uri, "MyVariable", 0.0)
+
+def crear_servidor_opcua(url, tags=1, uri="http://example.org"):
+    """
+    Crear (sin iniciar) un servidor OPC UA con el objeto MyObject y `tags`
+    variables escribibles; devuelve (servidor, variables, índice del namespace).
+    Con varias variables sus NodeId son ns=<idx>;s=tag_<n>.
+    """
+    server = Server()
+    server.set_endpoint(url)
+    idx = server.register_namespace(uri)
+
+    # Crear los nodos
+    objeto = server.nodes.objects.add_object(idx, "MyObject")
+    if tags == 1:
+        variables = [objeto.add_variable(idx, "MyVariable", 0.0)]
+    else:
+        variables = [
+            objeto.add_variable(f"ns={idx};s=tag_{i}", f"tag_{i}", 0.0) for i in range(tags)
+        ]
+    for variable in variables:
         variable.set_writable()  # Hacer la variable escribible
+    return server, variables, idx
+
+
+def iniciar_servidor_opcua(url, node_id):
+    try:
+        server, variables, _ = crear_servidor_opcua(url)
+        variable = variables[0]
 
         # Iniciar el servidor
         server.start()
@@ -26,4 +45,4 @@ def iniciar_servidor_opcua(url, node_id):
             server.stop()
             print("Servidor OPC UA detenido")
     except Exception as e:
-        print(f"Error: {str(e)}")
\ No newline at end of file
+        print(f"Error: {str(e)}")
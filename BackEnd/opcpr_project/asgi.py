@@ -13,4 +13,25 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'opcpr_project.settings')
 
-application = get_asgi_application()
+# Inicializar Django antes de importar consumidores y modelos
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from main_app.audit import audit_writer  # noqa: E402
+from main_app.routing import websocket_urlpatterns  # noqa: E402
+from main_app.telemetry import telemetry_rollup  # noqa: E402
+
+# Escritor de auditoría y volcado de telemetría en segundo plano
+audit_writer.start()
+telemetry_rollup.start()
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Gateway WebSocket para dashboards (ws/live/)
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    ),
+})
@@ -46,12 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main_app.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main_app.audit.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,6 +77,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'opcpr_project.wsgi.application'
+ASGI_APPLICATION = 'opcpr_project.asgi.application'
 
 
 # Database
@@ -135,7 +138,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'main_app.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -145,6 +148,81 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Caché de autenticación por token (entradas y segundos de validez)
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=60, cast=int)
+
+# Renderer y parser JSON rápidos basados en orjson (opcional)
+API_FAST_JSON = config('API_FAST_JSON', default=False, cast=bool)
+if API_FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'main_app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'main_app.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
+# Caché del resumen del dashboard (segundos)
+DASHBOARD_SUMMARY_CACHE_TTL = config('DASHBOARD_SUMMARY_CACHE_TTL', default=5, cast=int)
+
+# Flujo SSE de valores en vivo
+LIVE_STREAM_COALESCE_MS = config('LIVE_STREAM_COALESCE_MS', default=250, cast=int)
+LIVE_STREAM_HEARTBEAT_SECONDS = config('LIVE_STREAM_HEARTBEAT_SECONDS', default=15, cast=int)
+LIVE_STREAM_RETRY_MS = config('LIVE_STREAM_RETRY_MS', default=3000, cast=int)
+
+# Gateway WebSocket de dashboards (ws/live/): límite por cliente y tiempo
+# máximo de envío antes de desconectar a un cliente lento
+LIVE_GATEWAY_MAX_MESSAGES_PER_SECOND = config('LIVE_GATEWAY_MAX_MESSAGES_PER_SECOND', default=50, cast=int)
+LIVE_GATEWAY_SEND_TIMEOUT = config('LIVE_GATEWAY_SEND_TIMEOUT', default=5, cast=float)
+
+# Feed de cambios (api/changes/): tamaño del anillo en memoria y espera
+# máxima del long-poll (segundos)
+CHANGE_FEED_RING_SIZE = config('CHANGE_FEED_RING_SIZE', default=10000, cast=int)
+CHANGE_FEED_MAX_WAIT = config('CHANGE_FEED_MAX_WAIT', default=30, cast=int)
+
+# Contención de tormentas de alarmas: avalancha por servidor (activaciones
+# en la ventana), ventana de intermitencia y archivado máximo (minutos)
+ALARM_FLOOD_THRESHOLD = config('ALARM_FLOOD_THRESHOLD', default=50, cast=int)
+ALARM_FLOOD_WINDOW = config('ALARM_FLOOD_WINDOW', default=10, cast=float)
+ALARM_CHATTER_WINDOW = config('ALARM_CHATTER_WINDOW', default=60, cast=float)
+ALARM_SHELVE_MAX_MINUTES = config('ALARM_SHELVE_MAX_MINUTES', default=480, cast=int)
+
+# Notificaciones de alarmas por email: ventana de agrupación (segundos),
+# conexiones SMTP simultáneas, reintentos y tamaño de la cola
+ALARM_NOTIFY_WINDOW = config('ALARM_NOTIFY_WINDOW', default=60, cast=float)
+ALARM_NOTIFY_POOL_SIZE = config('ALARM_NOTIFY_POOL_SIZE', default=2, cast=int)
+ALARM_NOTIFY_MAX_RETRIES = config('ALARM_NOTIFY_MAX_RETRIES', default=5, cast=int)
+ALARM_NOTIFY_QUEUE_SIZE = config('ALARM_NOTIFY_QUEUE_SIZE', default=10000, cast=int)
+
+# Auditoría diferida: eventos en memoria como máximo, inserción en bloque,
+# intervalo de escritura (segundos) y tamaño máximo del cuerpo guardado
+AUDIT_LOG_QUEUE_SIZE = config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int)
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', default=200, cast=int)
+AUDIT_LOG_FLUSH_INTERVAL = config('AUDIT_LOG_FLUSH_INTERVAL', default=2, cast=float)
+AUDIT_LOG_MAX_BODY = config('AUDIT_LOG_MAX_BODY', default=4096, cast=int)
+# Proxies inversos de confianza: solo tras ellos se usa X-Forwarded-For como IP del cliente
+AUDIT_TRUSTED_PROXIES = config('AUDIT_TRUSTED_PROXIES', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+
+# Telemetría de conexiones: intervalo (segundos) del volcado de percentiles de
+# latencia a ConnectionLog (0 = desactivado)
+TELEMETRY_ROLLUP_INTERVAL = config('TELEMETRY_ROLLUP_INTERVAL', default=300, cast=float)
+
+# Métricas Prometheus (/metrics): token Bearer opcional para el scraper
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Email (SMTP)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=10, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='opcpr@localhost')
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
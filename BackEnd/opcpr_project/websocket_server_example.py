@@ -1,32 +1,168 @@
 # websocket_server_example.py
 """
 Servidor WebSocket de ejemplo para probar el sistema multi-protocolo
-Este servidor simula un sistema industrial enviando datos de variables
+Este servidor simula un sistema industrial enviando datos de variables.
+Con tag_groups (o --tags) genera miles de variables float desde plantillas
+y las actualiza con caminatas aleatorias vectorizadas en NumPy, cada grupo a
+su propia frecuencia, para pruebas de carga.
 """
 
+import argparse
 import asyncio
 import json
 import logging
 import random
 import time
+from collections.abc import Mapping, MutableMapping
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, List, Optional, Set
+import numpy as np
 import websockets
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Plantilla por defecto de los grupos de tags (modo de muchos tags)
+TAG_TEMPLATE = {
+    'prefix': 'tag',
+    'count': 1000,
+    'value': 50.0,
+    'min': 0.0,
+    'max': 100.0,
+    'variation': 1.0,
+    'unit': '',
+    'rate': None,  # actualizaciones por segundo (None = cada ciclo)
+}
+
+
+class TagArray:
+    """
+    Variables float generadas desde plantillas: valores, límites y variación
+    en arrays NumPy; cada grupo es un tramo contiguo que se actualiza cada
+    `every` ciclos
+    """
+
+    def __init__(self, groups: List[Dict], update_interval: float, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
+        self.names: List[str] = []
+        self.groups = []
+        values, low, high, variation = [], [], [], []
+        for group in groups:
+            group = {**TAG_TEMPLATE, **group}
+            start, count = len(self.names), int(group['count'])
+            self.names.extend(f"{group['prefix']}_{i}" for i in range(count))
+            values.append(np.full(count, group['value'], dtype=np.float64))
+            low.append(np.full(count, group['min'], dtype=np.float64))
+            high.append(np.full(count, group['max'], dtype=np.float64))
+            variation.append(np.full(count, group['variation'], dtype=np.float64))
+            rate = group['rate']
+            if rate is not None and rate <= 0:
+                raise ValueError(f"rate del grupo '{group['prefix']}' debe ser positivo")
+            every = max(1, round(1 / (rate * update_interval))) if rate else 1
+            self.groups.append({'start': start, 'stop': start + count, 'every': every, 'unit': group['unit']})
+
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.values = np.concatenate(values) if values else np.empty(0)
+        self.low = np.concatenate(low) if low else np.empty(0)
+        self.high = np.concatenate(high) if high else np.empty(0)
+        self.variation = np.concatenate(variation) if variation else np.empty(0)
+        self.due = []
+
+    def update(self, tick: int):
+        """Caminata aleatoria de los grupos a los que les toca en este ciclo"""
+        self.due = [group for group in self.groups if tick % group['every'] == 0]
+        for group in self.due:
+            span = slice(group['start'], group['stop'])
+            values = self.values[span]
+            values += self.rng.uniform(-1.0, 1.0, values.size) * self.variation[span]
+            np.clip(values, self.low[span], self.high[span], out=values)
+            np.round(values, 2, out=values)
+
+    def updated(self, index: int) -> bool:
+        return any(group['start'] <= index < group['stop'] for group in self.due)
+
+    def group_of(self, index: int) -> Dict:
+        for group in self.groups:
+            if group['start'] <= index < group['stop']:
+                return group
+
+
+class TagView(MutableMapping):
+    """Configuración de un tag de TagArray con la interfaz de los diccionarios de variables"""
+
+    def __init__(self, tags: TagArray, index: int):
+        self.tags = tags
+        self.i = index
+
+    def __getitem__(self, key):
+        tags, i = self.tags, self.i
+        if key == 'value':
+            return float(tags.values[i])
+        if key == 'type':
+            return 'float'
+        if key == 'unit':
+            return tags.group_of(i)['unit']
+        if key in ('min', 'max', 'variation'):
+            return float({'min': tags.low, 'max': tags.high, 'variation': tags.variation}[key][i])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != 'value':
+            raise KeyError(key)
+        self.tags.values[self.i] = value
+
+    def __delitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(('value', 'min', 'max', 'variation', 'unit', 'type'))
+
+    def __len__(self):
+        return 6
+
+
+class TagVariables(Mapping):
+    """Vista {nombre: TagView} de un TagArray (sin un dict por variable)"""
+
+    def __init__(self, tags: TagArray):
+        self.tags = tags
+
+    def __getitem__(self, name):
+        return TagView(self.tags, self.tags.index[name])
+
+    def __contains__(self, name):
+        return name in self.tags.index
+
+    def __iter__(self):
+        return iter(self.tags.names)
+
+    def __len__(self):
+        return len(self.tags.names)
+
+
 class IndustrialWebSocketServer:
     """Servidor WebSocket que simula un sistema industrial"""
     
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host='localhost', port=8765, update_interval=2.0, tag_groups=None, seed=None):
         self.host = host
         self.port = port
         self.clients: Set[websockets.WebSocketServerProtocol] = set()
         self.subscriptions: Dict[str, Set[websockets.WebSocketServerProtocol]] = {}
-        self.variables = self._init_variables()
         self.running = False
+        self.tags = None
+        self._tick = 0
+        
+        if tag_groups:
+            # Modo de muchos tags: el ciclo es el del grupo más rápido
+            rates = [group['rate'] for group in tag_groups if group.get('rate') is not None]
+            if rates and max(rates) > 0:
+                update_interval = min(update_interval, 1 / max(rates))
+            self.tags = TagArray(tag_groups, update_interval, seed)
+            self.variables = TagVariables(self.tags)
+        else:
+            self.variables = self._init_variables()
+        self.update_interval = update_interval
         
     def _init_variables(self):
         """Inicializar variables simuladas"""
@@ -72,6 +208,11 @@ class IndustrialWebSocketServer:
     
     def _update_variables(self):
         """Actualizar valores de variables simuladas"""
+        if self.tags is not None:
+            self.tags.update(self._tick)
+            self._tick += 1
+            return
+        
         for var_name, var_config in self.variables.items():
             if var_config['type'] == 'float':
                 current = var_config['value']
@@ -308,14 +449,17 @@ class IndustrialWebSocketServer:
         while self.running:
             self._update_variables()
             
-            # Notificar cambios a suscriptores
-            for address, config in self.variables.items():
-                if address in self.subscriptions and self.subscriptions[address]:
-                    await self.notify_subscribers(address, config['value'])
+            # Notificar cambios a suscriptores (solo tags actualizados en este ciclo)
+            for address, subscribers in list(self.subscriptions.items()):
+                if not subscribers:
+                    continue
+                if self.tags is not None and not self.tags.updated(self.tags.index[address]):
+                    continue
+                await self.notify_subscribers(address, self.variables[address]['value'])
             
-            await asyncio.sleep(2)  # Actualizar cada 2 segundos
+            await asyncio.sleep(self.update_interval)  # Cada 2 segundos por defecto
     
-    async def handle_client(self, websocket, path):
+    async def handle_client(self, websocket, path=None):
         """Manejar conexión de cliente"""
         await self.register_client(websocket)
         try:
@@ -348,8 +492,21 @@ class IndustrialWebSocketServer:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulador industrial WebSocket')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tags', type=int, default=0,
+                        help='Modo de muchos tags: variables tag_0..tag_N-1 (0 = variables de ejemplo)')
+    parser.add_argument('--rate', type=float, default=0.5, help='Actualizaciones por segundo')
+    args = parser.parse_args()
+    if args.rate <= 0 or args.tags < 0:
+        parser.error('--rate debe ser positivo y --tags no puede ser negativo')
+    
     # Crear y ejecutar servidor
-    server = IndustrialWebSocketServer(host='localhost', port=8765)
+    tag_groups = [{'count': args.tags, 'rate': args.rate}] if args.tags else None
+    server = IndustrialWebSocketServer(
+        host=args.host, port=args.port, update_interval=1 / args.rate, tag_groups=tag_groups
+    )
     
     try:
         asyncio.run(server.start_server())
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'opcpr_project.settings')
 
 application = get_wsgi_application()
+
+# Escritor de auditoría y volcado de telemetría en segundo plano
+from main_app.audit import audit_writer  # noqa: E402
+from main_app.telemetry import telemetry_rollup  # noqa: E402
+
+audit_writer.start()
+telemetry_rollup.start()